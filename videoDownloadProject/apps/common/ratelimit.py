@@ -0,0 +1,332 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import wraps
+from typing import Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+SLIDING_WINDOW = "sliding_window"
+TOKEN_BUCKET = "token_bucket"
+
+# Sliding window counter: the previous window's count is weighted by how much
+# of it still overlaps the trailing window, which smooths fixed-window bursts.
+_SLIDING_WINDOW_LUA = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local current = tonumber(redis.call("GET", KEYS[1]) or "0")
+local previous = tonumber(redis.call("GET", KEYS[2]) or "0")
+local weight = 1 - (now % window) / window
+local used = previous * weight + current
+if used + cost > limit then
+    return {0, tostring(limit - used), tostring(window - now % window)}
+end
+redis.call("INCRBY", KEYS[1], cost)
+redis.call("EXPIRE", KEYS[1], math.ceil(window * 2))
+return {1, tostring(limit - used - cost), "0"}
+"""
+
+_TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "ts", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+
+@dataclass(frozen=True)
+class Rate:
+    """
+    A rate limit of `limit` hits per `window` seconds.
+
+    With the token-bucket algorithm `limit` is the bucket capacity (burst)
+    and tokens refill at `limit / window` per second.
+    """
+
+    limit: int
+    window: float
+    algorithm: str = SLIDING_WINDOW
+
+
+@dataclass(frozen=True)
+class Decision:
+    """Outcome of a rate-limit check."""
+
+    allowed: bool
+    remaining: float
+    retry_after: float
+
+
+class MemoryBackend:
+    """
+    Process-local backend; exact, lock-protected and used in tests.
+
+    Idle keys are dropped once their state would have reset anyway (two
+    windows, or a full bucket refill), swept at most every
+    `sweep_interval` seconds; beyond `max_keys` the least recently hit
+    keys are dropped too, so memory stays bounded however many distinct
+    actors show up.
+    """
+
+    def __init__(
+        self,
+        clock: Callable[[], float] = time.time,
+        *,
+        max_keys: int = 100_000,
+        sweep_interval: float = 60.0,
+    ) -> None:
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+        self._sweep_interval = sweep_interval
+        self._next_sweep = clock() + sweep_interval
+        # Values end with the time after which the entry can be forgotten.
+        self._windows: "OrderedDict[str, Tuple[int, float, float, float]]" = (
+            OrderedDict()
+        )
+        self._buckets: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+
+    def hit(self, key: str, rate: Rate, cost: int = 1) -> Decision:
+        now = self._clock()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            if rate.algorithm == TOKEN_BUCKET:
+                return self._token_bucket(key, rate, now, cost)
+            return self._sliding_window(key, rate, now, cost)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._windows.clear()
+            self._buckets.clear()
+
+    def __len__(self) -> int:
+        return len(self._windows) + len(self._buckets)
+
+    def _sliding_window(self, key: str, rate: Rate, now: float, cost: int) -> Decision:
+        window_index = int(now // rate.window)
+        stored_index, current, previous, _expires_at = self._windows.get(
+            key, (window_index, 0, 0, 0.0)
+        )
+        if stored_index == window_index - 1:
+            current, previous = 0, current
+        elif stored_index != window_index:
+            current, previous = 0, 0
+        elapsed = now % rate.window
+        used = previous * (1 - elapsed / rate.window) + current
+        if used + cost > rate.limit:
+            return Decision(False, rate.limit - used, rate.window - elapsed)
+        expires_at = (window_index + 2) * rate.window
+        self._store(
+            self._windows, key, (window_index, current + cost, previous, expires_at)
+        )
+        return Decision(True, rate.limit - used - cost, 0)
+
+    def _token_bucket(self, key: str, rate: Rate, now: float, cost: int) -> Decision:
+        refill = rate.limit / rate.window
+        tokens, updated_at, _expires_at = self._buckets.get(key, (rate.limit, now, 0.0))
+        tokens = min(rate.limit, tokens + max(0.0, now - updated_at) * refill)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        # Once refilled the bucket is indistinguishable from a new one.
+        expires_at = now + (rate.limit - tokens) / refill
+        self._store(self._buckets, key, (tokens, now, expires_at))
+        if allowed:
+            return Decision(True, tokens, 0)
+        return Decision(False, tokens, (cost - tokens) / refill)
+
+    def _store(self, entries: OrderedDict, key: str, value: tuple) -> None:
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self._max_keys:
+            entries.popitem(last=False)
+
+    def _sweep(self, now: float) -> None:
+        for entries in (self._windows, self._buckets):
+            expired = [key for key, value in entries.items() if value[-1] <= now]
+            for key in expired:
+                del entries[key]
+        self._next_sweep = now + self._sweep_interval
+
+
+class RedisBackend:
+    """
+    Redis backend running each algorithm as one Lua script (one round trip).
+
+    Uses the connection pool of a Django `RedisCache` alias.
+    """
+
+    def __init__(self, cache_alias: str, clock: Callable[[], float] = time.time) -> None:
+        self._cache = caches[cache_alias]
+        self._clock = clock
+        client = self._cache._cache.get_client(write=True)
+        self._scripts = {
+            SLIDING_WINDOW: client.register_script(_SLIDING_WINDOW_LUA),
+            TOKEN_BUCKET: client.register_script(_TOKEN_BUCKET_LUA),
+        }
+
+    def hit(self, key: str, rate: Rate, cost: int = 1) -> Decision:
+        now = self._clock()
+        # Braces keep every key of one limiter in the same cluster slot.
+        base = self._cache.make_key(f"{{{key}}}")
+        if rate.algorithm == TOKEN_BUCKET:
+            keys = [base]
+        else:
+            window_index = int(now // rate.window)
+            keys = [f"{base}:{window_index}", f"{base}:{window_index - 1}"]
+        allowed, remaining, retry_after = self._scripts[rate.algorithm](
+            keys=keys, args=[rate.limit, rate.window, now, cost]
+        )
+        return Decision(bool(int(allowed)), float(remaining), float(retry_after))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Return the configured backend.
+
+    `RATELIMIT_BACKEND` may be "memory", "redis" or "auto" (default), which
+    picks Redis when the `RATELIMIT_CACHE_ALIAS` cache is a `RedisCache`.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _build_backend()
+    return _backend
+
+
+def set_backend(backend) -> None:
+    """Replace the process-wide backend (tests, custom stores)."""
+    global _backend
+    _backend = backend
+
+
+def _build_backend():
+    name = getattr(settings, "RATELIMIT_BACKEND", "auto")
+    alias = getattr(settings, "RATELIMIT_CACHE_ALIAS", "default")
+    if name == "auto":
+        backend_path = settings.CACHES.get(alias, {}).get("BACKEND", "")
+        name = "redis" if backend_path.endswith("RedisCache") else "memory"
+    if name == "redis":
+        return RedisBackend(alias)
+    return MemoryBackend()
+
+
+def get_rate(scope: str, *, limit: int, window: float, algorithm: str) -> Rate:
+    """Resolve a scope's rate, applying `RATELIMIT_SCOPES` overrides."""
+    override = getattr(settings, "RATELIMIT_SCOPES", {}).get(scope, {})
+    return Rate(
+        limit=int(override.get("limit", limit)),
+        window=float(override.get("window", window)),
+        algorithm=override.get("algorithm", algorithm),
+    )
+
+
+def actor_key(request) -> str:
+    """
+    Return a stable rate-limit identity for the request.
+
+    Authenticated users are keyed by id; anonymous visitors by their session
+    when one already exists, otherwise by client IP. The session is never
+    saved just to obtain a key.
+    """
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+
+    forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR", "")
+    ip = (
+        forwarded_for.split(",")[0].strip()
+        if forwarded_for
+        else request.META.get("REMOTE_ADDR", "unknown-ip")
+    )
+    session = getattr(request, "session", None)
+    session_key = getattr(session, "session_key", None)
+    if session_key:
+        return f"anon:{session_key}:{ip}"
+    return f"anon:ip:{ip}"
+
+
+def check(
+    request,
+    scope: str,
+    *,
+    limit: int,
+    window: float,
+    algorithm: str = SLIDING_WINDOW,
+    cost: int = 1,
+) -> Decision:
+    """Record one hit for the request's actor in `scope` and return the decision."""
+    rate = get_rate(scope, limit=limit, window=window, algorithm=algorithm)
+    key = f"ratelimit:{scope}:{actor_key(request)}"
+    return get_backend().hit(key, rate, cost)
+
+
+def too_many_requests(request, decision: Decision) -> HttpResponse:
+    """Default response for limited requests."""
+    response = HttpResponse("Too many requests. Please wait and try again.", status=429)
+    response["Retry-After"] = str(max(1, math.ceil(decision.retry_after)))
+    return response
+
+
+def ratelimit(
+    scope: str,
+    *,
+    limit: int,
+    window: float,
+    algorithm: str = SLIDING_WINDOW,
+    methods: Optional[Tuple[str, ...]] = None,
+    htmx_only: bool = False,
+    on_limited: Callable = too_many_requests,
+):
+    """
+    Rate-limit a view per actor.
+
+    Only requests whose method is in `methods` (all when None) and, with
+    `htmx_only`, HTMX requests are counted. Limited requests get
+    `on_limited(request, decision)`, a 429 with `Retry-After` by default.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            counted = (methods is None or request.method in methods) and (
+                not htmx_only or getattr(request, "htmx", False)
+            )
+            if counted:
+                decision = check(
+                    request, scope, limit=limit, window=window, algorithm=algorithm
+                )
+                if not decision.allowed:
+                    return on_limited(request, decision)
+            return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -1,3 +1,90 @@
-from django.test import TestCase
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
 
-# Create your tests here.
+from apps.common import ratelimit
+from apps.common.ratelimit import (
+    SLIDING_WINDOW,
+    TOKEN_BUCKET,
+    MemoryBackend,
+    Rate,
+    actor_key,
+)
+
+
+class RateLimitTests(TestCase):
+    """Tests for the shared rate-limit module."""
+
+    def setUp(self) -> None:
+        self.now = [1000.0]
+        self.backend = MemoryBackend(clock=lambda: self.now[0])
+        ratelimit.set_backend(self.backend)
+        self.addCleanup(ratelimit.set_backend, None)
+        self.factory = RequestFactory()
+
+    def test_sliding_window_weights_previous_window(self) -> None:
+        rate = Rate(limit=4, window=10, algorithm=SLIDING_WINDOW)
+        for _ in range(4):
+            self.assertTrue(self.backend.hit("k", rate).allowed)
+        self.assertFalse(self.backend.hit("k", rate).allowed)
+
+        # Halfway through the next window half of the old hits still count.
+        self.now[0] = 1015.0
+        self.assertTrue(self.backend.hit("k", rate).allowed)
+        self.assertTrue(self.backend.hit("k", rate).allowed)
+        decision = self.backend.hit("k", rate)
+        self.assertFalse(decision.allowed)
+        self.assertEqual(decision.retry_after, 5)
+
+    def test_token_bucket_refills_over_time(self) -> None:
+        rate = Rate(limit=2, window=10, algorithm=TOKEN_BUCKET)
+        self.assertTrue(self.backend.hit("k", rate).allowed)
+        self.assertTrue(self.backend.hit("k", rate).allowed)
+        decision = self.backend.hit("k", rate)
+        self.assertFalse(decision.allowed)
+        self.assertAlmostEqual(decision.retry_after, 5)
+
+        self.now[0] += 5
+        self.assertTrue(self.backend.hit("k", rate).allowed)
+
+    def test_memory_backend_forgets_idle_keys(self) -> None:
+        backend = MemoryBackend(
+            clock=lambda: self.now[0], max_keys=3, sweep_interval=60
+        )
+        window = Rate(limit=5, window=10, algorithm=SLIDING_WINDOW)
+        bucket = Rate(limit=2, window=10, algorithm=TOKEN_BUCKET)
+        backend.hit("window", window)
+        backend.hit("bucket", bucket)
+        self.assertEqual(len(backend), 2)
+
+        # Both would have reset by now; the next hit sweeps them.
+        self.now[0] += 60
+        backend.hit("fresh", window)
+        self.assertEqual(len(backend), 1)
+
+        for index in range(5):
+            backend.hit(f"actor-{index}", window)
+        self.assertEqual(len(backend), 3)
+
+    @override_settings(RATELIMIT_SCOPES={"demo": {"limit": 1}})
+    def test_decorator_returns_429_with_retry_after(self) -> None:
+        @ratelimit.ratelimit("demo", limit=5, window=60)
+        def view(request):
+            return HttpResponse("ok")
+
+        request = self.factory.get("/", REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(view(request).status_code, 200)
+        response = view(request)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "20")
+        # Other clients keep their own budget.
+        self.assertEqual(
+            view(self.factory.get("/", REMOTE_ADDR="10.0.0.2")).status_code, 200
+        )
+
+    def test_actor_key_does_not_create_session(self) -> None:
+        request = self.factory.get("/", REMOTE_ADDR="10.0.0.3")
+        SessionMiddleware(lambda r: HttpResponse()).process_request(request)
+
+        self.assertEqual(actor_key(request), "anon:ip:10.0.0.3")
+        self.assertIsNone(request.session.session_key)
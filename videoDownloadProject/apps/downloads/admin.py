@@ -7,6 +7,12 @@ class DownloadJobAdmin(admin.ModelAdmin):
     list_display = ["video", "user", "status", "created_at"]
     list_per_page = 20
     #list_display_links = ["user"]
-    readonly_fields = ["started_at", "completed_at"]
+    readonly_fields = [
+        "started_at",
+        "completed_at",
+        "fragment_concurrency",
+        "throughput_kbps",
+        "awaiting_artifact",
+    ]
     ordering = ["-created_at"]
     
\ No newline at end of file
@@ -5,3 +5,6 @@ class DownloadsConfig(AppConfig):
     """App configuration for download workflows and tasks."""
 
     name = 'apps.downloads'
+
+    def ready(self) -> None:
+        from apps.downloads import checks, signals
@@ -0,0 +1,21 @@
+from django.core.checks import Tags, Warning, register
+
+from apps.downloads.services import single_flight
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Warn when download coordination falls back to per-process state."""
+    if single_flight.shared():
+        return []
+    return [
+        Warning(
+            "The default cache is per-process, so the provider governor and "
+            "download coalescing are disabled.",
+            hint=(
+                "Set REDIS_CACHE_URL so web and worker processes share the "
+                "cache, or VIDEO_CACHE_SHARED=True for another shared backend."
+            ),
+            id="downloads.W001",
+        )
+    ]
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from apps.downloads.services.storage_lifecycle import prune_storage
+from utils import utils
+
+
+class Command(BaseCommand):
+    help = "Evict stored downloads by TTL and byte budget (LRU)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be evicted without deleting anything.",
+        )
+        parser.add_argument("--budget-bytes", type=int, default=None)
+        parser.add_argument("--ttl-seconds", type=int, default=None)
+
+    def handle(self, *args, **options):
+        report = prune_storage(
+            dry_run=options["dry_run"],
+            budget_bytes=options["budget_bytes"],
+            ttl_seconds=options["ttl_seconds"],
+        )
+        verb = "Would evict" if report.dry_run else "Evicted"
+        for eviction in report.evictions:
+            self.stdout.write(
+                f"{verb} {eviction.relative_path} "
+                f"({utils.format_bytes(eviction.size_bytes)}, {eviction.reason})"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {len(report.evictions)} file(s), "
+                f"{utils.format_bytes(report.freed_bytes)} of "
+                f"{utils.format_bytes(report.total_bytes)}; "
+                f"{utils.format_bytes(report.remaining_bytes)} remain."
+            )
+        )
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.2 on 2026-10-17
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; building the
+    # indexes this way keeps the jobs table writable during the migration.
+    atomic = False
+
+    dependencies = [
+        ("downloads", "0002_dailydownloadusage"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="downloadjob",
+            index=models.Index(
+                fields=["user", "-created_at"], name="dljob_user_created_idx"
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="downloadjob",
+            index=models.Index(
+                condition=models.Q(("status__in", ("queued", "downloading"))),
+                fields=["user", "created_at"],
+                name="dljob_user_active_idx",
+            ),
+        ),
+    ]
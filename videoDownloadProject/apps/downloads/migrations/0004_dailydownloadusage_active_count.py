@@ -0,0 +1,17 @@
+# Generated by Django 6.0.2 on 2026-10-17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("downloads", "0003_downloadjob_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dailydownloadusage",
+            name="active_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.2 on 2026-10-17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("downloads", "0005_storedartifact_downloadjob_artifact"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="downloadjob",
+            name="fragment_concurrency",
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="downloadjob",
+            name="throughput_kbps",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.2 on 2026-10-17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("downloads", "0006_downloadjob_fragment_tuning"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="downloadjob",
+            name="awaiting_artifact",
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -2,11 +2,32 @@ import uuid
 
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 from apps.common.models import TimeStampedModel
 from apps.videos.models import VideoFormat, VideoSource
 
 
+class StoredArtifact(TimeStampedModel):
+    """
+    A downloaded file shared by every job for the same video and format.
+
+    `key` identifies the content (provider video id, format selector and
+    container); `ref_count` counts the jobs that link to the file. Storage
+    pruning removes artifacts soon after it drops to zero and evicts
+    referenced ones last (see `storage_lifecycle.plan_eviction`).
+    """
+
+    key = models.CharField(max_length=64, unique=True)
+    relative_path = models.CharField(max_length=255)
+    size_bytes = models.BigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    last_accessed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.relative_path
+
+
 class DownloadJob(TimeStampedModel):
     """Represents a queued or running download and its progress."""
 
@@ -17,6 +38,7 @@ class DownloadJob(TimeStampedModel):
         ("failed", "Failed"),
         ("cancelled", "Cancelled"),
     ]
+    ACTIVE_STATUSES = ("queued", "downloading")
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="downloads")
@@ -31,11 +53,37 @@ class DownloadJob(TimeStampedModel):
     eta_seconds = models.PositiveIntegerField(null=True, blank=True)
 
     output_filename = models.CharField(max_length=255, blank=True)
+    artifact = models.ForeignKey(
+        StoredArtifact,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="jobs",
+    )
     failure_reason = models.TextField(blank=True)
+    # Artifact key of another job's in-flight download this job waits on;
+    # that job completes it once the file is stored.
+    awaiting_artifact = models.CharField(max_length=64, blank=True, db_index=True)
+    # Chosen by the fragment controller and the measured average throughput,
+    # kept for tuning analysis.
+    fragment_concurrency = models.PositiveSmallIntegerField(null=True, blank=True)
+    throughput_kbps = models.PositiveIntegerField(null=True, blank=True)
 
     started_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Per-user listings and day-range scans.
+            models.Index(fields=["user", "-created_at"], name="dljob_user_created_idx"),
+            # Quota checks only ever count in-flight jobs; keep that index tiny.
+            models.Index(
+                fields=["user", "created_at"],
+                name="dljob_user_active_idx",
+                condition=models.Q(status__in=("queued", "downloading")),
+            ),
+        ]
+
     def __str__(self):
         """Return a readable label for admin and logs."""
 
@@ -43,7 +91,12 @@ class DownloadJob(TimeStampedModel):
 
 
 class DailyDownloadUsage(TimeStampedModel):
-    """Tracks per-user successful download usage for a specific day."""
+    """
+    Tracks per-user download quota usage for a specific day.
+
+    `success_count` counts finished downloads; `active_count` counts slots
+    reserved by queued/downloading jobs created that day.
+    """
 
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -52,6 +105,7 @@ class DailyDownloadUsage(TimeStampedModel):
     )
     day = models.DateField()
     success_count = models.PositiveIntegerField(default=0)
+    active_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         constraints = [
@@ -62,4 +116,4 @@ class DailyDownloadUsage(TimeStampedModel):
         ]
 
     def __str__(self):
-        return f"{self.user} {self.day}: {self.success_count}"
+        return f"{self.user} {self.day}: {self.success_count} (+{self.active_count} active)"
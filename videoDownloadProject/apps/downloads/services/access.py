@@ -1,11 +1,14 @@
 from dataclasses import dataclass
+from datetime import datetime, time, timedelta
 
 from django.conf import settings
-from django.db.models import F
 from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
 from django.utils import timezone
 
 from apps.downloads.models import DailyDownloadUsage, DownloadJob
+from apps.downloads.services.exceptions import RateLimitExceeded
 from apps.downloads.services.validators import ensure_format_allowed, ensure_rate_limit
 
 
@@ -20,57 +23,183 @@ class DownloadPolicy:
 
 def enforce_download_constraints(user, video_format) -> None:
     """Apply rate-limit and format constraints before creating a job."""
-    today = timezone.localdate()
+    reserve_download_slots(user, [video_format])
 
-    if user and getattr(user, "is_authenticated", False):
-        profile = getattr(user, "profile", None)
-        if profile is None:
-            profile = DownloadPolicy(
-                daily_limit=getattr(settings, "VIDEO_DEFAULT_DAILY_LIMIT", 5),
-                max_resolution=getattr(settings, "VIDEO_DEFAULT_MAX_RESOLUTION", 720),
-                is_unlimited=False,
-            )
-            usage_count_today = (
-                DailyDownloadUsage.objects.filter(user=user, day=today)
-                .values_list("success_count", flat=True)
-                .first()
-                or 0
-            )
-            active_count_today = DownloadJob.objects.filter(
-                user=user,
-                created_at__date=today,
-                status__in=("queued", "downloading"),
-            ).count()
-            downloads_today = usage_count_today + active_count_today
-            ensure_rate_limit(profile, downloads_today)
-            ensure_format_allowed(profile, video_format)
-            return
-
-        # Serialize quota checks per user to avoid concurrent over-enqueue.
-        with transaction.atomic():
-            type(profile).objects.select_for_update().get(pk=profile.pk)
-            usage, _ = DailyDownloadUsage.objects.select_for_update().get_or_create(
-                user=user,
-                day=today,
-                defaults={"success_count": 0},
-            )
-            active_count_today = DownloadJob.objects.filter(
-                user=user,
-                created_at__date=today,
-                status__in=("queued", "downloading"),
-            ).count()
-            downloads_today = usage.success_count + active_count_today
-            ensure_rate_limit(profile, downloads_today)
+
+def reserve_download_slots(user, video_formats) -> int:
+    """
+    Check plan constraints for a batch of formats and reserve quota slots.
+
+    Returns how many of the formats fit today's quota; that many slots are
+    added to the user's `DailyDownloadUsage.active_count` and must be given
+    back with `release_download_slot` when each job finishes. Raises
+    `RateLimitExceeded` when not even one more download fits and
+    `FormatNotAllowed` when any format violates the plan. Calling it inside
+    the `transaction.atomic()` block that inserts the jobs rolls the
+    reservation back together with them.
+    """
+    requested = len(video_formats)
+    if not requested:
+        return 0
+
+    if not user or not getattr(user, "is_authenticated", False):
+        profile = DownloadPolicy(
+            daily_limit=getattr(settings, "VIDEO_ANON_DAILY_LIMIT", 3),
+            max_resolution=getattr(settings, "VIDEO_ANON_MAX_RESOLUTION", 480),
+            is_unlimited=False,
+        )
+        # Anonymous usage is not tracked per day; only plan checks apply.
+        ensure_rate_limit(profile, 0)
+        for video_format in video_formats:
             ensure_format_allowed(profile, video_format)
+        return requested
+
+    profile = getattr(user, "profile", None)
+    if profile is None:
+        profile = DownloadPolicy(
+            daily_limit=getattr(settings, "VIDEO_DEFAULT_DAILY_LIMIT", 5),
+            max_resolution=getattr(settings, "VIDEO_DEFAULT_MAX_RESOLUTION", 720),
+            is_unlimited=False,
+        )
+    # Validate formats first so a rejected batch never holds slots.
+    for video_format in video_formats:
+        ensure_format_allowed(profile, video_format)
+
+    today = timezone.localdate()
+    if profile.is_unlimited or profile.daily_limit is None:
+        limit = None
+    else:
+        limit = profile.daily_limit
+    return _reserve_slots(user, today, requested, limit, profile)
+
+
+def _reserve_slots(user, day, requested: int, limit: int | None, profile) -> int:
+    """
+    Atomically add up to `requested` active slots to the user's usage row.
+
+    The common case is a single conditional UPDATE that only matches while
+    `success_count + active_count + requested` stays within the limit. When
+    only part of a batch fits, the remainder is granted with a
+    compare-and-set on the counters read just before, retried on conflict.
+    """
+    usage_rows = DailyDownloadUsage.objects.filter(user=user, day=day)
+    if limit is None:
+        if usage_rows.update(active_count=F("active_count") + requested):
+            return requested
+    else:
+        fits = usage_rows.alias(
+            used=F("success_count") + F("active_count")
+        ).filter(used__lte=limit - requested)
+        if fits.update(active_count=F("active_count") + requested):
+            return requested
+
+    usage, _ = DailyDownloadUsage.objects.get_or_create(user=user, day=day)
+    attempts = int(getattr(settings, "VIDEO_QUOTA_RESERVE_ATTEMPTS", 5))
+    for _ in range(attempts):
+        used = usage.success_count + usage.active_count
+        ensure_rate_limit(profile, used)
+        granted = requested if limit is None else min(requested, limit - used)
+        updated = DailyDownloadUsage.objects.filter(
+            pk=usage.pk,
+            success_count=usage.success_count,
+            active_count=usage.active_count,
+        ).update(active_count=F("active_count") + granted)
+        if updated:
+            return granted
+        usage.refresh_from_db(fields=["success_count", "active_count"])
+    raise RateLimitExceeded("Too many concurrent download requests; please retry")
+
+
+def release_download_slot(job, *, success: bool) -> None:
+    """
+    Give back the slot reserved for `job` once it finished.
+
+    Successful jobs move from `active_count` to today's `success_count`.
+    """
+    if not job.user_id:
         return
 
-    profile = DownloadPolicy(
-        daily_limit=getattr(settings, "VIDEO_ANON_DAILY_LIMIT", 3),
-        max_resolution=getattr(settings, "VIDEO_ANON_MAX_RESOLUTION", 480),
-        is_unlimited=False,
+    reserved_on = timezone.localdate(job.created_at)
+    today = timezone.localdate()
+    changes = {"active_count": Greatest(F("active_count") - 1, 0)}
+    if success and reserved_on == today:
+        changes["success_count"] = F("success_count") + 1
+    updated = DailyDownloadUsage.objects.filter(
+        user_id=job.user_id, day=reserved_on
+    ).update(**changes)
+    if success and (reserved_on != today or not updated):
+        increment_daily_success_usage(job.user)
+
+
+def reconcile_daily_usage(day=None) -> int:
+    """
+    Reset `active_count` for a day from the jobs actually in flight.
+
+    Counters can drift when a worker dies mid-job or a release is lost;
+    this recounts active jobs per user with one grouped query over the
+    partial active-jobs index. Returns the number of usage rows corrected.
+    """
+    day = day or timezone.localdate()
+    actual = dict(_active_counts_by_user(day))
+
+    corrected = 0
+    stale = DailyDownloadUsage.objects.filter(day=day).filter(
+        Q(active_count__gt=0) | Q(user_id__in=list(actual))
     )
-    ensure_rate_limit(profile, 0)
-    ensure_format_allowed(profile, video_format)
+    for usage in stale.only("pk", "user_id", "active_count"):
+        count = actual.pop(usage.user_id, 0)
+        if usage.active_count != count:
+            corrected += DailyDownloadUsage.objects.filter(pk=usage.pk).update(
+                active_count=count
+            )
+    for user_id, count in actual.items():
+        _, created = DailyDownloadUsage.objects.get_or_create(
+            user_id=user_id, day=day, defaults={"active_count": count}
+        )
+        corrected += int(created)
+    return corrected
+
+
+def _active_counts_by_user(day):
+    """
+    Return `(user_id, count)` rows of the jobs in flight from a local day.
+
+    Filters on a `created_at` range rather than `__date` so the scan is
+    served by the partial `dljob_user_active_idx` index.
+    """
+    start, end = day_bounds(day)
+    return (
+        DownloadJob.objects.filter(
+            status__in=DownloadJob.ACTIVE_STATUSES,
+            created_at__gte=start,
+            created_at__lt=end,
+        )
+        .values_list("user_id")
+        .annotate(count=Count("id"))
+    )
+
+
+def day_bounds(day):
+    """Return the aware `[start, end)` datetimes of a local calendar day."""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def download_priority(user) -> int:
+    """
+    Return the broker priority for a user's download tasks.
+
+    Pro (unlimited) users jump ahead of free and anonymous users in the
+    downloads queue; values come from `VIDEO_DOWNLOAD_PRIORITY_PRO` and
+    `VIDEO_DOWNLOAD_PRIORITY_DEFAULT`.
+    """
+    default = int(getattr(settings, "VIDEO_DOWNLOAD_PRIORITY_DEFAULT", 3))
+    if not user or not getattr(user, "is_authenticated", False):
+        return default
+    profile = getattr(user, "profile", None)
+    if profile is not None and profile.is_unlimited:
+        return int(getattr(settings, "VIDEO_DOWNLOAD_PRIORITY_PRO", 8))
+    return default
 
 
 def increment_daily_success_usage(user) -> None:
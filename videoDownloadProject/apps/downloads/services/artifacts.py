@@ -0,0 +1,98 @@
+import hashlib
+import os
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.downloads.models import DownloadJob, StoredArtifact
+from apps.downloads.services.download_storage import download_storage, store_download
+from apps.downloads.services.metadata_cache import canonicalize_video_url
+from apps.videos.models import VideoFormat, VideoSource
+
+
+def artifact_key(video: VideoSource, video_format: VideoFormat) -> str:
+    """
+    Return the content key for a video downloaded in a given format.
+
+    Built from the provider video id (or canonical URL), the format
+    selector and the container, so identical requests from different users
+    map to the same file.
+    """
+    identity = video.provider_video_id or canonicalize_video_url(video.canonical_url)
+    selector = video_format.format_id or (
+        "audio" if video_format.is_audio_only else video_format.quality_label
+    )
+    raw = "|".join(
+        [video.provider.lower(), identity, selector, video_format.container.lower()]
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def find_artifact(key: str) -> Optional[StoredArtifact]:
+    """Return the materialized artifact for `key` if its file still exists."""
+    artifact = StoredArtifact.objects.filter(key=key).first()
+    if artifact is None or not artifact.relative_path:
+        return None
+    if not download_storage().exists(artifact.relative_path):
+        return None
+    return artifact
+
+
+def record_artifact(key: str, file_path: str) -> StoredArtifact:
+    """
+    Store a freshly downloaded file and create/refresh its artifact row.
+
+    `file_path` is the local file yt-dlp wrote; it is moved into the
+    download storage (see `store_download`).
+    """
+    size_bytes = os.path.getsize(file_path)
+    relative_path = store_download(file_path)
+    artifact, _ = StoredArtifact.objects.update_or_create(
+        key=key,
+        defaults={
+            "relative_path": relative_path,
+            "size_bytes": size_bytes,
+            "last_accessed_at": timezone.now(),
+        },
+    )
+    return artifact
+
+
+def link_job(job: DownloadJob, artifact: StoredArtifact) -> None:
+    """
+    Point a job at an artifact and take a reference on it.
+
+    Sets `artifact` and `output_filename` on the job instance; the caller
+    saves the job together with its completion fields. The update locks the
+    row against a concurrent eviction; raises `StoredArtifact.DoesNotExist`
+    when the artifact was evicted after it was looked up.
+    """
+    with transaction.atomic():
+        linked = StoredArtifact.objects.filter(pk=artifact.pk).update(
+            ref_count=F("ref_count") + 1, last_accessed_at=timezone.now()
+        )
+        if not linked:
+            raise StoredArtifact.DoesNotExist(f"artifact {artifact.pk} was evicted")
+        if job.artifact_id and job.artifact_id != artifact.pk:
+            release_artifact(job.artifact_id)
+    job.artifact = artifact
+    job.output_filename = artifact.relative_path
+
+
+def release_artifact(artifact_id) -> None:
+    """
+    Drop one reference from an artifact (never below zero).
+
+    Unreferenced artifacts are removed by the next storage prune once
+    unused for `VIDEO_STORAGE_UNREFERENCED_TTL_SECONDS`.
+    """
+    StoredArtifact.objects.filter(pk=artifact_id, ref_count__gt=0).update(
+        ref_count=F("ref_count") - 1
+    )
+
+
+def touch_artifact(artifact_id) -> None:
+    """Record that an artifact was served."""
+    StoredArtifact.objects.filter(pk=artifact_id).update(last_accessed_at=timezone.now())
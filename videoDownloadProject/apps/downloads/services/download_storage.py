@@ -0,0 +1,62 @@
+import os
+from typing import Optional
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, InvalidStorageError, storages
+
+STORAGE_ALIAS = "video_downloads"
+
+
+def download_root() -> Optional[str]:
+    """Return the absolute local download directory, or None when unset."""
+    base_dir = getattr(settings, "VIDEO_DOWNLOAD_ROOT", None)
+    return os.path.abspath(str(base_dir)) if base_dir else None
+
+
+def download_storage():
+    """
+    Return the storage that holds finished downloads.
+
+    Uses the `STORAGES["video_downloads"]` backend when configured (e.g.
+    django-storages' S3Storage against AWS or MinIO); otherwise a
+    `FileSystemStorage` rooted at `VIDEO_DOWNLOAD_ROOT`. Workers always
+    download into `VIDEO_DOWNLOAD_ROOT` first, then `store_download` moves
+    the file into this storage.
+    """
+    try:
+        return storages[STORAGE_ALIAS]
+    except InvalidStorageError:
+        return FileSystemStorage(location=download_root())
+
+
+def is_local(storage) -> bool:
+    """
+    Return True when the storage keeps files on the local filesystem.
+
+    Checked by type rather than by calling `path()`: some non-filesystem
+    backends (e.g. `InMemoryStorage`) implement `path()` without the file
+    ever existing on disk.
+    """
+    return isinstance(storage, FileSystemStorage)
+
+
+def store_download(local_path: str) -> str:
+    """
+    Put a finished download into the storage and return its storage name.
+
+    Files already inside a local storage stay where they are; otherwise the
+    file is streamed into the backend (S3 uploads are multipart for large
+    files) and the local copy is removed.
+    """
+    storage = download_storage()
+    if is_local(storage):
+        location = os.path.abspath(storage.path(""))
+        if os.path.abspath(local_path).startswith(location + os.sep):
+            return os.path.relpath(local_path, location)
+
+    name = os.path.basename(local_path)
+    with open(local_path, "rb") as handle:
+        name = storage.save(name, File(handle, name=name))
+    os.remove(local_path)
+    return name
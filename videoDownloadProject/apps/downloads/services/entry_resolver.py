@@ -0,0 +1,75 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+from django.conf import settings
+
+from apps.downloads.services.video_metadata import VideoMetadataFetcher
+
+logger = logging.getLogger(__name__)
+
+
+def entry_url(entry: Dict[str, Any]) -> str:
+    """Return the page URL identifying a playlist entry."""
+    return entry.get("webpage_url") or entry.get("url") or entry.get("original_url") or ""
+
+
+def resolve_missing_formats(
+    entries: List[Dict[str, Any]],
+    *,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Fill in `formats` for playlist entries that came back without them.
+
+    Missing entries are fetched concurrently on a bounded thread pool
+    (`VIDEO_ENTRY_RESOLVE_MAX_WORKERS`), with at most
+    `VIDEO_ENTRY_RESOLVE_PER_PROVIDER` requests in flight per provider host.
+    Fetches go through the metadata cache, so entries resolved once are
+    reused. Entries that fail to resolve are returned unchanged.
+
+    `on_progress(done, total)` is called after each entry completes.
+    """
+    pending = [
+        index
+        for index, entry in enumerate(entries)
+        if entry and not entry.get("formats") and entry_url(entry)
+    ]
+    if not pending:
+        return entries
+
+    max_workers = int(getattr(settings, "VIDEO_ENTRY_RESOLVE_MAX_WORKERS", 8))
+    per_provider = int(getattr(settings, "VIDEO_ENTRY_RESOLVE_PER_PROVIDER", 4))
+    provider_slots: Dict[str, threading.BoundedSemaphore] = {}
+    for index in pending:
+        host = urlparse(entry_url(entries[index])).hostname or ""
+        provider_slots.setdefault(host, threading.BoundedSemaphore(per_provider))
+
+    def resolve(entry: Dict[str, Any]) -> Dict[str, Any]:
+        url = entry_url(entry)
+        with provider_slots[urlparse(url).hostname or ""]:
+            return VideoMetadataFetcher().fetch(url)
+
+    resolved = list(entries)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as pool:
+        futures = {pool.submit(resolve, entries[index]): index for index in pending}
+        for done, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            try:
+                info = future.result()
+            except Exception:
+                logger.warning(
+                    "Unable to resolve playlist entry %s",
+                    entry_url(entries[index]),
+                    exc_info=True,
+                )
+            else:
+                merged = dict(entries[index])
+                merged.update(info or {})
+                resolved[index] = merged
+            if on_progress:
+                on_progress(done, len(pending))
+
+    return resolved
@@ -16,3 +16,23 @@ class FormatNotAllowed(VideoDownloadError):
 
 class DownloadFailed(VideoDownloadError):
     """Download failed during processing."""
+
+
+class ProviderBusy(VideoDownloadError):
+    """Provider capacity is exhausted; retry after `retry_after` seconds."""
+
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"{host} is busy; retry in {retry_after:.0f}s")
+        self.host = host
+        self.retry_after = retry_after
+
+
+class ArtifactInFlight(VideoDownloadError):
+    """Another job is downloading the same file; check again after `retry_after`."""
+
+    def __init__(self, key: str, retry_after: float):
+        super().__init__(
+            f"artifact {key[:16]} is already downloading; retry in {retry_after:.0f}s"
+        )
+        self.key = key
+        self.retry_after = retry_after
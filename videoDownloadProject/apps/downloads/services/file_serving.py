@@ -0,0 +1,287 @@
+import mimetypes
+import os
+import uuid
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.utils.cache import get_conditional_response
+from django.utils.http import (
+    content_disposition_header,
+    http_date,
+    parse_http_date_safe,
+)
+
+from apps.downloads.services.download_storage import download_storage, is_local
+
+BACKEND_PYTHON = "python"
+BACKEND_X_ACCEL_REDIRECT = "x-accel-redirect"
+BACKEND_X_SENDFILE = "x-sendfile"
+
+_CHUNK_SIZE = 64 * 1024
+
+
+def resolve_download_path(name: str) -> Optional[str]:
+    """
+    Return the absolute local path of a stored download, or None.
+
+    None when the download storage is not local, the name escapes the
+    storage root, or the file does not exist.
+    """
+    storage = download_storage()
+    if not name or not is_local(storage):
+        return None
+    try:
+        file_path = storage.path(name)
+    except (NotImplementedError, SuspiciousFileOperation):
+        return None
+    return file_path if os.path.isfile(file_path) else None
+
+
+def stored_file_response(
+    request, name: str, *, filename: str
+) -> Optional[HttpResponse]:
+    """
+    Return a response delivering the stored download `name`, or None.
+
+    Local storages go through `serve_file`; remote ones (S3/MinIO) answer
+    with a redirect to a presigned URL so the bytes never pass through the
+    web tier.
+    """
+    file_path = resolve_download_path(name)
+    if file_path is not None:
+        return serve_file(request, file_path, filename=filename)
+
+    storage = download_storage()
+    if is_local(storage) or not storage.exists(name):
+        return None
+    disposition = content_disposition_header(True, filename)
+    try:
+        url = storage.url(
+            name, parameters={"ResponseContentDisposition": disposition}
+        )
+    except TypeError:
+        # Backends without S3-style response parameters.
+        url = storage.url(name)
+    return HttpResponseRedirect(url)
+
+
+def serve_file(request, file_path: str, *, filename: str) -> HttpResponse:
+    """
+    Return a response that delivers `file_path` as an attachment.
+
+    `VIDEO_FILE_SERVING_BACKEND` selects how the bytes are moved:
+
+    - "python" (default): `FileResponse`; WSGI servers that provide
+      `wsgi.file_wrapper` (gunicorn) hand the open file to `os.sendfile`.
+    - "x-accel-redirect": nginx serves the file from an `internal` location
+      mapped to `VIDEO_FILE_SERVING_ACCEL_PREFIX`.
+    - "x-sendfile": Apache mod_xsendfile / lighttpd serve the absolute path.
+
+    With the proxy backends the worker only returns headers; the proxy also
+    handles Range and conditional requests itself. The python backend
+    answers them here (see `_python_response`).
+    """
+    backend = getattr(settings, "VIDEO_FILE_SERVING_BACKEND", BACKEND_PYTHON)
+    if backend == BACKEND_X_ACCEL_REDIRECT:
+        return _proxy_response(
+            "X-Accel-Redirect", _accel_location(file_path), filename=filename
+        )
+    if backend == BACKEND_X_SENDFILE:
+        return _proxy_response("X-Sendfile", file_path, filename=filename)
+    return _python_response(request, file_path, filename=filename)
+
+
+def _python_response(request, file_path: str, *, filename: str) -> HttpResponse:
+    """
+    Serve a file in-process with validators, 304s and byte ranges.
+
+    Every response carries a strong ETag, Last-Modified and
+    `Accept-Ranges: bytes`. `If-None-Match` / `If-Modified-Since` yield a
+    304, `Range` yields a 206 (multipart/byteranges for several ranges) or
+    a 416 when nothing is satisfiable, and `If-Range` falls back to the full
+    file once it changed.
+    """
+    stat = os.stat(file_path)
+    size = stat.st_size
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    last_modified = int(stat.st_mtime)
+    validators = {
+        "ETag": etag,
+        "Last-Modified": http_date(last_modified),
+        "Accept-Ranges": "bytes",
+    }
+
+    conditional = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if conditional is not None:
+        return _with_headers(conditional, validators)
+
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    ranges = None
+    if request.method in ("GET", "HEAD") and _if_range_matches(
+        request, etag, last_modified
+    ):
+        ranges = parse_range_header(request.headers.get("Range"), size)
+
+    if ranges is None:
+        response = FileResponse(
+            open(file_path, "rb"), as_attachment=True, filename=filename
+        )
+        return _with_headers(response, validators)
+
+    if not ranges:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return _with_headers(response, validators)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        response = StreamingHttpResponse(
+            _iter_file(file_path, start, end),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(end - start + 1)
+    else:
+        boundary = uuid.uuid4().hex
+        parts = [
+            (
+                f"--{boundary}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+            ).encode("ascii")
+            for start, end in ranges
+        ]
+        closing = f"--{boundary}--\r\n".encode("ascii")
+        # Each part is its header, the bytes and a trailing CRLF.
+        length = sum(
+            len(part) + end - start + 1 + 2
+            for part, (start, end) in zip(parts, ranges)
+        )
+        response = StreamingHttpResponse(
+            _iter_multipart(file_path, ranges, parts, closing),
+            status=206,
+            content_type=f"multipart/byteranges; boundary={boundary}",
+        )
+        response["Content-Length"] = str(length + len(closing))
+
+    response["Content-Disposition"] = content_disposition_header(True, filename)
+    return _with_headers(response, validators)
+
+
+def parse_range_header(
+    header: Optional[str], size: int
+) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parse a `Range: bytes=...` header into inclusive `(start, end)` pairs.
+
+    Returns None when the header is absent, malformed, not in bytes or asks
+    for more than `VIDEO_FILE_SERVING_MAX_RANGES` ranges (the full file is
+    served), and an empty list when no range is satisfiable (416).
+    """
+    if not header:
+        return None
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs:
+        return None
+    specs = [spec.strip() for spec in specs.split(",")]
+    if len(specs) > int(getattr(settings, "VIDEO_FILE_SERVING_MAX_RANGES", 16)):
+        return None
+
+    ranges = []
+    for spec in specs:
+        first, dash, last = spec.partition("-")
+        if not dash:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else None
+                if end is not None and end < start:
+                    return None
+                if start >= size:
+                    # Well-formed but past the end: unsatisfiable, not malformed.
+                    continue
+                if end is None:
+                    end = size - 1
+            else:
+                suffix = int(last)
+                start, end = max(0, size - suffix), size - 1
+                if suffix == 0:
+                    continue
+        except ValueError:
+            return None
+        if start < 0 or start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+    return ranges
+
+
+def _if_range_matches(request, etag: str, last_modified: int) -> bool:
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith(("\"", "W/")):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _iter_file(file_path: str, start: int, end: int) -> Iterator[bytes]:
+    with open(file_path, "rb") as handle:
+        yield from _read_range(handle, start, end)
+
+
+def _iter_multipart(
+    file_path: str,
+    ranges: List[Tuple[int, int]],
+    parts: List[bytes],
+    closing: bytes,
+) -> Iterator[bytes]:
+    with open(file_path, "rb") as handle:
+        for part, (start, end) in zip(parts, ranges):
+            yield part
+            yield from _read_range(handle, start, end)
+            yield b"\r\n"
+    yield closing
+
+
+def _read_range(handle, start: int, end: int) -> Iterator[bytes]:
+    handle.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        chunk = handle.read(min(_CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+
+def _with_headers(response: HttpResponse, headers: dict) -> HttpResponse:
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+def _accel_location(file_path: str) -> str:
+    prefix = getattr(
+        settings, "VIDEO_FILE_SERVING_ACCEL_PREFIX", "/protected-downloads/"
+    )
+    relative_path = os.path.relpath(file_path, download_storage().path(""))
+    return prefix.rstrip("/") + "/" + quote(relative_path.replace(os.sep, "/"))
+
+
+def _proxy_response(header: str, location: str, *, filename: str) -> HttpResponse:
+    content_type, _ = mimetypes.guess_type(filename)
+    response = HttpResponse(content_type=content_type or "application/octet-stream")
+    response[header] = location
+    response["Content-Disposition"] = content_disposition_header(True, filename)
+    return response
@@ -0,0 +1,95 @@
+import math
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+_MIB = 1024 * 1024
+# Weight of the newest sample in the per-host throughput average.
+_EWMA_ALPHA = 0.3
+
+
+def choose_concurrency(
+    *,
+    size_bytes: Optional[int],
+    stream_bps: Optional[float],
+    target_bps: float,
+    load: float,
+    maximum: int,
+) -> int:
+    """
+    Pick `concurrent_fragment_downloads` for one download.
+
+    - Size: each stream should fetch at least
+      `VIDEO_FRAGMENT_MIN_BYTES_PER_STREAM`, so short clips use one or two
+      connections while long DASH streams may use up to `maximum`.
+    - Throughput: with a measured per-stream rate for the host, open just
+      enough streams to reach `target_bps` (the bandwidth share, or
+      `VIDEO_FRAGMENT_TARGET_BPS`).
+    - Load: when most global download slots are busy, scale down so
+      concurrent jobs don't fight over the same uplink.
+    """
+    maximum = max(1, maximum)
+    concurrency = maximum
+    if size_bytes:
+        min_bytes = int(
+            getattr(settings, "VIDEO_FRAGMENT_MIN_BYTES_PER_STREAM", 16 * _MIB)
+        )
+        concurrency = min(concurrency, math.ceil(size_bytes / max(1, min_bytes)))
+    if stream_bps and target_bps > 0:
+        concurrency = min(concurrency, math.ceil(target_bps / stream_bps))
+    concurrency = math.ceil(concurrency * (1 - min(max(load, 0.0), 1.0) / 2))
+    return max(1, min(maximum, concurrency))
+
+
+def stream_throughput(host: str) -> Optional[float]:
+    """Return the recent average bytes/second per fragment stream for a host."""
+    return cache.get(_throughput_key(host))
+
+
+def record_throughput(host: str, bytes_per_second: float, concurrency: int) -> None:
+    """Fold one finished download's per-stream throughput into the host average."""
+    if bytes_per_second <= 0 or concurrency <= 0:
+        return
+    sample = bytes_per_second / concurrency
+    previous = cache.get(_throughput_key(host))
+    if previous is not None:
+        sample = _EWMA_ALPHA * sample + (1 - _EWMA_ALPHA) * previous
+    ttl = int(getattr(settings, "VIDEO_FRAGMENT_THROUGHPUT_TTL_SECONDS", 3600))
+    cache.set(_throughput_key(host), sample, timeout=ttl)
+
+
+class ThroughputMeter:
+    """Measures average transfer rate from yt-dlp progress events."""
+
+    def __init__(self, clock=time.monotonic) -> None:
+        self._clock = clock
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        # yt-dlp reports cumulative bytes per file (video and audio parts);
+        # keep the first and latest count so resumed files aren't overstated.
+        self._bytes: Dict[str, Tuple[int, int]] = {}
+
+    def observe(self, data: Dict) -> None:
+        now = self._clock()
+        if self._started_at is None:
+            self._started_at = now
+        self._finished_at = now
+        filename = data.get("filename") or ""
+        downloaded = data.get("downloaded_bytes") or 0
+        first, _latest = self._bytes.get(filename, (downloaded, downloaded))
+        self._bytes[filename] = (first, downloaded)
+
+    def bytes_per_second(self) -> Optional[float]:
+        if self._started_at is None or self._finished_at is None:
+            return None
+        elapsed = self._finished_at - self._started_at
+        total = sum(latest - first for first, latest in self._bytes.values())
+        if elapsed <= 0 or not total:
+            return None
+        return total / elapsed
+
+
+def _throughput_key(host: str) -> str:
+    return f"downloads:fragments:throughput:{host}"
@@ -0,0 +1,267 @@
+import copy
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict
+from time import monotonic, time
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+_YOUTUBE_HOSTS = {
+    "youtube.com",
+    "m.youtube.com",
+    "music.youtube.com",
+    "youtube-nocookie.com",
+    "youtu.be",
+}
+_TRACKING_PARAMS = {"fbclid", "gclid", "si", "feature", "igshid", "ref", "ref_src"}
+_STATS_HITS_KEY = "downloads:metadata:stats:hits"
+_STATS_MISSES_KEY = "downloads:metadata:stats:misses"
+_EXPIRE_RE = re.compile(r"[?&/]expire[=/](\d+)")
+
+
+def canonicalize_video_url(url: str) -> str:
+    """
+    Reduce a submitted URL to a stable identity for cache lookups.
+
+    YouTube links (watch, youtu.be, shorts, embed, playlist) map to the
+    provider video/playlist id; other providers keep host, path and the
+    query string minus tracking parameters, in sorted order.
+    """
+    parsed = urlparse((url or "").strip())
+    host = (parsed.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    path = parsed.path.rstrip("/") or "/"
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if key not in _TRACKING_PARAMS and not key.startswith("utm_")
+    ]
+
+    if host in _YOUTUBE_HOSTS:
+        params = dict(query)
+        video_id = ""
+        if host == "youtu.be":
+            video_id = path.strip("/").split("/")[0]
+        elif path == "/watch":
+            video_id = params.get("v", "")
+        else:
+            parts = path.split("/")
+            if len(parts) > 2 and parts[1] in ("shorts", "embed", "live", "v"):
+                video_id = parts[2]
+        list_id = params.get("list", "")
+        if path == "/playlist" and list_id:
+            return f"youtube:playlist:{list_id}"
+        if video_id and list_id:
+            return f"youtube:video:{video_id}:list:{list_id}"
+        if video_id:
+            return f"youtube:video:{video_id}"
+
+    return f"{host}{path}?{urlencode(sorted(query))}"
+
+
+class MetadataCache:
+    """
+    Two-tier cache for yt-dlp info dicts.
+
+    A small per-process LRU sits in front of a shared Django cache alias
+    (Redis in production, local memory in tests). Entries expire after
+    `VIDEO_METADATA_CACHE_TTL_SECONDS`; the local tier is bounded by
+    `VIDEO_METADATA_CACHE_LOCAL_MAX_ENTRIES` and the shared tier relies on
+    the backend's own eviction (MAX_ENTRIES / maxmemory-policy).
+    """
+
+    def __init__(self) -> None:
+        self._local: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(getattr(settings, "VIDEO_METADATA_CACHE_ENABLED", True))
+
+    @property
+    def ttl(self) -> int:
+        return int(getattr(settings, "VIDEO_METADATA_CACHE_TTL_SECONDS", 600))
+
+    @property
+    def local_max_entries(self) -> int:
+        return int(getattr(settings, "VIDEO_METADATA_CACHE_LOCAL_MAX_ENTRIES", 64))
+
+    @property
+    def backend(self):
+        return caches[getattr(settings, "VIDEO_METADATA_CACHE_ALIAS", "default")]
+
+    def make_key(self, url: str, *, fast: bool = False) -> str:
+        """Return the shared cache key for a URL and extraction mode."""
+        digest = hashlib.sha1(canonicalize_video_url(url).encode("utf-8")).hexdigest()
+        mode = "flat" if fast else "full"
+        return f"downloads:metadata:v1:{mode}:{digest}"
+
+    def get(self, url: str, *, fast: bool = False) -> Optional[Dict[str, Any]]:
+        """Return a cached info dict, or None on miss/expiry."""
+        if not self.enabled:
+            return None
+
+        key = self.make_key(url, fast=fast)
+        info = self._local_get(key)
+        if info is None:
+            try:
+                info = self.backend.get(key)
+            except Exception:
+                logger.warning("Metadata cache read failed for %s", key, exc_info=True)
+                info = None
+            if info is not None:
+                self._local_set(key, info)
+
+        self._count(hit=info is not None)
+        return info
+
+    def peek(self, url: str, *, fast: bool = False) -> Optional[Dict[str, Any]]:
+        """Read the shared tier without touching counters or the local tier."""
+        if not self.enabled:
+            return None
+        return self.backend.get(self.make_key(url, fast=fast))
+
+    def set(self, url: str, info: Dict[str, Any], *, fast: bool = False) -> None:
+        """Store an info dict in both tiers."""
+        if not self.enabled or not info:
+            return
+
+        key = self.make_key(url, fast=fast)
+        self._local_set(key, info)
+        try:
+            self.backend.set(key, info, timeout=self.ttl)
+        except Exception:
+            logger.warning("Metadata cache write failed for %s", key, exc_info=True)
+
+    def set_many(self, infos: Dict[str, Dict[str, Any]], *, fast: bool = False) -> None:
+        """Store several info dicts keyed by URL in one shared-tier round trip."""
+        if not self.enabled or not infos:
+            return
+
+        items = {self.make_key(url, fast=fast): info for url, info in infos.items()}
+        for key, info in items.items():
+            self._local_set(key, info)
+        try:
+            self.backend.set_many(items, timeout=self.ttl)
+        except Exception:
+            logger.warning(
+                "Metadata cache write failed for %d entries", len(items), exc_info=True
+            )
+
+    def delete(self, url: str, *, fast: bool = False) -> None:
+        key = self.make_key(url, fast=fast)
+        with self._lock:
+            self._local.pop(key, None)
+        self.backend.delete(key)
+
+    def clear_local(self) -> None:
+        with self._lock:
+            self._local.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return process-local and shared hit/miss counters."""
+        shared = self.backend.get_many([_STATS_HITS_KEY, _STATS_MISSES_KEY])
+        return {
+            "local_hits": self.hits,
+            "local_misses": self.misses,
+            "hits": int(shared.get(_STATS_HITS_KEY) or 0),
+            "misses": int(shared.get(_STATS_MISSES_KEY) or 0),
+        }
+
+    def _local_get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._local.get(key)
+            if item is None:
+                return None
+            expires_at, info = item
+            if expires_at <= monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+        # Callers merge playlist entries and build previews from the result;
+        # the shared tier hands out fresh unpickled dicts and so does this one.
+        return copy.deepcopy(info)
+
+    def _local_set(self, key: str, info: Dict[str, Any]) -> None:
+        max_entries = self.local_max_entries
+        if max_entries <= 0:
+            return
+        with self._lock:
+            self._local[key] = (monotonic() + self.ttl, copy.deepcopy(info))
+            self._local.move_to_end(key)
+            while len(self._local) > max_entries:
+                self._local.popitem(last=False)
+
+    def _count(self, *, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        key = _STATS_HITS_KEY if hit else _STATS_MISSES_KEY
+        try:
+            if not self.backend.add(key, 1, timeout=None):
+                self.backend.incr(key)
+        except Exception:
+            # Counters are best-effort; never fail a fetch because of them.
+            pass
+
+
+metadata_cache = MetadataCache()
+
+
+def signed_urls_expire_at(info: Dict[str, Any]) -> Optional[float]:
+    """
+    Return when the earliest signed stream URL in an info dict expires.
+
+    Reads the `expire` parameter providers such as YouTube put in format
+    URLs (query string or `/expire/<ts>/` path segment); None when no URL
+    carries one.
+    """
+    expiries = []
+    for fmt in info.get("formats") or []:
+        for url in (fmt.get("url"), fmt.get("manifest_url")):
+            match = _EXPIRE_RE.search(url or "")
+            if match:
+                expiries.append(float(match.group(1)))
+    return min(expiries) if expiries else None
+
+
+def fresh_video_info(url: str) -> Optional[Dict[str, Any]]:
+    """
+    Return a private copy of the cached info dict for a single video, or None.
+
+    Only entries with formats whose signed URLs stay valid for at least
+    `VIDEO_REUSE_INFO_MIN_TTL_SECONDS` qualify; without an expiry in the
+    URLs the extraction time (`epoch`) must be within
+    `VIDEO_REUSE_INFO_MAX_AGE_SECONDS`. Disabled by
+    `VIDEO_REUSE_FETCH_INFO = False`.
+    """
+    if not getattr(settings, "VIDEO_REUSE_FETCH_INFO", True):
+        return None
+    info = metadata_cache.get(url)
+    if not info or info.get("entries") or not info.get("formats"):
+        return None
+
+    now = time()
+    expire_at = signed_urls_expire_at(info)
+    if expire_at is not None:
+        min_ttl = float(getattr(settings, "VIDEO_REUSE_INFO_MIN_TTL_SECONDS", 600))
+        if expire_at - now < min_ttl:
+            return None
+    else:
+        max_age = float(getattr(settings, "VIDEO_REUSE_INFO_MAX_AGE_SECONDS", 300))
+        epoch = info.get("epoch")
+        if not epoch or now - epoch > max_age:
+            return None
+    # yt-dlp mutates the dict while processing; never hand out the cached one.
+    return copy.deepcopy(info)
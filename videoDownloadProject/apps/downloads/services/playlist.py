@@ -1,12 +1,51 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 
 from apps.downloads.models import DownloadJob
-from apps.downloads.services.access import enforce_download_constraints
+from apps.downloads.services.access import download_priority, reserve_download_slots
+from apps.downloads.services.entry_resolver import entry_url, resolve_missing_formats
+from apps.downloads.services.progress import progress_channel
 from apps.downloads.services.video_metadata import VideoMetadataFetcher
-from apps.downloads.tasks.download_tasks import enqueue_download_job
+from apps.downloads.tasks.download_tasks import enqueue_download_jobs
 from apps.videos.models import VideoFormat, VideoSource
 from utils.utils import normalize_entry
 
+# Bump when the shape of `build_fetch_payload` output changes.
+PREVIEW_SCHEMA_VERSION = 1
+
+_PAYLOAD_ENTRY_FIELDS = (
+    "id",
+    "title",
+    "thumbnail",
+    "height",
+    "uploader",
+    "extractor",
+    "extractor_key",
+    "duration",
+    "filesize",
+    "filesize_approx",
+    "upload_date",
+    "webpage_url",
+    "original_url",
+)
+_PAYLOAD_FORMAT_FIELDS = (
+    "format_id",
+    "format_note",
+    "ext",
+    "vcodec",
+    "acodec",
+    "width",
+    "height",
+    "fps",
+    "tbr",
+    "abr",
+    "filesize",
+    "filesize_approx",
+)
+
 
 def _truncate(value: Any, max_len: int) -> str:
     """
@@ -141,12 +180,54 @@ def fetch_data(playlist_url: str) -> List[Dict[str, Any]]:
     return VideoMetadataFetcher().fetch(playlist_url)
 
 
+def _pick(source: Dict[str, Any], fields: tuple) -> Dict[str, Any]:
+    """Copy the non-null `fields` of a yt-dlp dict."""
+    return {field: source[field] for field in fields if source.get(field) is not None}
+
+
+def build_fetch_payload(info: dict) -> Dict[str, Any]:
+    """
+    Reduce a raw yt-dlp info dict to the compact fetch task result.
+
+    Keeps only what the preview and `launch_playlist_downloads` read:
+    entry identity/display fields and the filtered formats of each entry,
+    without stream URLs, HTTP headers or fragment lists.
+    """
+    entries = info.get("entries") or []
+    if not entries:
+        entries = [info]
+
+    compact_entries: List[Dict[str, Any]] = []
+    for entry in entries:
+        if not entry:
+            continue
+        compact = _pick(entry, _PAYLOAD_ENTRY_FIELDS)
+        if not entry.get("webpage_url") and entry.get("url"):
+            # Flat playlist entries only carry the page URL in `url`.
+            compact["url"] = entry["url"]
+        compact["formats"] = [
+            _pick(fmt, _PAYLOAD_FORMAT_FIELDS)
+            for fmt in _filtered_formats(entry.get("formats") or [])
+        ]
+        compact_entries.append(compact)
+
+    return {
+        "schema_version": PREVIEW_SCHEMA_VERSION,
+        "id": info.get("id"),
+        "title": info.get("title"),
+        "webpage_url": info.get("webpage_url") or info.get("original_url"),
+        "entries": compact_entries,
+    }
+
+
 def build_playlist_preview(
     info: dict,
 ) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
     """
     Build preview data for UI without saving any models.
 
+    Accepts either a raw yt-dlp info dict or a `build_fetch_payload` result.
+
     Returns:
     - normalized entry list
     - filtered format list
@@ -159,68 +240,132 @@ def build_playlist_preview(
     return (normalize_entry(entries), formats)
 
 
-def launch_playlist_downloads(user, info: dict, format_id: str) -> List[DownloadJob]:
+def preview_cache_key(task_id: str) -> str:
+    """Return the cache key holding the memoized preview of a fetch task."""
+    return f"downloads:preview:v{PREVIEW_SCHEMA_VERSION}:{task_id}"
+
+
+def cached_playlist_preview(
+    task_id: str, info: Optional[dict] = None
+) -> Optional[tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]:
     """
-    Persist playlist entries and enqueue downloads for a selected format.
+    Return the memoized `build_playlist_preview` result for a fetch task.
 
-    Creates VideoSource + VideoFormat records, enforces user constraints,
-    and enqueues a download job per entry.
+    On a miss, builds and caches the preview from `info` when given,
+    otherwise returns None so callers can fall back to the task result.
     """
+    key = preview_cache_key(task_id)
+    preview = cache.get(key)
+    if preview is not None or info is None:
+        return preview
+
+    preview = build_playlist_preview(info)
+    cache.set(
+        key,
+        preview,
+        timeout=int(getattr(settings, "VIDEO_PREVIEW_CACHE_TTL_SECONDS", 3600)),
+    )
+    return preview
 
-    entries = info.get("entries") or []
-    if not entries:
-        entries = [info]
 
-    jobs: List[DownloadJob] = []
+def _get_or_create_sources(entries: List[Dict[str, Any]]) -> Dict[str, VideoSource]:
+    """
+    Return VideoSource rows for all entries keyed by canonical URL.
+
+    Existing rows are loaded with one query; missing ones are inserted with
+    a single `bulk_create` and re-read so concurrent inserts are tolerated.
+    """
+    urls = list(dict.fromkeys(entry_url(entry) for entry in entries))
+    sources = {
+        video.canonical_url: video
+        for video in VideoSource.objects.filter(canonical_url__in=urls)
+    }
+
+    missing: Dict[str, VideoSource] = {}
     for entry in entries:
-        entry_url = (
-            entry.get("webpage_url") or entry.get("url") or entry.get("original_url")
-        )
-        if not entry_url:
+        url = entry_url(entry)
+        if url in sources or url in missing:
             continue
+        missing[url] = VideoSource(
+            canonical_url=url,
+            provider=entry.get("extractor_key") or entry.get("extractor") or "unknown",
+            provider_video_id=entry.get("id") or "",
+            title=entry.get("title") or "Untitled",
+            channel_name=entry.get("uploader") or "",
+            thumbnail_url=entry.get("thumbnail") or "",
+            duration_seconds=entry.get("duration"),
+            raw_metadata=entry,
+        )
 
-        video, _ = VideoSource.objects.get_or_create(
-            canonical_url=entry_url,
-            defaults={
-                "provider": entry.get("extractor_key")
-                or entry.get("extractor")
-                or "unknown",
-                "provider_video_id": entry.get("id") or "",
-                "title": entry.get("title") or "Untitled",
-                "channel_name": entry.get("uploader") or "",
-                "thumbnail_url": entry.get("thumbnail") or "",
-                "duration_seconds": entry.get("duration"),
-                "raw_metadata": entry,
-            },
+    if missing:
+        VideoSource.objects.bulk_create(missing.values(), ignore_conflicts=True)
+        sources.update(
+            {
+                video.canonical_url: video
+                for video in VideoSource.objects.filter(canonical_url__in=list(missing))
+            }
         )
+    return sources
 
-        entry_formats = entry.get("formats") or []
-        if not entry_formats:
-            entry_info = VideoMetadataFetcher().fetch(entry_url)
-            entry_formats = entry_info.get("formats") or []
 
-        selected_formats = [
-            f for f in entry_formats if str(f.get("format_id")) == str(format_id)
-        ]
-        if not selected_formats:
-            # Format IDs from metadata can become stale between fetch and download.
-            # Fallback to the best currently available format to avoid hard failure.
-            fallback_candidates = _filtered_formats(entry_formats)
-            if fallback_candidates:
-                selected_formats = [fallback_candidates[0]]
-            else:
-                continue
+def _select_entry_format(
+    entry_formats: List[Dict[str, Any]], format_id: str
+) -> Optional[Dict[str, Any]]:
+    """Pick the requested format, or the best current one if it went stale."""
+    for fmt in entry_formats:
+        if str(fmt.get("format_id")) == str(format_id):
+            return fmt
+    # Format IDs from metadata can become stale between fetch and download.
+    # Fallback to the best currently available format to avoid hard failure.
+    fallback_candidates = _filtered_formats(entry_formats)
+    return fallback_candidates[0] if fallback_candidates else None
+
+
+def launch_playlist_downloads(user, info: dict, format_id: str) -> List[DownloadJob]:
+    """
+    Persist playlist entries and enqueue downloads for a selected format.
 
-        created_formats = _create_formats(video, selected_formats, use_filtered=False)
-        if not created_formats:
+    Sources, formats and jobs are written with bulk inserts, the daily quota
+    is reserved once for the whole batch, and the download tasks are
+    published as one Celery group after commit. When the quota only covers
+    part of the playlist, the leading entries that fit are launched.
+    """
+
+    entries = info.get("entries") or []
+    if not entries:
+        entries = [info]
+    entries = [entry for entry in entries if entry and entry_url(entry)]
+    if not entries:
+        return []
+    # Normally a no-op: the fetch task already resolves flat entries.
+    entries = resolve_missing_formats(entries)
+
+    sources = _get_or_create_sources(entries)
+
+    planned: List[tuple[VideoSource, VideoFormat]] = []
+    for entry in entries:
+        selected_format = _select_entry_format(entry.get("formats") or [], format_id)
+        if selected_format is None:
             continue
 
-        chosen_format = created_formats[0]
-        enforce_download_constraints(user, chosen_format)
+        video = sources[entry_url(entry)]
+        created_formats = _create_formats(video, [selected_format], use_filtered=False)
+        planned.append((video, created_formats[0]))
 
-        chosen_format.save()
-        job = DownloadJob.objects.create(user=user, video=video, format=chosen_format)
-        enqueue_download_job(job.id, use_on_commit=False)
-        jobs.append(job)
+    if not planned:
+        return []
+
+    with transaction.atomic():
+        allowed = reserve_download_slots(user, [fmt for _video, fmt in planned])
+        planned = planned[:allowed]
+        VideoFormat.objects.bulk_create([fmt for _video, fmt in planned])
+        jobs = DownloadJob.objects.bulk_create(
+            [DownloadJob(user=user, video=video, format=fmt) for video, fmt in planned]
+        )
+        enqueue_download_jobs(
+            [job.id for job in jobs], priority=download_priority(user)
+        )
 
+    # Seed live progress so polling can skip the database until jobs finish.
+    progress_channel.publish_many(jobs)
     return jobs
@@ -0,0 +1,302 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Iterable, List
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+
+from apps.downloads.models import DownloadJob
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = DownloadJob.ACTIVE_STATUSES
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+def snapshot_from_job(job: DownloadJob) -> Dict[str, Any]:
+    """Return the live-progress snapshot for a job instance."""
+    return {
+        "job_id": str(job.id),
+        "status": job.status,
+        "title": job.video.title if job.video_id else "",
+        "progress_percent": job.progress_percent,
+        "bytes_downloaded": job.bytes_downloaded,
+        "bytes_total": job.bytes_total,
+        "speed_kbps": job.speed_kbps,
+        "eta_seconds": job.eta_seconds,
+        "output_filename": job.output_filename,
+        "published_at": time.time(),
+    }
+
+
+class ProgressChannel:
+    """
+    Live progress snapshots shared between workers and the web tier.
+
+    Workers publish one small dict per job into a cache alias
+    (`VIDEO_PROGRESS_CACHE_ALIAS`, Redis in production); views read them
+    with a single `get_many` instead of querying `DownloadJob` on every poll.
+
+    The channel only works when web and worker processes share that cache.
+    With a per-process backend (local memory, dummy) it is disabled: nothing
+    is published, reads come back empty and callers use the database.
+    `VIDEO_PROGRESS_CHANNEL_SHARED` overrides the detection.
+
+    On a Redis cache every publish also sends a pub/sub notification per
+    job, so streaming views (`listen`) wake up when a worker reports
+    progress instead of re-reading the cache on a timer.
+    """
+
+    @property
+    def backend(self):
+        return caches[getattr(settings, "VIDEO_PROGRESS_CACHE_ALIAS", "default")]
+
+    @property
+    def shared(self) -> bool:
+        """Return True when the cache alias is visible to every process."""
+        configured = getattr(settings, "VIDEO_PROGRESS_CHANNEL_SHARED", None)
+        if configured is not None:
+            return bool(configured)
+        return not isinstance(self.backend, (LocMemCache, DummyCache))
+
+    @property
+    def pushes(self) -> bool:
+        """Return True when publishes are also pushed over Redis pub/sub."""
+        return self.shared and isinstance(self.backend, RedisCache)
+
+    @property
+    def ttl(self) -> int:
+        return int(getattr(settings, "VIDEO_PROGRESS_SNAPSHOT_TTL_SECONDS", 3600))
+
+    @staticmethod
+    def key(job_id: Any) -> str:
+        return f"downloads:progress:{job_id}"
+
+    @staticmethod
+    def topic(job_id: Any) -> str:
+        return f"downloads:progress:events:{job_id}"
+
+    def publish(self, job: DownloadJob) -> None:
+        if not self.shared:
+            return
+        self.backend.set(self.key(job.id), snapshot_from_job(job), timeout=self.ttl)
+        self._notify([job.id])
+
+    def publish_many(self, jobs: Iterable[DownloadJob]) -> None:
+        if not self.shared:
+            return
+        jobs = list(jobs)
+        self.backend.set_many(
+            {self.key(job.id): snapshot_from_job(job) for job in jobs},
+            timeout=self.ttl,
+        )
+        self._notify([job.id for job in jobs])
+
+    def read_many(self, job_ids: List[Any]) -> Dict[str, Dict[str, Any]]:
+        """Return snapshots keyed by job id (as str) for the ids that have one."""
+        if not self.shared:
+            return {}
+        found = self.backend.get_many([self.key(job_id) for job_id in job_ids])
+        return {snapshot["job_id"]: snapshot for snapshot in found.values()}
+
+    async def aread_many(self, job_ids: List[Any]) -> Dict[str, Dict[str, Any]]:
+        """Async variant of `read_many` for streaming views."""
+        if not self.shared:
+            return {}
+        found = await self.backend.aget_many([self.key(job_id) for job_id in job_ids])
+        return {snapshot["job_id"]: snapshot for snapshot in found.values()}
+
+    @asynccontextmanager
+    async def listen(self, job_ids: List[Any]):
+        """
+        Yield an async `wait(timeout)` that returns once the jobs may have changed.
+
+        With Redis it blocks on the jobs' pub/sub topics, so a stream only
+        reads snapshots after a worker published one. Other backends have
+        nothing to subscribe to and `wait` sleeps
+        `VIDEO_PROGRESS_STREAM_INTERVAL_SECONDS` instead (polling).
+        """
+        if not self.pushes:
+            interval = float(
+                getattr(settings, "VIDEO_PROGRESS_STREAM_INTERVAL_SECONDS", 0.5)
+            )
+
+            async def wait(timeout: float) -> None:
+                await asyncio.sleep(min(interval, timeout))
+
+            yield wait
+            return
+
+        from redis import asyncio as redis_asyncio
+
+        client = redis_asyncio.from_url(self.backend._servers[0])
+        pubsub = client.pubsub()
+        await pubsub.subscribe(*[self.topic(job_id) for job_id in job_ids])
+
+        async def wait(timeout: float) -> None:
+            await pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+
+        try:
+            yield wait
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+    def _notify(self, job_ids: List[Any]) -> None:
+        if not self.pushes or not job_ids:
+            return
+        try:
+            client = self.backend._cache.get_client(write=True)
+            pipeline = client.pipeline(transaction=False)
+            for job_id in job_ids:
+                pipeline.publish(self.topic(job_id), "1")
+            pipeline.execute()
+        except Exception:
+            # Streams still see the snapshot on their next heartbeat.
+            logger.warning("Unable to notify progress listeners", exc_info=True)
+
+
+progress_channel = ProgressChannel()
+
+
+def load_snapshots(job_ids: List[Any]) -> Dict[str, Dict[str, Any]]:
+    """Load job snapshots with one database query and seed the live channel."""
+    jobs = list(DownloadJob.objects.filter(id__in=job_ids).select_related("video"))
+    if jobs:
+        progress_channel.publish_many(jobs)
+    return {str(job.id): snapshot_from_job(job) for job in jobs}
+
+
+def aggregate_progress(job_ids: List[Any], *, live: bool = True) -> Dict[str, Any]:
+    """
+    Summarize progress for a set of jobs (e.g. a playlist launch).
+
+    Reads all live snapshots with one cache round trip and loads only the
+    jobs without one from the database, in a single primary-key query.
+    With `live=False` every row comes from the database, which callers use
+    for the authoritative final state.
+
+    Returns per-item `rows` (in `job_ids` order), `counts` per status,
+    summed bytes, combined throughput of active jobs, an overall percent
+    and the first active row as `current`.
+    """
+    job_ids = [str(job_id) for job_id in job_ids]
+    snapshots = progress_channel.read_many(job_ids) if live else {}
+    missing = [job_id for job_id in job_ids if job_id not in snapshots]
+    if missing:
+        snapshots.update(load_snapshots(missing))
+
+    rows = [snapshots[job_id] for job_id in job_ids if job_id in snapshots]
+    active = [row for row in rows if row.get("status") in ACTIVE_STATUSES]
+    counts = Counter(row.get("status") for row in rows)
+    return {
+        "rows": rows,
+        "total": len(rows),
+        "counts": dict(counts),
+        "bytes_downloaded": sum(row.get("bytes_downloaded") or 0 for row in rows),
+        "bytes_total": sum(row.get("bytes_total") or 0 for row in rows),
+        "speed_kbps": sum(row.get("speed_kbps") or 0 for row in active),
+        "percent": (
+            sum(row.get("progress_percent") or 0 for row in rows) // len(rows)
+            if rows
+            else 0
+        ),
+        "current": active[0] if active else None,
+    }
+
+
+class ProgressSink:
+    """
+    Coalesce progress updates for a job and persist them on a threshold.
+
+    yt-dlp reports progress many times per second; the sink keeps the latest
+    values on the job instance and writes them only when the status changes,
+    progress advanced by `VIDEO_PROGRESS_FLUSH_PERCENT_STEP` points, or
+    `VIDEO_PROGRESS_FLUSH_INTERVAL_SECONDS` elapsed since the last write.
+    Snapshots are published to the live channel more often, at most every
+    `VIDEO_PROGRESS_PUBLISH_INTERVAL_SECONDS`.
+    """
+
+    def __init__(
+        self,
+        job: DownloadJob,
+        *,
+        min_interval: float | None = None,
+        min_percent_step: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        channel: ProgressChannel | None = None,
+    ):
+        self.job = job
+        self.channel = channel or progress_channel
+        self.publish_interval = float(
+            getattr(settings, "VIDEO_PROGRESS_PUBLISH_INTERVAL_SECONDS", 0.25)
+        )
+        self._last_publish_at: float | None = None
+        self.min_interval = (
+            float(getattr(settings, "VIDEO_PROGRESS_FLUSH_INTERVAL_SECONDS", 1.0))
+            if min_interval is None
+            else min_interval
+        )
+        self.min_percent_step = (
+            int(getattr(settings, "VIDEO_PROGRESS_FLUSH_PERCENT_STEP", 2))
+            if min_percent_step is None
+            else min_percent_step
+        )
+        self._clock = clock
+        self._dirty: set[str] = set()
+        self._last_flush_at: float | None = None
+        self._last_flush_percent = job.progress_percent or 0
+        self._last_flush_status = job.status
+
+    def update(self, *, force: bool = False, **values: Any) -> bool:
+        """Apply field values to the job; return True if they were written."""
+        for field, value in values.items():
+            if getattr(self.job, field) != value:
+                setattr(self.job, field, value)
+                self._dirty.add(field)
+
+        status_changed = self.job.status != self._last_flush_status
+        if force or status_changed or self._publish_due():
+            self.publish()
+
+        if force or self._should_flush():
+            return self.flush()
+        return False
+
+    def publish(self) -> None:
+        """Push the current snapshot to the live progress channel."""
+        self.channel.publish(self.job)
+        self._last_publish_at = self._clock()
+
+    def flush(self) -> bool:
+        """Write pending changes, if any."""
+        if not self._dirty:
+            return False
+
+        self.job.save(update_fields=sorted(self._dirty) + ["updated_at"])
+        self._dirty.clear()
+        self._last_flush_at = self._clock()
+        self._last_flush_percent = self.job.progress_percent or 0
+        self._last_flush_status = self.job.status
+        return True
+
+    def _publish_due(self) -> bool:
+        if self._last_publish_at is None:
+            return True
+        return self._clock() - self._last_publish_at >= self.publish_interval
+
+    def _should_flush(self) -> bool:
+        if not self._dirty:
+            return False
+        if self._last_flush_at is None or self.job.status != self._last_flush_status:
+            return True
+        percent_delta = (self.job.progress_percent or 0) - self._last_flush_percent
+        if percent_delta >= self.min_percent_step:
+            return True
+        return self._clock() - self._last_flush_at >= self.min_interval
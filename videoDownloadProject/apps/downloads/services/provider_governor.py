@@ -0,0 +1,261 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.common import ratelimit
+from apps.common.ratelimit import TOKEN_BUCKET, Rate
+from apps.downloads.services import single_flight
+from apps.downloads.services.exceptions import ProviderBusy
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_SCOPE = "*"
+
+_DEFAULT_LIMITS: Dict[str, Any] = {
+    "starts_per_minute": 30,
+    "max_inflight": 8,
+    "bandwidth_bytes_per_second": 0,
+    "fragment_concurrency": 8,
+}
+_HOST_ALIASES = {"youtu.be": "youtube.com"}
+_HOST_PREFIXES = ("www.", "m.", "music.")
+# Suggested retry delay when every in-flight slot is taken.
+_SLOT_POLL_SECONDS = 2.0
+
+
+def provider_host(url: str) -> str:
+    """Return the governed host for a URL (`www.`/`m.` stripped, aliases merged)."""
+    host = (urlsplit(url).hostname or "").lower()
+    for prefix in _HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    return _HOST_ALIASES.get(host, host) or "unknown"
+
+
+def provider_limits(host: str) -> Dict[str, Any]:
+    """
+    Return the limits for a provider host.
+
+    `VIDEO_PROVIDER_LIMITS` maps hosts (plus a "default" entry) to partial
+    overrides of `starts_per_minute`, `max_inflight`,
+    `bandwidth_bytes_per_second` and `fragment_concurrency`.
+    """
+    configured = getattr(settings, "VIDEO_PROVIDER_LIMITS", {})
+    return {
+        **_DEFAULT_LIMITS,
+        **configured.get("default", {}),
+        **configured.get(host, {}),
+    }
+
+
+@dataclass
+class Lease:
+    """Slots held by one running download; release it when the download ends."""
+
+    host: str
+    slots: List[Tuple[str, str]]
+    ratelimit: Optional[int]
+    fragment_concurrency: int
+    _refreshed_at: float = field(default_factory=time.monotonic)
+
+    def refresh(self) -> None:
+        """Extend the slot leases; cheap to call from progress hooks."""
+        if time.monotonic() - self._refreshed_at < _lease_seconds() / 3:
+            return
+        self._touch()
+
+    @contextmanager
+    def heartbeat(
+        self, on_beat: Optional[Callable[[], None]] = None
+    ) -> Iterator[None]:
+        """
+        Keep the slots alive from a background thread while the block runs.
+
+        Progress hooks only fire while bytes are moving; extraction and
+        post-processing (ffmpeg merges) can outlast the lease without them.
+        `on_beat` is called on every beat too, for other keys the download
+        holds.
+        """
+        stop = threading.Event()
+        interval = _lease_seconds() / 3
+
+        def beat() -> None:
+            while not stop.wait(interval):
+                try:
+                    self._touch()
+                    if on_beat is not None:
+                        on_beat()
+                except Exception:
+                    logger.warning(
+                        "Lease heartbeat for %s failed", self.host, exc_info=True
+                    )
+
+        thread = threading.Thread(
+            target=beat, name=f"governor-heartbeat-{self.host}", daemon=True
+        )
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def release(self) -> None:
+        _release(self.slots)
+        self.slots = []
+
+    def _touch(self) -> None:
+        self._refreshed_at = time.monotonic()
+        for key, _owner in self.slots:
+            cache.touch(key, _lease_seconds())
+
+
+def acquire(url: str, owner: str) -> Lease:
+    """
+    Reserve capacity for one download from `url`'s provider.
+
+    Takes a per-provider and a global in-flight slot (shared through the
+    cache) and one start token from the provider's token bucket. Slots
+    expire after `VIDEO_GOVERNOR_LEASE_SECONDS` unless refreshed
+    (`Lease.refresh`, `Lease.heartbeat`). Raises `ProviderBusy` with a
+    suggested retry delay as soon as there is no capacity, so the task is
+    requeued instead of holding its worker slot while it waits.
+
+    The limits only hold across workers on a shared cache (Redis via
+    `REDIS_CACHE_URL`). On a per-process cache the governor is off and
+    every download gets an unrestricted lease (system check
+    `downloads.W001` warns about it).
+    """
+    host = provider_host(url)
+    if not single_flight.shared():
+        return Lease(
+            host=host,
+            slots=[],
+            ratelimit=None,
+            fragment_concurrency=int(provider_limits(host)["fragment_concurrency"]),
+        )
+    lease, retry_after = _try_acquire(host, owner)
+    if lease is None:
+        raise ProviderBusy(host, retry_after)
+    return lease
+
+
+def penalize(host: str, seconds: Optional[float] = None) -> None:
+    """
+    Pause new downloads from a provider after throttling or a bot check.
+
+    Retrying immediately only burns retries and deepens the block.
+    """
+    if not single_flight.shared():
+        return
+    if seconds is None:
+        seconds = float(getattr(settings, "VIDEO_GOVERNOR_COOLDOWN_SECONDS", 300))
+    cache.set(_cooldown_key(host), time.time() + seconds, timeout=int(seconds) + 1)
+
+
+def is_throttle_error(message: str) -> bool:
+    """Return True for provider responses that signal rate limiting."""
+    text = (message or "").lower()
+    return "http error 429" in text or "too many requests" in text
+
+
+def global_utilization() -> float:
+    """Return the share of global in-flight slots currently held (0..1)."""
+    cap = int(getattr(settings, "VIDEO_GOVERNOR_MAX_INFLIGHT", 16))
+    if cap <= 0:
+        return 1.0
+    held = cache.get_many([_slot_key(GLOBAL_SCOPE, index) for index in range(cap)])
+    return len(held) / cap
+
+
+def _try_acquire(host: str, owner: str) -> Tuple[Optional[Lease], float]:
+    cooldown_until = cache.get(_cooldown_key(host))
+    if cooldown_until is not None and cooldown_until > time.time():
+        return None, max(1.0, cooldown_until - time.time())
+
+    limits = provider_limits(host)
+    global_cap = int(getattr(settings, "VIDEO_GOVERNOR_MAX_INFLIGHT", 16))
+    slots: List[Tuple[str, str]] = []
+    for scope, cap in ((host, int(limits["max_inflight"])), (GLOBAL_SCOPE, global_cap)):
+        slot = _claim_slot(scope, cap, owner)
+        if slot is None:
+            _release(slots)
+            return None, _SLOT_POLL_SECONDS
+        slots.append(slot)
+
+    rate = Rate(
+        limit=int(limits["starts_per_minute"]), window=60, algorithm=TOKEN_BUCKET
+    )
+    decision = ratelimit.get_backend().hit(f"governor:starts:{host}", rate)
+    if not decision.allowed:
+        _release(slots)
+        return None, max(0.5, decision.retry_after)
+
+    lease = Lease(
+        host=host,
+        slots=slots,
+        ratelimit=_bandwidth_share(host, limits, global_cap),
+        fragment_concurrency=int(limits["fragment_concurrency"]),
+    )
+    return lease, 0.0
+
+
+def _claim_slot(scope: str, cap: int, owner: str) -> Optional[Tuple[str, str]]:
+    if cap <= 0:
+        return None
+    keys = [_slot_key(scope, index) for index in range(cap)]
+    held = cache.get_many(keys)
+    for key in keys:
+        if key in held:
+            continue
+        if single_flight.claim(key, owner, timeout=_lease_seconds()) == owner:
+            return key, owner
+    return None
+
+
+def _bandwidth_share(
+    host: str, limits: Dict[str, Any], global_cap: int
+) -> Optional[int]:
+    """
+    Split the bandwidth ceilings evenly across in-flight downloads.
+
+    Shares are fixed when a download starts, so the ceiling is approximate
+    while the number of active downloads changes.
+    """
+    shares = []
+    global_ceiling = getattr(settings, "VIDEO_BANDWIDTH_CEILING_BYTES", 0)
+    ceilings = (
+        (GLOBAL_SCOPE, global_cap, global_ceiling),
+        (host, int(limits["max_inflight"]), limits["bandwidth_bytes_per_second"]),
+    )
+    for scope, cap, ceiling in ceilings:
+        ceiling = int(ceiling or 0)
+        if ceiling > 0:
+            active = len(cache.get_many([_slot_key(scope, i) for i in range(cap)]))
+            shares.append(ceiling // max(1, active))
+    return min(shares) if shares else None
+
+
+def _release(slots: List[Tuple[str, str]]) -> None:
+    for key, owner in slots:
+        single_flight.release(key, owner)
+
+
+def _lease_seconds() -> int:
+    return int(getattr(settings, "VIDEO_GOVERNOR_LEASE_SECONDS", 300))
+
+
+def _slot_key(scope: str, index: int) -> str:
+    return f"downloads:governor:slot:{scope}:{index}"
+
+
+def _cooldown_key(host: str) -> str:
+    return f"downloads:governor:cooldown:{host}"
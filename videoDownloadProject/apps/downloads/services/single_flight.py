@@ -0,0 +1,80 @@
+import time
+from typing import Callable, Optional, TypeVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+T = TypeVar("T")
+
+
+def shared() -> bool:
+    """
+    Return True when claims on the default cache exclude other processes.
+
+    With a per-process backend (local memory, dummy) every worker process
+    holds its own claims, so they only coordinate within one process.
+    `VIDEO_CACHE_SHARED` overrides the detection.
+    """
+    configured = getattr(settings, "VIDEO_CACHE_SHARED", None)
+    if configured is not None:
+        return bool(configured)
+    return not isinstance(cache, (LocMemCache, DummyCache))
+
+
+def claim(key: str, owner: str, *, timeout: int) -> str:
+    """
+    Try to become the single owner of `key`.
+
+    Returns the owner token stored under the key: `owner` when the claim
+    succeeded (or was already ours), otherwise the competing owner.
+    """
+    while True:
+        if cache.add(key, owner, timeout=timeout):
+            return owner
+        current = cache.get(key)
+        if current is not None:
+            return current
+        # The previous owner expired between `add` and `get`; try again.
+
+
+def owner_of(key: str) -> Optional[str]:
+    """Return the current owner token for `key`, if any."""
+    return cache.get(key)
+
+
+def refresh(key: str, owner: str, *, timeout: int) -> bool:
+    """Extend `key`'s expiry while `owner` holds it; return False if it doesn't."""
+    if cache.get(key) != owner:
+        return False
+    return cache.touch(key, timeout)
+
+
+def release(key: str, owner: str) -> None:
+    """Release `key` if it is still held by `owner`."""
+    if cache.get(key) == owner:
+        cache.delete(key)
+
+
+def wait_for(
+    key: str,
+    load: Callable[[], Optional[T]],
+    *,
+    timeout: float,
+    interval: float = 0.5,
+) -> Optional[T]:
+    """
+    Wait for the owner of `key` to publish a result.
+
+    Polls `load()` until it returns a value, the key is released, or the
+    timeout elapses. Returns the loaded value or None.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        value = load()
+        if value is not None:
+            return value
+        if cache.get(key) is None or time.monotonic() >= deadline:
+            return load()
+        time.sleep(interval)
@@ -0,0 +1,289 @@
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.downloads.models import DownloadJob, StoredArtifact
+from apps.downloads.services.download_storage import (
+    download_root,
+    download_storage,
+    is_local,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGET_BYTES = 20 * 1024**3
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_UNREFERENCED_TTL_SECONDS = 3600
+DEFAULT_UNTRACKED_GRACE_SECONDS = 6 * 3600
+
+# Files this app writes under the download root: `<slug>-<artifact key>` and
+# the older `<slug>-<unix time>` names, plus yt-dlp's `.part`, `.ytdl` and
+# per-format intermediates of both. Nothing else in the directory is touched.
+_OWNED_FILE_RE = re.compile(r"^[\w-]*-(?:[0-9a-f]{16}|\d{9,11})\.", re.ASCII)
+
+
+@dataclass
+class Eviction:
+    artifact_id: Optional[int]  # None for untracked files
+    relative_path: str
+    size_bytes: int
+    reason: str  # "ttl", "unreferenced" or "budget"
+    last_used_at: Optional[datetime] = None
+
+
+@dataclass
+class PruneReport:
+    budget_bytes: Optional[int]
+    ttl_seconds: Optional[int]
+    total_bytes: int = 0
+    evictions: List[Eviction] = field(default_factory=list)
+    dry_run: bool = False
+
+    @property
+    def freed_bytes(self) -> int:
+        return sum(eviction.size_bytes for eviction in self.evictions)
+
+    @property
+    def remaining_bytes(self) -> int:
+        return self.total_bytes - self.freed_bytes
+
+
+@dataclass
+class _Candidate:
+    artifact_id: Optional[int]
+    relative_path: str
+    size_bytes: int
+    last_used_at: datetime
+    referenced: bool
+
+
+def plan_eviction(
+    *,
+    budget_bytes: Optional[int] = None,
+    ttl_seconds: Optional[int] = None,
+) -> PruneReport:
+    """
+    Decide which stored artifacts and untracked files to evict.
+
+    Artifacts not accessed within `VIDEO_STORAGE_TTL_SECONDS` are always
+    evicted, and so are artifacts no job links to any more (`ref_count`
+    0) once unused for `VIDEO_STORAGE_UNREFERENCED_TTL_SECONDS`. After
+    that the least recently used ones go until the total fits
+    `VIDEO_STORAGE_BUDGET_BYTES`, unreferenced artifacts before the ones
+    jobs still link to. A setting of 0/None disables that rule.
+
+    The total also counts files under the download root that have no
+    artifact row (downloads from before artifacts existed, timestamped
+    fallback files, `.part` leftovers); they follow the TTL and budget
+    rules by modification time, except for files written within
+    `VIDEO_STORAGE_UNTRACKED_GRACE_SECONDS`, which may still be in use.
+    """
+    if budget_bytes is None:
+        budget_bytes = getattr(
+            settings, "VIDEO_STORAGE_BUDGET_BYTES", DEFAULT_BUDGET_BYTES
+        )
+    if ttl_seconds is None:
+        ttl_seconds = getattr(
+            settings, "VIDEO_STORAGE_TTL_SECONDS", DEFAULT_TTL_SECONDS
+        )
+
+    report = PruneReport(
+        budget_bytes=budget_bytes or None, ttl_seconds=ttl_seconds or None
+    )
+    now = timezone.now()
+    expires_before = now - timedelta(seconds=ttl_seconds) if ttl_seconds else None
+    unreferenced_ttl = getattr(
+        settings,
+        "VIDEO_STORAGE_UNREFERENCED_TTL_SECONDS",
+        DEFAULT_UNREFERENCED_TTL_SECONDS,
+    )
+    unreferenced_before = (
+        now - timedelta(seconds=unreferenced_ttl) if unreferenced_ttl else None
+    )
+    grace_before = now - timedelta(
+        seconds=getattr(
+            settings,
+            "VIDEO_STORAGE_UNTRACKED_GRACE_SECONDS",
+            DEFAULT_UNTRACKED_GRACE_SECONDS,
+        )
+    )
+
+    candidates = _tracked_candidates()
+    tracked_paths = (
+        {candidate.relative_path for candidate in candidates}
+        if is_local(download_storage())
+        else set()
+    )
+    candidates += _untracked_candidates(tracked_paths)
+    # Referenced artifacts go last.
+    candidates.sort(key=lambda item: (item.referenced, item.last_used_at))
+    report.total_bytes = sum(candidate.size_bytes for candidate in candidates)
+
+    remaining = report.total_bytes
+    for candidate in candidates:
+        untracked = candidate.artifact_id is None
+        if untracked and candidate.last_used_at >= grace_before:
+            continue
+        if expires_before and candidate.last_used_at < expires_before:
+            reason = "ttl"
+        elif (
+            not untracked
+            and not candidate.referenced
+            and unreferenced_before
+            and candidate.last_used_at < unreferenced_before
+        ):
+            reason = "unreferenced"
+        elif report.budget_bytes and remaining > report.budget_bytes:
+            reason = "budget"
+        else:
+            continue
+        report.evictions.append(
+            Eviction(
+                candidate.artifact_id,
+                candidate.relative_path,
+                candidate.size_bytes,
+                reason,
+                candidate.last_used_at,
+            )
+        )
+        remaining -= candidate.size_bytes
+    return report
+
+
+def prune_storage(
+    *,
+    dry_run: bool = False,
+    budget_bytes: Optional[int] = None,
+    ttl_seconds: Optional[int] = None,
+) -> PruneReport:
+    """
+    Evict files per `plan_eviction`; with `dry_run` only report.
+
+    Evictions skipped because the file was used after planning are left out
+    of the returned report.
+    """
+    report = plan_eviction(budget_bytes=budget_bytes, ttl_seconds=ttl_seconds)
+    report.dry_run = dry_run
+    if dry_run:
+        return report
+
+    report.evictions = [
+        eviction
+        for eviction in report.evictions
+        if (
+            _evict_untracked(eviction)
+            if eviction.artifact_id is None
+            else evict_artifact(
+                eviction.artifact_id, last_used_at=eviction.last_used_at
+            )
+        )
+    ]
+    return report
+
+
+def evict_artifact(
+    artifact_id: int, *, last_used_at: Optional[datetime] = None
+) -> bool:
+    """
+    Delete an artifact's file and row and detach the jobs that used it.
+
+    The row is locked first, so a concurrent `link_job` either completes
+    before (and the artifact is kept, having been used since
+    `last_used_at`) or finds the row gone. Returns True when evicted.
+    """
+    with transaction.atomic():
+        artifact = (
+            StoredArtifact.objects.select_for_update().filter(pk=artifact_id).first()
+        )
+        if artifact is None:
+            return False
+        if last_used_at is not None and artifact.last_accessed_at > last_used_at:
+            # Linked or served since it was planned for eviction.
+            return False
+        DownloadJob.objects.filter(artifact_id=artifact_id).update(
+            artifact=None, output_filename=""
+        )
+        artifact.delete()
+    try:
+        download_storage().delete(artifact.relative_path)
+    except Exception:
+        logger.warning("Unable to remove %s", artifact.relative_path, exc_info=True)
+    return True
+
+
+def _tracked_candidates() -> List[_Candidate]:
+    artifacts = StoredArtifact.objects.only(
+        "pk", "relative_path", "size_bytes", "ref_count", "last_accessed_at"
+    )
+    return [
+        _Candidate(
+            artifact.pk,
+            artifact.relative_path,
+            artifact.size_bytes,
+            artifact.last_accessed_at,
+            referenced=artifact.ref_count > 0,
+        )
+        for artifact in artifacts.iterator()
+    ]
+
+
+def _untracked_candidates(tracked_paths: set) -> List[_Candidate]:
+    """Return the app's files under the download root that have no artifact row."""
+    root = download_root()
+    if not root or not os.path.isdir(root):
+        return []
+    candidates = []
+    for directory, _dirs, filenames in os.walk(root):
+        for filename in filenames:
+            if not _OWNED_FILE_RE.match(filename):
+                continue
+            path = os.path.join(directory, filename)
+            relative_path = os.path.relpath(path, root)
+            if relative_path in tracked_paths:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            candidates.append(
+                _Candidate(
+                    None,
+                    relative_path,
+                    stat.st_size,
+                    _mtime(stat),
+                    referenced=False,
+                )
+            )
+    return candidates
+
+
+def _evict_untracked(eviction: Eviction) -> bool:
+    """Delete an untracked file unless it was written since planning."""
+    path = os.path.join(download_root(), eviction.relative_path)
+    try:
+        modified_at = _mtime(os.stat(path))
+    except OSError:
+        return False
+    if eviction.last_used_at is not None and modified_at > eviction.last_used_at:
+        return False
+    DownloadJob.objects.filter(
+        artifact__isnull=True, output_filename=eviction.relative_path
+    ).update(output_filename="")
+    try:
+        os.remove(path)
+    except OSError:
+        logger.warning("Unable to remove %s", path, exc_info=True)
+        return False
+    return True
+
+
+def _mtime(stat: os.stat_result) -> datetime:
+    return datetime.fromtimestamp(stat.st_mtime, tz=dt_timezone.utc)
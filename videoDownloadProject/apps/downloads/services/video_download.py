@@ -1,16 +1,74 @@
+import copy
+import hashlib
+import logging
 import os
 import time
 from typing import Any, Dict
 
 from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
 from django.utils import timezone
 from django.utils.text import slugify
 
-from apps.downloads.models import DownloadJob
-from apps.downloads.services.exceptions import DownloadFailed
+from apps.downloads.models import DownloadJob, StoredArtifact
+from apps.downloads.services import provider_governor, single_flight
+from apps.downloads.services.artifacts import (
+    artifact_key,
+    find_artifact,
+    link_job,
+    record_artifact,
+)
+from apps.downloads.services.exceptions import ArtifactInFlight, DownloadFailed
+from apps.downloads.services.fragment_tuning import (
+    ThroughputMeter,
+    choose_concurrency,
+    record_throughput,
+    stream_throughput,
+)
+from apps.downloads.services.metadata_cache import fresh_video_info
+from apps.downloads.services.progress import ProgressSink, progress_channel
 from apps.downloads.services.validators import ensure_format_allowed, validate_url
 from apps.downloads.services.yt_auth import build_ytdlp_common_opts, cookies_enabled, is_auth_challenge_error
+from apps.downloads.services.ytdl_pool import ytdl_pool
+
+logger = logging.getLogger(__name__)
+
+
+def _inflight_key(key: str) -> str:
+    return f"downloads:artifact:inflight:{key}"
+
+
+def _inflight_ttl() -> int:
+    return int(getattr(settings, "VIDEO_DOWNLOAD_INFLIGHT_TTL_SECONDS", 1800))
+
+
+def _complete_from_artifact(
+    job: DownloadJob,
+    artifact: StoredArtifact,
+    *,
+    extra_fields: list[str] | None = None,
+) -> None:
+    """Mark a job completed from a stored artifact and publish its snapshot."""
+    with transaction.atomic():
+        link_job(job, artifact)
+        job.status = "completed"
+        job.progress_percent = 100
+        job.completed_at = timezone.now()
+        job.awaiting_artifact = ""
+        job.save(
+            update_fields=[
+                "artifact",
+                "output_filename",
+                "status",
+                "progress_percent",
+                "completed_at",
+                "awaiting_artifact",
+                "updated_at",
+                *(extra_fields or []),
+            ]
+        )
+    progress_channel.publish(job)
 
 
 class VideoDownload:
@@ -23,6 +81,15 @@ class VideoDownload:
         self.user = job.user
         self.video = job.video
         self.video_format = job.format
+        self.progress = ProgressSink(job)
+        self.lease: provider_governor.Lease | None = None
+        self.meter = ThroughputMeter()
+        # Single-flight key held while this job downloads an artifact.
+        self.inflight_key: str | None = None
+        self._inflight_refreshed_at = 0.0
+        # Jobs that deferred to this download and were completed from it;
+        # the task records their history and releases their quota slots.
+        self.completed_followers: list[DownloadJob] = []
 
     def _build_output_dir(self) -> str:
         """Ensure the download output directory exists and return it."""
@@ -33,19 +100,26 @@ class VideoDownload:
         os.makedirs(base_dir, exist_ok=True)
         return base_dir
 
-    def _build_output_filename(self) -> str:
+    def _build_output_filename(self, key: str = "") -> str:
         """Build a safe, readable output filename template."""
 
         base_title = self.video.title or "video"
         slug = slugify(base_title) or "video"
         slug = slug[:80]
-        # return f"{slug}-{self.video.id}-{int(time.time())}.%(ext)s"
+        if key:
+            # Content-addressed: every job for this artifact shares the file.
+            return f"{slug}-{key[:16]}.%(ext)s"
         return f"{slug}-{int(time.time())}.%(ext)s"
 
     def _progress_hook(self, data: Dict[str, Any]) -> None:
-        """Persist progress updates emitted by yt-dlp."""
+        """Record progress updates emitted by yt-dlp (persisted by the sink)."""
+
+        if self.lease is not None:
+            self.lease.refresh()
+        self._refresh_inflight()
 
         if data.get("status") == "downloading":
+            self.meter.observe(data)
             downloaded = data.get("downloaded_bytes") or 0
             total = data.get("total_bytes") or data.get("total_bytes_estimate")
             speed = data.get("speed")
@@ -55,46 +129,152 @@ class VideoDownload:
             if total:
                 percent = int(min(100, (downloaded / total) * 100))
 
-            self.job.progress_percent = percent
-            self.job.bytes_downloaded = downloaded
-            self.job.bytes_total = total
-            self.job.speed_kbps = int(speed / 1024) if speed else None
-            self.job.eta_seconds = int(eta) if eta is not None else None
-            self.job.status = "downloading"
-            self.job.started_at = self.job.started_at or timezone.now()
-            self.job.save(
-                update_fields=[
-                    "progress_percent",
-                    "bytes_downloaded",
-                    "bytes_total",
-                    "speed_kbps",
-                    "eta_seconds",
-                    "status",
-                    "started_at",
-                    "updated_at",
-                ]
+            self.progress.update(
+                progress_percent=percent,
+                bytes_downloaded=downloaded,
+                bytes_total=total,
+                speed_kbps=int(speed / 1024) if speed else None,
+                eta_seconds=int(eta) if eta is not None else None,
+                status="downloading",
+                started_at=self.job.started_at or timezone.now(),
             )
 
         if data.get("status") == "finished":
-            self.job.progress_percent = 100
-            self.job.status = "completed"
-            self.job.completed_at = timezone.now()
-            self.job.save(
-                update_fields=[
-                    "progress_percent",
-                    "status",
-                    "completed_at",
-                    "updated_at",
-                ]
+            self.progress.update(
+                force=True,
+                progress_percent=100,
+                status="completed",
+                completed_at=timezone.now(),
             )
 
     def download(self) -> None:
-        """Run the download and persist final metadata to the job."""
+        """
+        Run the download and persist final metadata to the job.
+
+        Raises `ArtifactInFlight` when another job is already downloading the
+        same file; see `_claim`.
+        """
         ensure_format_allowed(getattr(self.user, "profile", None), self.video_format)
 
         url = validate_url(self.video.canonical_url)
+        key = artifact_key(self.video, self.video_format)
+        # Coalescing needs a claim every worker process sees; without a shared
+        # cache each job downloads to its own file (see `_run_download`).
+        coalesce = single_flight.shared()
+        while True:
+            artifact = find_artifact(key)
+            if artifact is None and coalesce:
+                artifact = self._claim(key)
+            if artifact is None:
+                break
+            # Same video and format already stored: link instead of downloading.
+            self.job.bytes_downloaded = artifact.size_bytes
+            self.job.bytes_total = artifact.size_bytes
+            try:
+                self._complete(
+                    artifact, extra_fields=["bytes_downloaded", "bytes_total"]
+                )
+                return
+            except StoredArtifact.DoesNotExist:
+                # Evicted between the lookup and the link; look again.
+                continue
+
+        try:
+            self._run_download(url, key)
+        finally:
+            if self.inflight_key is not None:
+                single_flight.release(self.inflight_key, str(self.job.id))
+            self.inflight_key = None
+
+    def _claim(self, key: str) -> StoredArtifact | None:
+        """
+        Become the only job downloading the artifact, or defer to its leader.
+
+        Returns None once this job holds the claim and should download.
+        Followers do not wait inside the worker: they record the key they
+        wait on and raise `ArtifactInFlight`, so the task is requeued. The
+        leader completes them when its file is stored; the requeued task is
+        the fallback when the leader fails or dies and its claim expires.
+        """
+        owner = str(self.job.id)
+        inflight = _inflight_key(key)
+        if single_flight.claim(inflight, owner, timeout=_inflight_ttl()) == owner:
+            # The previous leader may have stored the file since the lookup.
+            artifact = find_artifact(key)
+            if artifact is not None:
+                single_flight.release(inflight, owner)
+                return artifact
+            self.inflight_key = inflight
+            self._inflight_refreshed_at = time.monotonic()
+            return None
+
+        if self.job.awaiting_artifact != key:
+            self.job.awaiting_artifact = key
+            self.job.save(update_fields=["awaiting_artifact", "updated_at"])
+        # Registered after the leader completed its followers: finish now.
+        artifact = find_artifact(key)
+        if artifact is not None:
+            return artifact
+        raise ArtifactInFlight(
+            key,
+            float(getattr(settings, "VIDEO_DOWNLOAD_COALESCE_RECHECK_SECONDS", 60)),
+        )
+
+    def _refresh_inflight(self) -> None:
+        """Keep the artifact claim alive while the download makes progress."""
+        if self.inflight_key is None:
+            return
+        ttl = _inflight_ttl()
+        now = time.monotonic()
+        if now - self._inflight_refreshed_at < ttl / 3:
+            return
+        self._inflight_refreshed_at = now
+        single_flight.refresh(self.inflight_key, str(self.job.id), timeout=ttl)
+
+    def _complete_followers(self, key: str, artifact: StoredArtifact) -> None:
+        """Complete the jobs that deferred to this download of `key`."""
+        follower_ids = list(
+            DownloadJob.objects.filter(
+                awaiting_artifact=key, status__in=DownloadJob.ACTIVE_STATUSES
+            )
+            .exclude(pk=self.job.pk)
+            .values_list("pk", flat=True)
+        )
+        for follower_id in follower_ids:
+            with transaction.atomic():
+                # Lock and re-check: the follower's own requeued task may be
+                # completing it concurrently.
+                follower = (
+                    DownloadJob.objects.select_for_update()
+                    .select_related("user")
+                    .filter(
+                        pk=follower_id,
+                        awaiting_artifact=key,
+                        status__in=DownloadJob.ACTIVE_STATUSES,
+                    )
+                    .first()
+                )
+                if follower is None:
+                    continue
+                follower.bytes_downloaded = artifact.size_bytes
+                follower.bytes_total = artifact.size_bytes
+                try:
+                    _complete_from_artifact(
+                        follower,
+                        artifact,
+                        extra_fields=["bytes_downloaded", "bytes_total"],
+                    )
+                except StoredArtifact.DoesNotExist:
+                    # Already evicted: the followers' requeued tasks download it.
+                    return
+            self.completed_followers.append(follower)
+
+    def _run_download(self, url: str, key: str) -> None:
+        """Download the artifact with yt-dlp and complete the job from it."""
         output_dir = self._build_output_dir()
-        filename = self._build_output_filename()
+        # Only the claim holder may write the content-addressed file; two
+        # unclaimed downloads would share its `.part` and fragment files.
+        filename = self._build_output_filename(key if self.inflight_key else "")
         output_path = os.path.join(output_dir, filename)
 
         try:
@@ -129,48 +309,37 @@ class VideoDownload:
                 ]
             )
 
-        ydl_opts = {
-            "outtmpl": output_path,
-            "progress_hooks": [self._progress_hook],
-            "noplaylist": True,
-            "socket_timeout": 15,
-            "retries": 3,
-            "fragment_retries": 3,
-            "concurrent_fragment_downloads": 8,
-        }
-        ydl_opts.update(build_ytdlp_common_opts())
+        # Raises ProviderBusy when the provider has no capacity left; the task
+        # requeues the job instead of spending a retry.
+        self.lease = provider_governor.acquire(url, str(self.job.id))
+        try:
+            # Progress hooks keep the lease alive while bytes move; the
+            # heartbeat covers extraction and post-processing as well.
+            with self.lease.heartbeat(on_beat=self._refresh_inflight):
+                concurrency = self._fragment_concurrency()
+                result, last_exc = self._extract(
+                    YoutubeDL, url, output_path, format_selectors, concurrency
+                )
+        finally:
+            self._record_throughput()
+            self.lease.release()
+            self.lease = None
 
-        last_exc: Exception | None = None
-        result: Dict[str, Any] | None = None
-        for selector in format_selectors:
-            try:
-                attempt_opts = dict(ydl_opts)
-                attempt_opts["format"] = selector
-                with YoutubeDL(attempt_opts) as ydl:
-                    result = ydl.extract_info(url, download=True)
-                    break
-            except Exception as exc:
-                last_exc = exc
-                message = str(exc)
-                if is_auth_challenge_error(message):
-                    if not cookies_enabled():
-                        raise DownloadFailed(
-                            "YouTube requires valid authenticated cookies on the worker server. "
-                            "Set YTDLP_COOKIES_B64 (or YTDLP_COOKIES_FILE) on both web and worker services."
-                        ) from exc
-                    raise DownloadFailed(
-                        "YouTube rejected current cookies. Re-export fresh YouTube cookies and update YTDLP_COOKIES_B64."
-                    ) from exc
-                # Try next selector only when format is unavailable.
-                if "Requested format is not available" in message:
-                    continue
-                raise
+        # Persist whatever the throttled sink still holds before finalizing.
+        self.progress.flush()
 
         if result is None:
             if last_exc is not None:
                 raise last_exc
             raise DownloadFailed("Unable to download video with available formats.")
 
+        file_path = self._result_path(result)
+        if file_path:
+            artifact = record_artifact(key, file_path)
+            self._complete(artifact)
+            self._complete_followers(key, artifact)
+            return
+
         with transaction.atomic():
             # Rebuild a filename from the successful result payload.
             ext = result.get("ext") or self.video_format.container or "mp4"
@@ -185,3 +354,173 @@ class VideoDownload:
                     "updated_at",
                 ]
             )
+        self.progress.publish()
+
+    def _fragment_concurrency(self) -> int:
+        """Choose and record the fragment concurrency for this download."""
+        target_bps = self.lease.ratelimit or int(
+            getattr(settings, "VIDEO_FRAGMENT_TARGET_BPS", 32 * 1024 * 1024)
+        )
+        concurrency = choose_concurrency(
+            size_bytes=self.video_format.size_bytes or self.job.bytes_total,
+            stream_bps=stream_throughput(self.lease.host),
+            target_bps=target_bps,
+            load=provider_governor.global_utilization(),
+            maximum=self.lease.fragment_concurrency,
+        )
+        self.job.fragment_concurrency = concurrency
+        return concurrency
+
+    def _record_throughput(self) -> None:
+        """Feed the measured rate back to the controller and onto the job."""
+        bytes_per_second = self.meter.bytes_per_second()
+        if bytes_per_second and self.job.fragment_concurrency:
+            record_throughput(
+                self.lease.host, bytes_per_second, self.job.fragment_concurrency
+            )
+            self.job.throughput_kbps = int(bytes_per_second / 1024)
+        DownloadJob.objects.filter(pk=self.job.pk).update(
+            fragment_concurrency=self.job.fragment_concurrency,
+            throughput_kbps=self.job.throughput_kbps,
+        )
+
+    def _extract(
+        self,
+        YoutubeDL,
+        url: str,
+        output_path: str,
+        format_selectors: list[str],
+        concurrency: int,
+    ) -> tuple[Dict[str, Any] | None, Exception | None]:
+        """Run yt-dlp over the selector chain within the current lease."""
+        ydl_opts = {
+            "outtmpl": output_path,
+            "progress_hooks": [self._progress_hook],
+            "noplaylist": True,
+            "socket_timeout": 15,
+            "retries": 3,
+            "fragment_retries": 3,
+            "concurrent_fragment_downloads": concurrency,
+        }
+        if self.lease.ratelimit:
+            ydl_opts["ratelimit"] = self.lease.ratelimit
+        ydl_opts.update(build_ytdlp_common_opts())
+
+        cached_selector = cache.get(self._selector_cache_key())
+        if cached_selector:
+            format_selectors = [cached_selector] + [
+                selector for selector in format_selectors if selector != cached_selector
+            ]
+
+        try:
+            cached_info = fresh_video_info(url)
+            if cached_info is not None:
+                # Start from the fetch-time extraction while its signed URLs
+                # are still valid; saves one provider round trip.
+                try:
+                    result, _ = self._download_info(
+                        YoutubeDL, ydl_opts, cached_info, format_selectors
+                    )
+                    if result is not None:
+                        return result, None
+                except Exception as exc:
+                    message = str(exc)
+                    if is_auth_challenge_error(message):
+                        raise
+                    if provider_governor.is_throttle_error(message):
+                        raise
+                    # URLs rejected (expired early or bound to another IP);
+                    # fall back to a fresh extraction below.
+                    logger.info("Cached info for %s unusable; re-extracting", url)
+
+            # Extract once; every selector is then resolved against this
+            # format list locally instead of re-extracting per attempt.
+            with ytdl_pool.lease(YoutubeDL, ydl_opts) as probe:
+                info = probe.extract_info(url, download=False, process=False)
+            return self._download_info(YoutubeDL, ydl_opts, info, format_selectors)
+        except Exception as exc:
+            message = str(exc)
+            if is_auth_challenge_error(message):
+                # Back off the whole provider instead of retrying into the
+                # same bot check from every worker.
+                provider_governor.penalize(self.lease.host)
+                if not cookies_enabled():
+                    raise DownloadFailed(
+                        "YouTube requires valid authenticated cookies on the worker server. "
+                        "Set YTDLP_COOKIES_B64 (or YTDLP_COOKIES_FILE) on both web and worker services."
+                    ) from exc
+                raise DownloadFailed(
+                    "YouTube rejected current cookies. Re-export fresh YouTube cookies and update YTDLP_COOKIES_B64."
+                ) from exc
+            if provider_governor.is_throttle_error(message):
+                provider_governor.penalize(self.lease.host)
+            raise
+
+    def _download_info(
+        self,
+        YoutubeDL,
+        ydl_opts: Dict[str, Any],
+        info: Dict[str, Any],
+        format_selectors: list[str],
+    ) -> tuple[Dict[str, Any] | None, Exception | None]:
+        """
+        Download `info` with the first selector yt-dlp can satisfy.
+
+        yt-dlp sorts and fills in the formats while processing and reports
+        "Requested format is not available" for a selector without a match,
+        so selectors are not pre-filtered here. Processing mutates the info
+        dict, so each attempt gets its own copy.
+        """
+        last_exc: Exception | None = None
+        for selector in format_selectors:
+            try:
+                with ytdl_pool.lease(
+                    YoutubeDL, {**ydl_opts, "format": selector}
+                ) as ydl:
+                    result = ydl.process_ie_result(copy.deepcopy(info), download=True)
+            except Exception as exc:
+                # Try next selector only when format is unavailable.
+                if "Requested format is not available" in str(exc):
+                    last_exc = exc
+                    continue
+                raise
+            cache.set(
+                self._selector_cache_key(),
+                selector,
+                timeout=int(
+                    getattr(settings, "VIDEO_SELECTOR_CACHE_TTL_SECONDS", 6 * 3600)
+                ),
+            )
+            return result, None
+        return None, last_exc
+
+    def _selector_cache_key(self) -> str:
+        """Cache key for the selector that worked for this video and format."""
+        identity = self.video.provider_video_id or self.video.canonical_url
+        requested = self.video_format.format_id or self.video_format.quality_label
+        digest = hashlib.sha256(
+            "|".join(
+                [
+                    self.video.provider.lower(),
+                    identity,
+                    requested,
+                    "audio" if self.video_format.is_audio_only else "video",
+                ]
+            ).encode("utf-8")
+        ).hexdigest()
+        return f"downloads:selector:{digest}"
+
+    @staticmethod
+    def _result_path(result: Dict[str, Any]) -> str | None:
+        """Return the final file path yt-dlp wrote (after merging), if known."""
+        requested = result.get("requested_downloads") or []
+        candidates = [item.get("filepath") for item in requested]
+        candidates += [result.get("filepath"), result.get("_filename")]
+        for path in candidates:
+            if path and os.path.isfile(path):
+                return path
+        return None
+
+    def _complete(self, artifact, *, extra_fields: list[str] | None = None) -> None:
+        """Mark the job completed from a stored artifact."""
+        _complete_from_artifact(self.job, artifact, extra_fields=extra_fields)
@@ -2,8 +2,10 @@ import json
 from typing import Any, Dict
 
 from apps.downloads.services.exceptions import DownloadFailed
+from apps.downloads.services.metadata_cache import metadata_cache
 from apps.downloads.services.validators import validate_url
 from apps.downloads.services.yt_auth import build_ytdlp_common_opts, cookies_enabled, is_auth_challenge_error
+from apps.downloads.services.ytdl_pool import ytdl_pool
 
 
 class VideoMetadataFetcher:
@@ -18,10 +20,31 @@ class VideoMetadataFetcher:
                     return True
         return False
 
-    def fetch(self, url: str, *, fast: bool = False) -> Dict[str, Any]:
-        """Fetch metadata for a URL without downloading the media."""
+    def fetch(
+        self, url: str, *, fast: bool = False, use_cache: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Fetch metadata for a URL without downloading the media.
+
+        Results are served from the shared metadata cache when a fresh
+        entry exists for the canonicalized URL; pass `use_cache=False` to
+        force a new extraction.
+        """
 
         url = validate_url(url)
+        if use_cache:
+            cached = metadata_cache.get(url, fast=fast)
+            if cached is not None:
+                return cached
+
+        info = self._extract(url, fast=fast)
+        if use_cache:
+            metadata_cache.set(url, info, fast=fast)
+        return info
+
+    def _extract(self, url: str, *, fast: bool = False) -> Dict[str, Any]:
+        """Run yt-dlp extraction for a validated URL."""
+
         try:
             from yt_dlp import YoutubeDL
         except Exception as exc:  # pragma: no cover - runtime dependency
@@ -44,7 +67,7 @@ class VideoMetadataFetcher:
             )
 
         try:
-            with YoutubeDL(ydl_opts) as ydl:
+            with ytdl_pool.lease(YoutubeDL, ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=False)
                 # Some YouTube client profiles intermittently return audio-only sets.
                 # Retry with broader/default client options to recover video formats.
@@ -52,7 +75,7 @@ class VideoMetadataFetcher:
                     try:
                         fallback_opts = dict(ydl_opts)
                         fallback_opts.pop("extractor_args", None)
-                        with YoutubeDL(fallback_opts) as fallback_ydl:
+                        with ytdl_pool.lease(YoutubeDL, fallback_opts) as fallback_ydl:
                             fallback_info = fallback_ydl.extract_info(url, download=False)
                             if self._has_video_formats(fallback_info):
                                 return fallback_info
@@ -0,0 +1,150 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Options that differ between jobs: applied on every lease instead of being
+# part of the pool key, so one warmed instance serves many downloads.
+PER_LEASE_OPTIONS = (
+    "outtmpl",
+    "progress_hooks",
+    "format",
+    "ratelimit",
+    "concurrent_fragment_downloads",
+)
+
+
+class YoutubeDLPool:
+    """
+    Per-process pool of warmed YoutubeDL instances keyed by option set.
+
+    Reusing an instance keeps its loaded extractors, parsed cookie jar and
+    HTTP connections (keep-alive, TLS sessions) across tasks. Each lease
+    re-applies the per-job options and clears per-run counters; an instance
+    whose lease raised is closed instead of being reused. At most
+    `VIDEO_YTDL_POOL_MAX_IDLE` idle instances are kept per option set and
+    each is recycled after `VIDEO_YTDL_POOL_MAX_USES` leases.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._idle: "OrderedDict[str, List[Tuple[Any, int]]]" = OrderedDict()
+        self._pid = os.getpid()
+        atexit.register(self.clear)
+
+    @property
+    def max_idle(self) -> int:
+        return int(getattr(settings, "VIDEO_YTDL_POOL_MAX_IDLE", 4))
+
+    @property
+    def max_keys(self) -> int:
+        return int(getattr(settings, "VIDEO_YTDL_POOL_MAX_KEYS", 8))
+
+    @property
+    def max_uses(self) -> int:
+        return int(getattr(settings, "VIDEO_YTDL_POOL_MAX_USES", 100))
+
+    @contextmanager
+    def lease(self, factory, opts: Dict[str, Any]) -> Iterator[Any]:
+        """
+        Lend an instance built by `factory` (the YoutubeDL class) for `opts`.
+
+        Use it as a context manager in place of `with YoutubeDL(opts)`.
+        """
+        static = {
+            name: value for name, value in opts.items() if name not in PER_LEASE_OPTIONS
+        }
+        key = _options_key(factory, static)
+        ydl, uses = self._take(key)
+        if ydl is None:
+            ydl, uses = factory(dict(static)), 0
+        try:
+            _reset(ydl, opts)
+            yield ydl
+        except BaseException:
+            _close(ydl)
+            raise
+        self._give(key, ydl, uses + 1)
+
+    def clear(self) -> None:
+        """Close every idle instance (process shutdown, tests)."""
+        with self._lock:
+            idle, self._idle = self._idle, OrderedDict()
+        for instances in idle.values():
+            for ydl, _uses in instances:
+                _close(ydl)
+
+    def _take(self, key: str) -> Tuple[Any, int]:
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker: the parent's sockets must not be shared.
+                self._idle = OrderedDict()
+                self._pid = os.getpid()
+            instances = self._idle.get(key)
+            if not instances:
+                return None, 0
+            self._idle.move_to_end(key)
+            return instances.pop()
+
+    def _give(self, key: str, ydl, uses: int) -> None:
+        # Persist refreshed cookies like `YoutubeDL.close()` would.
+        ydl.save_cookies()
+        evicted = []
+        with self._lock:
+            instances = self._idle.setdefault(key, [])
+            self._idle.move_to_end(key)
+            if uses >= self.max_uses or len(instances) >= self.max_idle:
+                evicted.append(ydl)
+            else:
+                instances.append((ydl, uses))
+            while len(self._idle) > self.max_keys:
+                _key, stale = self._idle.popitem(last=False)
+                evicted.extend(instance for instance, _uses in stale)
+        for instance in evicted:
+            _close(instance)
+
+
+def _options_key(factory, static: Dict[str, Any]) -> str:
+    raw = json.dumps(static, sort_keys=True, default=repr)
+    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    return f"{factory.__module__}.{factory.__qualname__}:{digest}"
+
+
+def _reset(ydl, opts: Dict[str, Any]) -> None:
+    """Apply per-job options and clear per-run state, mirroring `__init__`."""
+    params = ydl.params
+    for name in PER_LEASE_OPTIONS:
+        params.pop(name, None)
+    params.update({name: opts[name] for name in PER_LEASE_OPTIONS if name in opts})
+    ydl._parse_outtmpl()
+    selector = params.get("format")
+    ydl.format_selector = (
+        selector
+        if selector in (None, "-") or callable(selector)
+        else ydl.build_format_selector(selector)
+    )
+    ydl._progress_hooks = list(params.get("progress_hooks") or [])
+    ydl._download_retcode = 0
+    ydl._num_downloads = 0
+    ydl._num_videos = 0
+    ydl._playlist_level = 0
+    ydl._playlist_urls = set()
+
+
+def _close(ydl) -> None:
+    try:
+        ydl.close()
+    except Exception:
+        logger.warning("Closing a pooled YoutubeDL failed", exc_info=True)
+
+
+ytdl_pool = YoutubeDLPool()
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from apps.downloads.models import DownloadJob
+from apps.downloads.services.artifacts import release_artifact
+
+
+@receiver(post_delete, sender=DownloadJob)
+def release_job_artifact(sender, instance, **kwargs):
+    """Drop the deleted job's reference on its shared file."""
+    if instance.artifact_id:
+        release_artifact(instance.artifact_id)
@@ -1,5 +1,11 @@
 """Download tasks package."""
 
 # Ensure Celery autodiscovery registers tasks in this package.
-from .download_tasks import enqueue_download_job, run_download_job  # noqa: F401
+from .download_tasks import (  # noqa: F401
+    enqueue_download_job,
+    enqueue_download_jobs,
+    run_download_job,
+)
 from .fetch_metadata_tasks import enqueue_fetch_data, run_fetch_metadata  # noqa: F401
+from .storage_tasks import prune_download_storage  # noqa: F401
+from .usage_tasks import reconcile_download_usage  # noqa: F401
@@ -1,47 +1,118 @@
 from __future__ import annotations
 
-from typing import Optional
+import math
+from typing import Iterable, Optional
 
-from celery import shared_task
-from celery.result import AsyncResult
+from celery import group, shared_task
+from celery.result import AsyncResult, GroupResult
 from django.db import transaction
 
 from apps.downloads.models import DownloadJob
-from apps.downloads.services.access import increment_daily_success_usage
+from apps.downloads.services.access import download_priority, release_download_slot
+from apps.downloads.services.exceptions import ArtifactInFlight, ProviderBusy
+from apps.downloads.services.progress import progress_channel
 from apps.downloads.services.video_download import VideoDownload
 from apps.history.models import History
 
+DOWNLOAD_MAX_RETRIES = 5
+
 
 @shared_task(
     bind=True,
+    # Long transfers: acknowledge only once finished so a lost worker's job
+    # is redelivered instead of being dropped with the prefetched messages.
+    acks_late=True,
     autoretry_for=(Exception,),
     retry_backoff=True,
     retry_jitter=True,
-    retry_kwargs={"max_retries": 5},
+    retry_kwargs={"max_retries": DOWNLOAD_MAX_RETRIES},
 )
 def run_download_job(self, job_id: str) -> None:
     """Execute a download job by id inside a Celery worker."""
 
     job = DownloadJob.objects.select_related("video", "format", "user").get(id=job_id)
-    success = False
+    if job.status in ("completed", "cancelled"):
+        # Already completed by the job it deferred to (`ArtifactInFlight`).
+        return
+    service = VideoDownload(job)
     try:
-        VideoDownload(job).download()
-        success = True
-    except Exception:
-        success = False
+        service.download()
+    except (ProviderBusy, ArtifactInFlight) as exc:
+        # Provider saturated or the same file is already downloading: requeue
+        # later without spending a retry, recording an attempt or releasing
+        # the quota slot, and without holding the worker slot while waiting.
+        run_download_job.apply_async(
+            args=(job_id,),
+            countdown=math.ceil(exc.retry_after),
+            priority=download_priority(job.user),
+            retries=self.request.retries,
+        )
+        return
+    except Exception as exc:
+        _finish_attempt(self, job, success=False, failure_reason=str(exc))
         raise
-    finally:
-        job.refresh_from_db()
-        History.objects.create(job=job, success=success)
-        if success:
-            increment_daily_success_usage(job.user)
+    _finish_attempt(self, job, success=True)
+    for follower in service.completed_followers:
+        History.objects.create(job=follower, success=True)
+        release_download_slot(follower, success=True)
+
+
+def _finish_attempt(
+    task, job: DownloadJob, *, success: bool, failure_reason: str = ""
+) -> None:
+    """Record the attempt and settle the job once it is done for good."""
+    job.refresh_from_db()
+    History.objects.create(job=job, success=success)
+    # Retried attempts keep their quota slot; release it once the job is done
+    # for good.
+    if success or task.request.retries >= DOWNLOAD_MAX_RETRIES:
+        if not success:
+            job.status = "failed"
+            job.failure_reason = failure_reason
+            job.save(update_fields=["status", "failure_reason", "updated_at"])
+            progress_channel.publish(job)
+        release_download_slot(job, success=success)
 
 
 def enqueue_download_job(
-    job_id: str, *, use_on_commit: bool = True
+    job_id: str, *, use_on_commit: bool = True, priority: Optional[int] = None
 ) -> Optional[AsyncResult]:
-    """Enqueue the download task; optionally wait for the DB transaction to commit."""
+    """
+    Enqueue the download task; optionally wait for the DB transaction to commit.
+
+    `priority` (see `download_priority`) orders the message within the
+    downloads queue.
+    """
+
+    def publish() -> AsyncResult:
+        if priority is None:
+            return run_download_job.delay(job_id)
+        return run_download_job.apply_async(args=(job_id,), priority=priority)
+
+    if use_on_commit:
+        transaction.on_commit(publish)
+        return None
+    return publish()
+
+
+def enqueue_download_jobs(
+    job_ids: Iterable[str],
+    *,
+    use_on_commit: bool = True,
+    priority: Optional[int] = None,
+) -> Optional[GroupResult]:
+    """Publish download tasks for many jobs as a single Celery group."""
+    job_ids = [str(job_id) for job_id in job_ids]
+    if not job_ids:
+        return None
+    options = {} if priority is None else {"priority": priority}
+
+    def publish() -> GroupResult:
+        return group(run_download_job.s(job_id) for job_id in job_ids).apply_async(
+            **options
+        )
+
     if use_on_commit:
-        transaction.on_commit(lambda: run_download_job.delay(job_id))
+        transaction.on_commit(publish)
         return None
-    return run_download_job.delay(job_id)
+    return publish()
@@ -1,12 +1,55 @@
+import uuid
 from typing import Optional
 
 from celery import shared_task
 from celery.result import AsyncResult
+from django.conf import settings
 
+from apps.downloads.services import single_flight
+from apps.downloads.services.entry_resolver import entry_url, resolve_missing_formats
 from apps.downloads.services.exceptions import DownloadFailed
+from apps.downloads.services.metadata_cache import metadata_cache
 from apps.downloads.services.video_metadata import VideoMetadataFetcher
 
 
+def _inflight_key(url: str) -> str:
+    """Return the single-flight key shared by fetches of the same video."""
+    return f"downloads:fetch:inflight:{metadata_cache.make_key(url)}"
+
+
+def _inflight_timeout() -> int:
+    return int(getattr(settings, "VIDEO_FETCH_INFLIGHT_TTL_SECONDS", 180))
+
+
+def _build_payload(task, info: dict) -> dict:
+    """Resolve flat playlist entries in parallel, then compact the result."""
+    # Imported here: services.playlist enqueues downloads through this
+    # package, so a module-level import would be circular.
+    from apps.downloads.services.playlist import build_fetch_payload
+
+    entries = info.get("entries") or []
+    if entries:
+
+        def report(done: int, total: int) -> None:
+            if task.request.id:
+                task.update_state(
+                    state="PROGRESS", meta={"resolved": done, "total": total}
+                )
+
+        entries = resolve_missing_formats(entries, on_progress=report)
+        # Cache each full entry under its own URL so download jobs can start
+        # from it instead of extracting again.
+        metadata_cache.set_many(
+            {
+                entry_url(entry): entry
+                for entry in entries
+                if entry and entry.get("formats") and entry_url(entry)
+            }
+        )
+        info = {**info, "entries": entries}
+    return build_fetch_payload(info)
+
+
 @shared_task(
     bind=True,
     autoretry_for=(Exception,),
@@ -16,28 +59,56 @@ from apps.downloads.services.video_metadata import VideoMetadataFetcher
     retry_kwargs={"max_retries": 5},
 )
 def run_fetch_metadata(self, url: str) -> dict:
-    """Fetch video metadata inside a Celery worker."""
-    # info = VideoMetadataFetcher().fetch(url, fast=True)
-    # Return a trimmed payload to keep results small and fast.
-    # return {
-    #     "id": info.get("id"),
-    #     "title": info.get("title"),
-    #     "uploader": info.get("uploader"),
-    #     "duration": info.get("duration"),
-    #     "thumbnail": info.get("thumbnail"),
-    #     "height": info.get("height"),
-    #     "webpage_url": info.get("webpage_url") or info.get("original_url"),
-    #     "upload_date": info.get("upload_date"),
-    #     "formats": info.get("formats", []),
-    #     "filesize": info.get("filesize"),
-    #     "filesize_approx": info.get("filesize_approx"),
-    #     "entries": info.get("entries", []),
-    # }
-
-    return VideoMetadataFetcher().fetch(url, fast=False)
+    """
+    Fetch video metadata inside a Celery worker.
+
+    Returns the compact `build_fetch_payload` result rather than the raw
+    yt-dlp info dict; the full dict stays in the metadata cache.
+    """
+    key = _inflight_key(url)
+    token = self.request.id or uuid.uuid4().hex
+    owner = single_flight.claim(key, token, timeout=_inflight_timeout())
+    if owner != token:
+        # Another task is already extracting this video; reuse its result.
+        info = single_flight.wait_for(
+            key,
+            lambda: metadata_cache.peek(url),
+            timeout=float(getattr(settings, "VIDEO_FETCH_COALESCE_WAIT_SECONDS", 60)),
+        )
+        if info is not None:
+            return _build_payload(self, info)
+
+    try:
+        return _build_payload(self, VideoMetadataFetcher().fetch(url, fast=False))
+    finally:
+        single_flight.release(key, token)
 
 
 def enqueue_fetch_data(url: str) -> Optional[AsyncResult]:
-    """Enqueue a metadata fetch task for a URL."""
+    """
+    Enqueue a metadata fetch task for a URL.
+
+    Concurrent submissions of the same (canonicalized) URL share one
+    in-flight task: the first caller publishes the task, later callers get
+    an AsyncResult for the same task id until it finishes.
+    """
+
+    key = _inflight_key(url)
+    for _ in range(2):
+        task_id = str(uuid.uuid4())
+        owner = single_flight.claim(key, task_id, timeout=_inflight_timeout())
+        if owner == task_id:
+            try:
+                return run_fetch_metadata.apply_async(args=(url,), task_id=task_id)
+            except Exception:
+                # Nothing was published: don't point later callers at it.
+                single_flight.release(key, task_id)
+                raise
+
+        existing = AsyncResult(owner)
+        if not existing.failed():
+            return existing
+        # Stale owner left behind by a failed task; drop it and claim again.
+        single_flight.release(key, owner)
 
     return run_fetch_metadata.delay(url)
@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from apps.downloads.services.storage_lifecycle import prune_storage
+
+
+@shared_task
+def prune_download_storage() -> int:
+    """Evict expired/least-recently-used artifacts; return bytes freed."""
+    return prune_storage().freed_bytes
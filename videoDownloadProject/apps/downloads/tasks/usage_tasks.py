@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from apps.downloads.services.access import reconcile_daily_usage
+
+
+@shared_task
+def reconcile_download_usage() -> int:
+    """Resync today's active quota counters with the jobs in flight."""
+    return reconcile_daily_usage()
@@ -1,19 +1,89 @@
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import skipUnless
 from unittest.mock import patch
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 
-from apps.downloads.models import DailyDownloadUsage, DownloadJob
-from apps.downloads.services.access import enforce_download_constraints
-from apps.downloads.services.exceptions import RateLimitExceeded
+from apps.common import ratelimit
+from apps.common.ratelimit import MemoryBackend
+from apps.downloads.models import DailyDownloadUsage, DownloadJob, StoredArtifact
+from apps.downloads.services.access import (
+    _active_counts_by_user,
+    download_priority,
+    enforce_download_constraints,
+    reconcile_daily_usage,
+    release_download_slot,
+    reserve_download_slots,
+)
+from apps.downloads.services.artifacts import (
+    artifact_key,
+    find_artifact,
+    link_job,
+    record_artifact,
+)
+from apps.downloads.services.download_storage import download_storage
+from apps.downloads.services.entry_resolver import resolve_missing_formats
+from apps.downloads.services.exceptions import (
+    ArtifactInFlight,
+    ProviderBusy,
+    RateLimitExceeded,
+)
+from apps.downloads.services.fragment_tuning import (
+    ThroughputMeter,
+    choose_concurrency,
+    record_throughput,
+    stream_throughput,
+)
+from apps.downloads.services.metadata_cache import (
+    canonicalize_video_url,
+    metadata_cache,
+)
+from apps.downloads.services.playlist import (
+    PREVIEW_SCHEMA_VERSION,
+    build_fetch_payload,
+    build_playlist_preview,
+    launch_playlist_downloads,
+)
+from apps.downloads.services.progress import (
+    ProgressSink,
+    aggregate_progress,
+    progress_channel,
+)
+from apps.downloads.services import single_flight
+from apps.downloads.services.provider_governor import Lease, acquire, penalize
+from apps.downloads.services.storage_lifecycle import (
+    evict_artifact,
+    plan_eviction,
+    prune_storage,
+)
+from apps.downloads.services.video_download import VideoDownload
+from apps.downloads.services.video_metadata import VideoMetadataFetcher
+from apps.downloads.services.ytdl_pool import ytdl_pool
 from apps.downloads.tasks.download_tasks import (
     enqueue_download_job,
+    enqueue_download_jobs,
     run_download_job,
 )
+from apps.downloads.tasks.fetch_metadata_tasks import (
+    _inflight_key,
+    enqueue_fetch_data,
+    run_fetch_metadata,
+)
+from apps.downloads.views import _progress_events, _progress_stream_enabled
 from apps.history.models import History
+from apps.users.models import UserProfile
 from apps.videos.models import VideoFormat, VideoSource
+from core.celery import app as celery_app
 
 
 class DownloadTaskTests(TestCase):
@@ -68,6 +138,26 @@ class DownloadTaskTests(TestCase):
             self.assertIsNone(result)
         mock_delay.assert_called_once_with(self.job.id)
 
+    def test_enqueue_download_jobs_publishes_with_priority(self) -> None:
+        """Pro users' download groups should carry the higher broker priority."""
+
+        self.user.profile.apply_plan(UserProfile.PLAN_PRO)
+        priority = download_priority(self.user)
+        self.assertGreater(priority, download_priority(None))
+
+        with patch("apps.downloads.tasks.download_tasks.group") as mock_group:
+            enqueue_download_jobs([self.job.id], use_on_commit=False, priority=priority)
+        mock_group.return_value.apply_async.assert_called_once_with(priority=priority)
+
+    def test_tasks_are_routed_to_dedicated_queues(self) -> None:
+        """Metadata fetches and downloads should never share a queue."""
+
+        router = celery_app.amqp.router
+        fetch_route = router.route({}, run_fetch_metadata.name)
+        download_route = router.route({}, run_download_job.name)
+        self.assertEqual(fetch_route["queue"].name, "metadata")
+        self.assertEqual(download_route["queue"].name, "downloads")
+
     def test_run_download_job_success_creates_success_history_row(self) -> None:
         """Task execution success should create one History entry with success=True."""
 
@@ -81,6 +171,47 @@ class DownloadTaskTests(TestCase):
         usage = DailyDownloadUsage.objects.get(user=self.user, day=timezone.localdate())
         self.assertEqual(usage.success_count, 1)
 
+    def test_progress_sink_coalesces_writes_until_threshold(self) -> None:
+        """Progress should be written on status change, percent step or interval."""
+
+        now = [0.0]
+        sink = ProgressSink(
+            self.job, min_interval=1.0, min_percent_step=2, clock=lambda: now[0]
+        )
+
+        with patch.object(DownloadJob, "save") as mock_save:
+            self.assertTrue(sink.update(status="downloading", progress_percent=0))
+            self.assertFalse(sink.update(progress_percent=1, bytes_downloaded=10))
+            now[0] = 0.5
+            self.assertFalse(sink.update(progress_percent=1, bytes_downloaded=20))
+            self.assertTrue(sink.update(progress_percent=3, bytes_downloaded=30))
+            now[0] = 2.0
+            self.assertTrue(sink.update(progress_percent=3, bytes_downloaded=40))
+            self.assertTrue(
+                sink.update(force=True, progress_percent=100, status="completed")
+            )
+
+        self.assertEqual(mock_save.call_count, 4)
+        self.assertIn("status", mock_save.call_args.kwargs["update_fields"])
+
+    def test_run_download_job_requeues_when_provider_is_busy(self) -> None:
+        """A saturated provider should defer the job without using a retry."""
+
+        with patch(
+            "apps.downloads.tasks.download_tasks.VideoDownload"
+        ) as mock_service, patch(
+            "apps.downloads.tasks.download_tasks.run_download_job.apply_async"
+        ) as mock_apply:
+            mock_service.return_value.download.side_effect = ProviderBusy(
+                "example.com", 12.5
+            )
+            run_download_job.run(str(self.job.id))
+
+        self.assertEqual(mock_apply.call_args.kwargs["countdown"], 13)
+        self.assertFalse(History.objects.filter(job=self.job).exists())
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, "queued")
+
     def test_run_download_job_failure_creates_failed_history_row(self) -> None:
         """Task execution failure should still create History entry with success=False."""
 
@@ -132,6 +263,111 @@ class DownloadConstraintsTests(TestCase):
         with self.assertRaises(RateLimitExceeded):
             enforce_download_constraints(self.user, self.format)
 
+    def test_reserve_counts_active_slot_until_release(self) -> None:
+        self.assertEqual(reserve_download_slots(self.user, [self.format]), 1)
+        usage = DailyDownloadUsage.objects.get(user=self.user, day=timezone.localdate())
+        self.assertEqual(usage.active_count, 1)
+
+        with self.assertRaises(RateLimitExceeded):
+            enforce_download_constraints(self.user, self.format)
+
+        job = DownloadJob.objects.create(
+            user=self.user, video=self.video, format=self.format
+        )
+        release_download_slot(job, success=True)
+        usage.refresh_from_db()
+        self.assertEqual((usage.success_count, usage.active_count), (1, 0))
+
+    def test_reserve_grants_partial_batch(self) -> None:
+        self.profile.daily_limit = 3
+        self.profile.save(update_fields=["daily_limit"])
+        DailyDownloadUsage.objects.create(
+            user=self.user, day=timezone.localdate(), success_count=1
+        )
+
+        granted = reserve_download_slots(self.user, [self.format] * 5)
+
+        self.assertEqual(granted, 2)
+        usage = DailyDownloadUsage.objects.get(user=self.user, day=timezone.localdate())
+        self.assertEqual(usage.active_count, 2)
+
+    def test_reconcile_resets_drifted_active_counts(self) -> None:
+        DailyDownloadUsage.objects.create(
+            user=self.user, day=timezone.localdate(), active_count=4
+        )
+        DownloadJob.objects.create(user=self.user, video=self.video, format=self.format)
+
+        self.assertEqual(reconcile_daily_usage(), 1)
+        usage = DailyDownloadUsage.objects.get(user=self.user, day=timezone.localdate())
+        self.assertEqual(usage.active_count, 1)
+        self.assertEqual(reconcile_daily_usage(), 0)
+
+
+class JobQueryPlanTests(TestCase):
+    """Tests that hot DownloadJob/History queries use their indexes."""
+
+    def setUp(self) -> None:
+        user_model = get_user_model()
+        self.user = user_model.objects.create_user(
+            username="plan-user", password="test-pass"
+        )
+        self.video = VideoSource.objects.create(
+            canonical_url="https://example.com/video-plan",
+            provider="example",
+            title="Plan Video",
+        )
+        self.format = VideoFormat.objects.create(
+            video=self.video, container="mp4", quality_label="720p", height=720
+        )
+
+    def _explain(self, queryset) -> str:
+        # Tiny test tables would always be seq-scanned; force the planner to
+        # show which index it would pick at production sizes.
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        return queryset.explain()
+
+    def test_active_counts_exclude_other_days_and_terminal_jobs(self) -> None:
+        today = timezone.localdate()
+        DownloadJob.objects.create(user=self.user, video=self.video, format=self.format)
+        DownloadJob.objects.create(
+            user=self.user, video=self.video, format=self.format, status="completed"
+        )
+        yesterday = DownloadJob.objects.create(
+            user=self.user, video=self.video, format=self.format
+        )
+        DownloadJob.objects.filter(pk=yesterday.pk).update(
+            created_at=timezone.now() - timedelta(days=1)
+        )
+
+        self.assertEqual(list(_active_counts_by_user(today)), [(self.user.pk, 1)])
+
+    @skipUnless(connection.vendor == "postgresql", "EXPLAIN output is Postgres-specific")
+    def test_reconcile_query_uses_partial_index(self) -> None:
+        plan = self._explain(_active_counts_by_user(timezone.localdate()))
+        self.assertIn("dljob_user_active_idx", plan)
+
+    def test_history_records_the_job_owner(self) -> None:
+        job = DownloadJob.objects.create(
+            user=self.user, video=self.video, format=self.format
+        )
+        self.assertEqual(History.objects.create(job=job).user, self.user)
+
+    @skipUnless(connection.vendor == "postgresql", "EXPLAIN output is Postgres-specific")
+    def test_user_history_uses_user_created_index(self) -> None:
+        # The dashboard sidebar and history partial query.
+        queryset = (
+            History.objects.select_related("job", "job__video", "job__format")
+            .filter(user=self.user)
+            .order_by("-created_at")[:4]
+        )
+        self.assertIn("history_user_created_idx", self._explain(queryset))
+
+    @skipUnless(connection.vendor == "postgresql", "EXPLAIN output is Postgres-specific")
+    def test_history_listing_uses_created_at_index(self) -> None:
+        plan = self._explain(History.objects.order_by("-created_at")[:20])
+        self.assertIn("history_created_idx", plan)
+
 
 class FetchStatusPollingTests(TestCase):
     """Tests for HTMX polling behavior during retry and final failure states."""
@@ -193,3 +429,1233 @@ class FetchStatusPollingTests(TestCase):
 
         with self.assertRaises(RateLimitExceeded):
             enforce_download_constraints(self.user, self.format)
+
+
+class MetadataCacheTests(TestCase):
+    """Tests for the shared yt-dlp metadata cache."""
+
+    def setUp(self) -> None:
+        cache.clear()
+        metadata_cache.clear_local()
+
+    def test_canonicalize_video_url_collapses_youtube_variants(self) -> None:
+        variants = [
+            "https://www.youtube.com/watch?v=abc123&utm_source=chat",
+            "https://youtu.be/abc123?si=tracking",
+            "https://m.youtube.com/watch?feature=share&v=abc123",
+            "https://www.youtube.com/shorts/abc123",
+        ]
+        keys = {canonicalize_video_url(url) for url in variants}
+        self.assertEqual(keys, {"youtube:video:abc123"})
+
+    def test_canonicalize_video_url_sorts_generic_query(self) -> None:
+        self.assertEqual(
+            canonicalize_video_url("https://Example.com/v/1/?b=2&a=1&utm_medium=x"),
+            canonicalize_video_url("https://example.com/v/1?a=1&b=2"),
+        )
+
+    def test_fetch_reuses_cached_info_for_equivalent_urls(self) -> None:
+        info = {"id": "abc123", "title": "Cached", "formats": []}
+        with patch.object(
+            VideoMetadataFetcher, "_extract", return_value=info
+        ) as mock_extract:
+            first = VideoMetadataFetcher().fetch(
+                "https://www.youtube.com/watch?v=abc123"
+            )
+            metadata_cache.clear_local()
+            second = VideoMetadataFetcher().fetch("https://youtu.be/abc123")
+
+        mock_extract.assert_called_once()
+        self.assertEqual(first, second)
+        stats = metadata_cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_local_tier_hands_out_copies(self) -> None:
+        url = "https://example.com/video"
+        info = {"id": "abc", "formats": [{"format_id": "18"}]}
+        metadata_cache.set(url, info)
+        info["formats"].clear()
+
+        first = metadata_cache.get(url)
+        first["formats"].append({"format_id": "22"})
+
+        self.assertEqual(metadata_cache.get(url)["formats"], [{"format_id": "18"}])
+
+    def test_fetch_without_cache_always_extracts(self) -> None:
+        with patch.object(
+            VideoMetadataFetcher, "_extract", return_value={"id": "x"}
+        ) as mock_extract:
+            VideoMetadataFetcher().fetch("https://example.com/video", use_cache=False)
+            VideoMetadataFetcher().fetch("https://example.com/video", use_cache=False)
+
+        self.assertEqual(mock_extract.call_count, 2)
+
+
+class FetchCoalescingTests(TestCase):
+    """Tests for single-flight deduplication of metadata fetch tasks."""
+
+    def setUp(self) -> None:
+        cache.clear()
+        metadata_cache.clear_local()
+
+    def test_enqueue_fetch_data_shares_task_id_for_same_video(self) -> None:
+        class PendingResult:
+            def __init__(self, task_id: str) -> None:
+                self.id = task_id
+
+            def failed(self) -> bool:
+                return False
+
+        with patch(
+            "apps.downloads.tasks.fetch_metadata_tasks.run_fetch_metadata.apply_async",
+            side_effect=lambda args, task_id: PendingResult(task_id),
+        ) as mock_apply, patch(
+            "apps.downloads.tasks.fetch_metadata_tasks.AsyncResult",
+            side_effect=PendingResult,
+        ):
+            first = enqueue_fetch_data("https://www.youtube.com/watch?v=abc123")
+            second = enqueue_fetch_data("https://youtu.be/abc123")
+
+        mock_apply.assert_called_once()
+        self.assertEqual(first.id, second.id)
+
+    def test_enqueue_fetch_data_replaces_failed_in_flight_task(self) -> None:
+        url = "https://example.com/video"
+        cache.set(_inflight_key(url), "failed-task-id")
+
+        class FailedResult:
+            def __init__(self, task_id: str) -> None:
+                self.id = task_id
+
+            def failed(self) -> bool:
+                return True
+
+        with patch(
+            "apps.downloads.tasks.fetch_metadata_tasks.run_fetch_metadata.apply_async",
+            side_effect=lambda args, task_id: FailedResult(task_id),
+        ) as mock_apply, patch(
+            "apps.downloads.tasks.fetch_metadata_tasks.AsyncResult",
+            side_effect=FailedResult,
+        ):
+            result = enqueue_fetch_data(url)
+
+        mock_apply.assert_called_once()
+        self.assertNotEqual(result.id, "failed-task-id")
+
+    def test_enqueue_fetch_data_releases_claim_when_publish_fails(self) -> None:
+        url = "https://example.com/video"
+
+        with patch(
+            "apps.downloads.tasks.fetch_metadata_tasks.run_fetch_metadata.apply_async",
+            side_effect=ConnectionError("broker down"),
+        ), self.assertRaises(ConnectionError):
+            enqueue_fetch_data(url)
+
+        self.assertIsNone(cache.get(_inflight_key(url)))
+
+    def test_claim_retries_until_an_owner_is_stored(self) -> None:
+        # The competing owner expires between `add` and `get` twice.
+        with patch("apps.downloads.services.single_flight.cache") as mock_cache:
+            mock_cache.add.side_effect = [False, False, True]
+            mock_cache.get.return_value = None
+            self.assertEqual(single_flight.claim("key", "me", timeout=10), "me")
+        self.assertEqual(mock_cache.add.call_count, 3)
+
+    def test_run_fetch_metadata_follower_reuses_leader_result(self) -> None:
+        url = "https://example.com/video"
+        cache.set(_inflight_key(url), "leader-task-id")
+        metadata_cache.set(url, {"id": "leader", "formats": []})
+
+        with patch.object(VideoMetadataFetcher, "_extract") as mock_extract:
+            info = run_fetch_metadata.run(url)
+
+        mock_extract.assert_not_called()
+        self.assertEqual(info["id"], "leader")
+        self.assertEqual(cache.get(_inflight_key(url)), "leader-task-id")
+
+
+class FetchPayloadTests(TestCase):
+    """Tests for the compact fetch task result."""
+
+    def _raw_info(self) -> dict:
+        return {
+            "id": "abc123",
+            "title": "Sample",
+            "webpage_url": "https://example.com/watch/abc123",
+            "extractor_key": "Example",
+            "duration": 61,
+            "http_headers": {"User-Agent": "yt-dlp"},
+            "formats": [
+                {
+                    "format_id": "22",
+                    "ext": "mp4",
+                    "vcodec": "avc1",
+                    "acodec": "mp4a",
+                    "height": 720,
+                    "url": "https://cdn.example.com/signed?expire=1",
+                    "http_headers": {"Cookie": "secret"},
+                    "fragments": [{"path": "seg-1"}],
+                },
+                {
+                    "format_id": "sb0",
+                    "ext": "mhtml",
+                    "vcodec": "none",
+                    "acodec": "none",
+                    "format_note": "storyboard",
+                },
+            ],
+        }
+
+    def test_build_fetch_payload_keeps_only_preview_fields(self) -> None:
+        payload = build_fetch_payload(self._raw_info())
+
+        self.assertEqual(payload["schema_version"], PREVIEW_SCHEMA_VERSION)
+        self.assertEqual(len(payload["entries"]), 1)
+        entry = payload["entries"][0]
+        self.assertNotIn("http_headers", entry)
+        self.assertEqual(entry["webpage_url"], "https://example.com/watch/abc123")
+        self.assertEqual([f["format_id"] for f in entry["formats"]], ["22"])
+        self.assertNotIn("url", entry["formats"][0])
+        self.assertNotIn("fragments", entry["formats"][0])
+
+    def test_build_playlist_preview_accepts_compact_payload(self) -> None:
+        raw_entries, raw_formats = build_playlist_preview(self._raw_info())
+        entries, formats = build_playlist_preview(build_fetch_payload(self._raw_info()))
+
+        self.assertEqual(entries[0]["title"], raw_entries[0]["title"])
+        self.assertEqual(
+            [f["format_id"] for f in formats], [f["format_id"] for f in raw_formats]
+        )
+
+
+class FetchPreviewCacheTests(TestCase):
+    """Tests for per-task memoization of the fetch preview."""
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.url = reverse("apps.downloads:fetch_status")
+        session = self.client.session
+        session["fetch_task_id"] = "preview-task-id"
+        session.save()
+
+    def test_fetch_status_reads_task_result_once(self) -> None:
+        payload = build_fetch_payload(
+            {
+                "id": "abc123",
+                "title": "Memoized",
+                "formats": [
+                    {
+                        "format_id": "18",
+                        "ext": "mp4",
+                        "vcodec": "avc1",
+                        "acodec": "mp4a",
+                        "height": 360,
+                    }
+                ],
+            }
+        )
+
+        class SuccessResult:
+            result = payload
+
+            def successful(self) -> bool:
+                return True
+
+        with patch(
+            "apps.downloads.views.AsyncResult", return_value=SuccessResult()
+        ) as mock_result:
+            first = self.client.get(self.url, HTTP_HX_REQUEST="true")
+            second = self.client.get(self.url, HTTP_HX_REQUEST="true")
+
+        self.assertEqual(mock_result.call_count, 1)
+        self.assertContains(first, "Memoized")
+        self.assertContains(second, "Memoized")
+        self.assertContains(second, 'value="18"')
+
+
+class BulkPlaylistLaunchTests(TestCase):
+    """Tests for the batched playlist launch path."""
+
+    def setUp(self) -> None:
+        user_model = get_user_model()
+        self.user = user_model.objects.create_user(
+            username="playlist-user", password="test-pass"
+        )
+        profile = self.user.profile
+        profile.daily_limit = 2
+        profile.is_unlimited = False
+        profile.max_resolution = 720
+        profile.save(update_fields=["daily_limit", "is_unlimited", "max_resolution"])
+
+    def _playlist(self, count: int) -> dict:
+        return {
+            "entries": [
+                {
+                    "id": f"vid{i}",
+                    "title": f"Video {i}",
+                    "webpage_url": f"https://example.com/watch/{i}",
+                    "extractor_key": "Example",
+                    "formats": [
+                        {
+                            "format_id": "18",
+                            "ext": "mp4",
+                            "vcodec": "avc1",
+                            "acodec": "mp4a",
+                            "height": 360,
+                        }
+                    ],
+                }
+                for i in range(count)
+            ]
+        }
+
+    def test_launch_reserves_quota_once_and_publishes_one_group(self) -> None:
+        VideoSource.objects.create(
+            canonical_url="https://example.com/watch/0",
+            provider="Example",
+            title="Already known",
+        )
+
+        with patch(
+            "apps.downloads.services.playlist.enqueue_download_jobs"
+        ) as mock_enqueue:
+            jobs = launch_playlist_downloads(self.user, self._playlist(3), "18")
+
+        self.assertEqual(len(jobs), 2)
+        self.assertEqual(DownloadJob.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(VideoSource.objects.count(), 3)
+        mock_enqueue.assert_called_once_with(
+            [job.id for job in jobs], priority=download_priority(self.user)
+        )
+
+    def test_launch_raises_when_quota_is_exhausted(self) -> None:
+        DailyDownloadUsage.objects.create(
+            user=self.user, day=timezone.localdate(), success_count=2
+        )
+
+        with patch("apps.downloads.services.playlist.enqueue_download_jobs"):
+            with self.assertRaises(RateLimitExceeded):
+                launch_playlist_downloads(self.user, self._playlist(2), "18")
+
+        self.assertFalse(DownloadJob.objects.filter(user=self.user).exists())
+
+
+class EntryResolverTests(TestCase):
+    """Tests for parallel resolution of flat playlist entries."""
+
+    def test_resolve_missing_formats_fetches_only_flat_entries(self) -> None:
+        entries = [
+            {"id": "a", "url": "https://example.com/watch/a"},
+            {
+                "id": "b",
+                "webpage_url": "https://example.com/watch/b",
+                "formats": [{"format_id": "18"}],
+            },
+            {"id": "c", "url": "https://other.example.org/watch/c"},
+        ]
+        progress = []
+
+        def fake_fetch(fetcher, url, **kwargs):
+            return {"webpage_url": url, "formats": [{"format_id": "22"}]}
+
+        with patch.object(
+            VideoMetadataFetcher, "fetch", autospec=True, side_effect=fake_fetch
+        ) as mock_fetch:
+            resolved = resolve_missing_formats(
+                entries,
+                on_progress=lambda done, total: progress.append((done, total)),
+            )
+
+        self.assertEqual(mock_fetch.call_count, 2)
+        self.assertEqual(resolved[0]["formats"], [{"format_id": "22"}])
+        self.assertEqual(resolved[1], entries[1])
+        self.assertEqual(
+            resolved[2]["webpage_url"], "https://other.example.org/watch/c"
+        )
+        self.assertEqual(progress[-1], (2, 2))
+
+    def test_resolve_missing_formats_keeps_entry_on_failure(self) -> None:
+        entries = [{"id": "a", "url": "https://example.com/watch/a"}]
+
+        with patch.object(
+            VideoMetadataFetcher, "fetch", side_effect=RuntimeError("boom")
+        ):
+            resolved = resolve_missing_formats(entries)
+
+        self.assertEqual(resolved, entries)
+
+
+@override_settings(VIDEO_PROGRESS_CHANNEL_SHARED=True)
+class LiveProgressTests(TestCase):
+    """Tests for serving progress polls from the live progress channel."""
+
+    def setUp(self) -> None:
+        cache.clear()
+        user_model = get_user_model()
+        self.user = user_model.objects.create_user(
+            username="progress-user", password="test-pass"
+        )
+        self.video = VideoSource.objects.create(
+            canonical_url="https://example.com/video-progress",
+            provider="example",
+            title="Live Video",
+        )
+        self.format = VideoFormat.objects.create(
+            video=self.video, container="mp4", quality_label="720p", height=720
+        )
+        self.job = DownloadJob.objects.create(
+            user=self.user, video=self.video, format=self.format
+        )
+        session = self.client.session
+        session["download_job_ids"] = [str(self.job.id)]
+        session.save()
+        self.url = reverse("apps.downloads:progress_status")
+
+    def test_progress_status_reads_active_snapshot_without_db(self) -> None:
+        self.job.status = "downloading"
+        self.job.progress_percent = 42
+        progress_channel.publish(self.job)
+
+        with patch("apps.downloads.services.progress.DownloadJob") as mock_model:
+            response = self.client.get(self.url, HTTP_HX_REQUEST="true")
+
+        mock_model.objects.filter.assert_not_called()
+        self.assertContains(response, "42%")
+        self.assertContains(response, 'hx-trigger="every 1s"')
+
+    def test_progress_status_uses_database_for_terminal_state(self) -> None:
+        self.job.status = "completed"
+        self.job.progress_percent = 100
+        self.job.output_filename = "live-video.mp4"
+        self.job.save()
+        progress_channel.publish(self.job)
+
+        response = self.client.get(self.url, HTTP_HX_REQUEST="true")
+
+        self.assertContains(response, "100%")
+        self.assertContains(
+            response, reverse("apps.downloads:download_file", args=[str(self.job.id)])
+        )
+        self.assertNotContains(response, 'hx-trigger="every 1s"')
+
+    def test_aggregate_progress_combines_live_and_database_rows(self) -> None:
+        second = DownloadJob.objects.create(
+            user=self.user,
+            video=self.video,
+            format=self.format,
+            status="completed",
+            progress_percent=100,
+            bytes_downloaded=300,
+            bytes_total=300,
+        )
+        self.job.status = "downloading"
+        self.job.progress_percent = 50
+        self.job.bytes_downloaded = 100
+        self.job.bytes_total = 200
+        self.job.speed_kbps = 64
+        progress_channel.publish(self.job)
+
+        with self.assertNumQueries(1):
+            summary = aggregate_progress([self.job.id, second.id])
+
+        self.assertEqual(summary["counts"], {"downloading": 1, "completed": 1})
+        self.assertEqual(summary["bytes_downloaded"], 400)
+        self.assertEqual(summary["bytes_total"], 500)
+        self.assertEqual(summary["speed_kbps"], 64)
+        self.assertEqual(summary["percent"], 75)
+        self.assertEqual(summary["current"]["job_id"], str(self.job.id))
+        self.assertEqual(
+            [row["job_id"] for row in summary["rows"]],
+            [str(self.job.id), str(second.id)],
+        )
+        # The database row was seeded into the channel for the next read.
+        with self.assertNumQueries(0):
+            aggregate_progress([self.job.id, second.id])
+
+    @override_settings(VIDEO_PROGRESS_CHANNEL_SHARED=None)
+    def test_process_local_cache_disables_the_channel(self) -> None:
+        self.job.status = "downloading"
+        self.job.progress_percent = 30
+        self.job.save()
+        # A snapshot published by the web process would never be updated by
+        # a worker that has its own local-memory cache.
+        progress_channel.publish(self.job)
+        self.assertEqual(progress_channel.read_many([self.job.id]), {})
+
+        self.job.progress_percent = 60
+        self.job.save()
+        summary = aggregate_progress([self.job.id])
+
+        self.assertEqual(summary["current"]["progress_percent"], 60)
+
+    @override_settings(VIDEO_PROGRESS_STREAM_INTERVAL_SECONDS=0)
+    async def test_progress_stream_emits_progress_then_done(self) -> None:
+        self.job.status = "downloading"
+        self.job.progress_percent = 10
+        progress_channel.publish(self.job)
+
+        events = _progress_events([str(self.job.id)])
+        self.assertTrue((await anext(events)).startswith("retry:"))
+        progress_event = await anext(events)
+        self.assertIn("event: progress", progress_event)
+        self.assertIn('"download_progress": 10', progress_event)
+
+        self.job.status = "completed"
+        self.job.progress_percent = 100
+        progress_channel.publish(self.job)
+        self.assertIn("event: done", await anext(events))
+
+    @override_settings(
+        VIDEO_PROGRESS_SSE_ENABLED=True,
+        VIDEO_PROGRESS_STREAM_INTERVAL_SECONDS=0,
+        VIDEO_PROGRESS_STREAM_MAX_CONNECTIONS=1,
+    )
+    async def test_progress_stream_falls_back_to_polling_at_the_limit(self) -> None:
+        self.job.status = "downloading"
+        progress_channel.publish(self.job)
+        self.assertTrue(_progress_stream_enabled())
+
+        events = _progress_events([str(self.job.id)])
+        await anext(events)
+        self.assertFalse(_progress_stream_enabled())
+
+        await events.aclose()
+        self.assertTrue(_progress_stream_enabled())
+
+    @override_settings(
+        VIDEO_PROGRESS_SSE_ENABLED=True, VIDEO_PROGRESS_CHANNEL_SHARED=False
+    )
+    def test_progress_stream_is_not_offered_without_a_shared_channel(self) -> None:
+        self.assertFalse(_progress_stream_enabled())
+
+
+class FileServingTests(TestCase):
+    """Tests for serving completed downloads through the configured backend."""
+
+    def setUp(self) -> None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.root = tmp_dir.name
+        with open(os.path.join(self.root, "clip.mp4"), "wb") as handle:
+            handle.write(b"0123456789")
+
+        user_model = get_user_model()
+        self.user = user_model.objects.create_user(
+            username="serve-user", password="test-pass"
+        )
+        video = VideoSource.objects.create(
+            canonical_url="https://example.com/video-serve",
+            provider="example",
+            title="Served Video",
+        )
+        video_format = VideoFormat.objects.create(
+            video=video, container="mp4", quality_label="720p", height=720
+        )
+        self.job = DownloadJob.objects.create(
+            user=self.user,
+            video=video,
+            format=video_format,
+            status="completed",
+            output_filename="clip.mp4",
+        )
+        self.client.force_login(self.user)
+        self.url = reverse("apps.downloads:download_file", args=[str(self.job.id)])
+
+    def test_python_backend_streams_file(self) -> None:
+        with override_settings(VIDEO_DOWNLOAD_ROOT=self.root):
+            response = self.client.get(self.url)
+
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertIn("attachment", response["Content-Disposition"])
+
+    def test_x_accel_redirect_backend_returns_headers_only(self) -> None:
+        with override_settings(
+            VIDEO_DOWNLOAD_ROOT=self.root,
+            VIDEO_FILE_SERVING_BACKEND="x-accel-redirect",
+        ):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-downloads/clip.mp4")
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["Content-Type"], "video/mp4")
+
+    def test_range_request_returns_partial_content(self) -> None:
+        with override_settings(VIDEO_DOWNLOAD_ROOT=self.root):
+            response = self.client.get(self.url, HTTP_RANGE="bytes=2-5")
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+
+    def test_multi_range_request_returns_byteranges(self) -> None:
+        with override_settings(VIDEO_DOWNLOAD_ROOT=self.root):
+            response = self.client.get(self.url, HTTP_RANGE="bytes=0-1,-2")
+
+        body = b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response["Content-Type"].startswith("multipart/byteranges"))
+        self.assertIn(b"Content-Range: bytes 0-1/10\r\n\r\n01\r\n", body)
+        self.assertIn(b"Content-Range: bytes 8-9/10\r\n\r\n89\r\n", body)
+        self.assertEqual(int(response["Content-Length"]), len(body))
+
+    def test_unsatisfiable_range_returns_416(self) -> None:
+        with override_settings(VIDEO_DOWNLOAD_ROOT=self.root):
+            response = self.client.get(self.url, HTTP_RANGE="bytes=20-")
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+    def test_matching_etag_returns_304(self) -> None:
+        with override_settings(VIDEO_DOWNLOAD_ROOT=self.root):
+            etag = self.client.get(self.url)["ETag"]
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_stale_if_range_serves_full_file(self) -> None:
+        with override_settings(VIDEO_DOWNLOAD_ROOT=self.root):
+            response = self.client.get(
+                self.url, HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"stale"'
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+
+    def test_rejects_paths_outside_download_root(self) -> None:
+        self.job.output_filename = "../clip.mp4"
+        self.job.save(update_fields=["output_filename"])
+
+        with override_settings(VIDEO_DOWNLOAD_ROOT=self.root):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 404)
+
+
+class ArtifactDedupTests(TestCase):
+    """Tests for sharing downloaded files between identical jobs."""
+
+    def setUp(self) -> None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.root = tmp_dir.name
+        user_model = get_user_model()
+        self.user = user_model.objects.create_user(
+            username="artifact-user", password="test-pass"
+        )
+        self.video = VideoSource.objects.create(
+            canonical_url="https://example.com/video-artifact",
+            provider="example",
+            provider_video_id="abc123",
+            title="Shared Video",
+        )
+        self.format = VideoFormat.objects.create(
+            video=self.video,
+            format_id="18",
+            container="mp4",
+            quality_label="360p",
+            height=360,
+        )
+
+    def test_artifact_key_ignores_format_row_identity(self) -> None:
+        other_format = VideoFormat.objects.create(
+            video=self.video,
+            format_id="18",
+            container="mp4",
+            quality_label="360p",
+            height=360,
+        )
+        self.assertEqual(
+            artifact_key(self.video, self.format),
+            artifact_key(self.video, other_format),
+        )
+
+    def test_existing_artifact_completes_job_without_downloading(self) -> None:
+        with open(os.path.join(self.root, "shared.mp4"), "wb") as handle:
+            handle.write(b"video")
+        artifact = StoredArtifact.objects.create(
+            key=artifact_key(self.video, self.format),
+            relative_path="shared.mp4",
+            size_bytes=5,
+            ref_count=1,
+        )
+        job = DownloadJob.objects.create(
+            user=self.user, video=self.video, format=self.format
+        )
+
+        with override_settings(VIDEO_DOWNLOAD_ROOT=self.root), patch(
+            "yt_dlp.YoutubeDL"
+        ) as mock_ydl:
+            VideoDownload(job).download()
+
+        mock_ydl.assert_not_called()
+        job.refresh_from_db()
+        artifact.refresh_from_db()
+        self.assertEqual(job.status, "completed")
+        self.assertEqual(job.artifact, artifact)
+        self.assertEqual(job.output_filename, "shared.mp4")
+        self.assertEqual(artifact.ref_count, 2)
+
+        job.delete()
+        artifact.refresh_from_db()
+        self.assertEqual(artifact.ref_count, 1)
+
+    @override_settings(
+        VIDEO_CACHE_SHARED=True, VIDEO_DOWNLOAD_COALESCE_RECHECK_SECONDS=15
+    )
+    def test_follower_defers_to_leader_without_downloading(self) -> None:
+        cache.clear()
+        key = artifact_key(self.video, self.format)
+        leader = DownloadJob.objects.create(
+            user=self.user, video=self.video, format=self.format, status="downloading"
+        )
+        cache.set(f"downloads:artifact:inflight:{key}", str(leader.id))
+        follower = DownloadJob.objects.create(
+            user=self.user, video=self.video, format=self.format
+        )
+
+        with override_settings(VIDEO_DOWNLOAD_ROOT=self.root), patch(
+            "yt_dlp.YoutubeDL"
+        ) as mock_ydl, self.assertRaises(ArtifactInFlight) as raised:
+            VideoDownload(follower).download()
+
+        mock_ydl.assert_not_called()
+        self.assertEqual(raised.exception.retry_after, 15)
+        follower.refresh_from_db()
+        self.assertEqual(follower.status, "queued")
+        self.assertEqual(follower.awaiting_artifact, key)
+
+    def test_per_process_cache_downloads_to_a_job_unique_file(self) -> None:
+        cache.clear()
+        key = artifact_key(self.video, self.format)
+        cache.set(f"downloads:artifact:inflight:{key}", "other-process-job")
+        job = DownloadJob.objects.create(
+            user=self.user, video=self.video, format=self.format
+        )
+        service = VideoDownload(job)
+
+        with override_settings(VIDEO_DOWNLOAD_ROOT=self.root), patch.object(
+            service, "_run_download"
+        ) as mock_run:
+            service.download()
+
+        mock_run.assert_called_once()
+        self.assertIsNone(service.inflight_key)
+        job.refresh_from_db()
+        self.assertEqual(job.awaiting_artifact, "")
+
+    def test_leader_completes_waiting_followers(self) -> None:
+        key = artifact_key(self.video, self.format)
+        with open(os.path.join(self.root, "shared.mp4"), "wb") as handle:
+            handle.write(b"video")
+        artifact = StoredArtifact.objects.create(
+            key=key, relative_path="shared.mp4", size_bytes=5, ref_count=1
+        )
+        leader = DownloadJob.objects.create(
+            user=self.user, video=self.video, format=self.format, status="completed"
+        )
+        follower = DownloadJob.objects.create(
+            user=self.user, video=self.video, format=self.format, awaiting_artifact=key
+        )
+        service = VideoDownload(leader)
+
+        service._complete_followers(key, artifact)
+
+        follower.refresh_from_db()
+        artifact.refresh_from_db()
+        self.assertEqual(follower.status, "completed")
+        self.assertEqual(follower.artifact, artifact)
+        self.assertEqual(follower.awaiting_artifact, "")
+        self.assertEqual(artifact.ref_count, 2)
+        self.assertEqual([job.pk for job in service.completed_followers], [follower.pk])
+
+    def test_task_requeues_follower_and_skips_it_once_completed(self) -> None:
+        job = DownloadJob.objects.create(
+            user=self.user, video=self.video, format=self.format
+        )
+
+        with patch(
+            "apps.downloads.tasks.download_tasks.VideoDownload"
+        ) as mock_service, patch(
+            "apps.downloads.tasks.download_tasks.run_download_job.apply_async"
+        ) as mock_apply:
+            mock_service.return_value.download.side_effect = ArtifactInFlight(
+                "k" * 64, 60
+            )
+            run_download_job.run(str(job.id))
+
+            job.status = "completed"
+            job.save(update_fields=["status"])
+            run_download_job.run(str(job.id))
+
+        self.assertEqual(mock_service.call_count, 1)
+        self.assertEqual(mock_apply.call_args.kwargs["countdown"], 60)
+        self.assertFalse(History.objects.filter(job=job).exists())
+
+
+class StorageLifecycleTests(TestCase):
+    """Tests for TTL/LRU eviction of stored artifacts."""
+
+    def setUp(self) -> None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.root = tmp_dir.name
+        settings_override = override_settings(VIDEO_DOWNLOAD_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _artifact(
+        self, name: str, size: int, age_days: float, ref_count: int = 1
+    ) -> StoredArtifact:
+        with open(os.path.join(self.root, name), "wb") as handle:
+            handle.write(b"x" * size)
+        return StoredArtifact.objects.create(
+            key=name,
+            relative_path=name,
+            size_bytes=size,
+            ref_count=ref_count,
+            last_accessed_at=timezone.now() - timedelta(days=age_days),
+        )
+
+    def test_plan_evicts_expired_then_least_recently_used(self) -> None:
+        self._artifact("expired.mp4", 10, age_days=30)
+        self._artifact("old.mp4", 40, age_days=2)
+        self._artifact("fresh.mp4", 40, age_days=1)
+
+        report = plan_eviction(budget_bytes=50, ttl_seconds=7 * 24 * 3600)
+
+        self.assertEqual(
+            [(e.relative_path, e.reason) for e in report.evictions],
+            [("expired.mp4", "ttl"), ("old.mp4", "budget")],
+        )
+        self.assertEqual(report.remaining_bytes, 40)
+
+    def test_plan_evicts_unreferenced_before_referenced(self) -> None:
+        self._artifact("orphan-old.mp4", 10, age_days=1, ref_count=0)
+        self._artifact("linked-old.mp4", 40, age_days=3)
+        self._artifact("orphan-new.mp4", 40, age_days=0, ref_count=0)
+
+        report = plan_eviction(budget_bytes=50, ttl_seconds=7 * 24 * 3600)
+
+        self.assertEqual(
+            [(e.relative_path, e.reason) for e in report.evictions],
+            [("orphan-old.mp4", "unreferenced"), ("orphan-new.mp4", "budget")],
+        )
+        self.assertEqual(report.remaining_bytes, 40)
+
+    def test_prune_removes_files_and_detaches_jobs(self) -> None:
+        artifact = self._artifact("old.mp4", 10, age_days=30)
+        user = get_user_model().objects.create_user(username="prune-user")
+        video = VideoSource.objects.create(
+            canonical_url="https://example.com/video-prune", provider="example"
+        )
+        video_format = VideoFormat.objects.create(video=video, container="mp4")
+        job = DownloadJob.objects.create(
+            user=user,
+            video=video,
+            format=video_format,
+            status="completed",
+            artifact=artifact,
+            output_filename="old.mp4",
+        )
+
+        dry_run = prune_storage(dry_run=True, budget_bytes=0, ttl_seconds=3600)
+        self.assertEqual(len(dry_run.evictions), 1)
+        self.assertTrue(os.path.exists(os.path.join(self.root, "old.mp4")))
+
+        prune_storage(budget_bytes=0, ttl_seconds=3600)
+
+        job.refresh_from_db()
+        self.assertIsNone(job.artifact_id)
+        self.assertEqual(job.output_filename, "")
+        self.assertFalse(os.path.exists(os.path.join(self.root, "old.mp4")))
+        self.assertFalse(StoredArtifact.objects.exists())
+
+
+    def test_untracked_files_count_toward_budget_and_are_evicted(self) -> None:
+        self._artifact("linked-abcdef0123456789.mp4", 40, age_days=1)
+        old_time = time.time() - 2 * 24 * 3600
+        for name in ("legacy-1700000000.mp4", "clip-0123456789abcdef.f137.mp4.part"):
+            path = os.path.join(self.root, name)
+            with open(path, "wb") as handle:
+                handle.write(b"x" * 30)
+            os.utime(path, (old_time, old_time))
+        active = os.path.join(self.root, "active-1800000000.mp4.part")
+        with open(active, "wb") as handle:
+            handle.write(b"x" * 30)
+        with open(os.path.join(self.root, "notes.txt"), "wb") as handle:
+            handle.write(b"x" * 500)
+
+        report = prune_storage(budget_bytes=80, ttl_seconds=7 * 24 * 3600)
+
+        self.assertEqual(report.total_bytes, 130)
+        self.assertEqual(
+            sorted((e.relative_path, e.reason) for e in report.evictions),
+            [
+                ("clip-0123456789abcdef.f137.mp4.part", "budget"),
+                ("legacy-1700000000.mp4", "budget"),
+            ],
+        )
+        # Recently written and foreign files are left alone.
+        self.assertTrue(os.path.exists(active))
+        self.assertTrue(os.path.exists(os.path.join(self.root, "notes.txt")))
+
+    def test_eviction_skips_artifact_linked_after_planning(self) -> None:
+        artifact = self._artifact("old.mp4", 10, age_days=30)
+        report = plan_eviction(budget_bytes=0, ttl_seconds=3600)
+        StoredArtifact.objects.filter(pk=artifact.pk).update(
+            ref_count=2, last_accessed_at=timezone.now()
+        )
+
+        evicted = evict_artifact(
+            artifact.pk, last_used_at=report.evictions[0].last_used_at
+        )
+
+        self.assertFalse(evicted)
+        self.assertTrue(StoredArtifact.objects.filter(pk=artifact.pk).exists())
+        self.assertTrue(os.path.exists(os.path.join(self.root, "old.mp4")))
+
+    def test_link_job_rejects_evicted_artifact(self) -> None:
+        artifact = self._artifact("gone.mp4", 10, age_days=30)
+        evict_artifact(artifact.pk)
+        user = get_user_model().objects.create_user(username="link-user")
+        video = VideoSource.objects.create(
+            canonical_url="https://example.com/video-link", provider="example"
+        )
+        video_format = VideoFormat.objects.create(video=video, container="mp4")
+        job = DownloadJob.objects.create(user=user, video=video, format=video_format)
+
+        with self.assertRaises(StoredArtifact.DoesNotExist):
+            link_job(job, artifact)
+
+
+@override_settings(
+    STORAGES={
+        **settings.STORAGES,
+        "video_downloads": {"BACKEND": "django.core.files.storage.InMemoryStorage"},
+    }
+)
+class RemoteDownloadStorageTests(TestCase):
+    """Tests for keeping finished downloads in a non-local storage backend."""
+
+    def test_artifact_is_uploaded_and_served_by_redirect(self) -> None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        local_path = os.path.join(tmp_dir.name, "remote.mp4")
+        with open(local_path, "wb") as handle:
+            handle.write(b"remote-bytes")
+
+        artifact = record_artifact("remote-key", local_path)
+
+        self.assertFalse(os.path.exists(local_path))
+        self.assertEqual(artifact.size_bytes, 12)
+        self.assertTrue(download_storage().exists(artifact.relative_path))
+        self.assertEqual(find_artifact("remote-key"), artifact)
+
+        user = get_user_model().objects.create_user(username="remote-user")
+        video = VideoSource.objects.create(
+            canonical_url="https://example.com/video-remote", provider="example"
+        )
+        job = DownloadJob.objects.create(
+            user=user,
+            video=video,
+            format=VideoFormat.objects.create(video=video, container="mp4"),
+            status="completed",
+            artifact=artifact,
+            output_filename=artifact.relative_path,
+        )
+        self.client.force_login(user)
+
+        response = self.client.get(
+            reverse("apps.downloads:download_file", args=[str(job.id)])
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(artifact.relative_path, response["Location"])
+
+
+@override_settings(
+    VIDEO_PROVIDER_LIMITS={"example.com": {"max_inflight": 2, "starts_per_minute": 3}},
+    VIDEO_GOVERNOR_MAX_INFLIGHT=4,
+    VIDEO_BANDWIDTH_CEILING_BYTES=1000,
+)
+@override_settings(VIDEO_CACHE_SHARED=True)
+class ProviderGovernorTests(TestCase):
+    """Tests for the shared per-provider download governor."""
+
+    def setUp(self) -> None:
+        cache.clear()
+        ratelimit.set_backend(MemoryBackend())
+        self.addCleanup(ratelimit.set_backend, None)
+
+    def test_inflight_cap_and_bandwidth_share(self) -> None:
+        first = acquire("https://www.example.com/watch?v=1", "job-1")
+        second = acquire("https://m.example.com/watch?v=2", "job-2")
+
+        self.assertEqual(first.host, "example.com")
+        self.assertEqual(first.ratelimit, 1000)
+        self.assertEqual(second.ratelimit, 500)
+        with self.assertRaises(ProviderBusy):
+            acquire("https://example.com/watch?v=3", "job-3")
+        # Other providers only share the global cap.
+        acquire("https://example.org/clip", "job-4")
+
+        first.release()
+        acquire("https://example.com/watch?v=3", "job-3")
+
+    def test_start_rate_and_cooldown(self) -> None:
+        for index in range(3):
+            acquire("https://example.com/v", f"job-{index}").release()
+        with self.assertRaises(ProviderBusy) as ctx:
+            acquire("https://example.com/v", "job-3")
+        self.assertAlmostEqual(ctx.exception.retry_after, 20, delta=1)
+        # A refused start leaves no slot behind.
+        self.assertEqual(cache.get("downloads:governor:slot:example.com:0"), None)
+
+        penalize("example.org", 120)
+        with self.assertRaises(ProviderBusy) as ctx:
+            acquire("https://example.org/v", "job-4")
+        self.assertGreater(ctx.exception.retry_after, 100)
+
+    @override_settings(VIDEO_CACHE_SHARED=False)
+    def test_per_process_cache_turns_the_governor_off(self) -> None:
+        penalize("example.com", 120)
+        leases = [
+            acquire("https://example.com/v", f"job-{index}") for index in range(10)
+        ]
+
+        self.assertTrue(all(lease.slots == [] for lease in leases))
+        self.assertIsNone(leases[0].ratelimit)
+        self.assertIsNone(cache.get("downloads:governor:cooldown:example.com"))
+
+    def test_heartbeat_refreshes_slots_without_progress(self) -> None:
+        lease = Lease(
+            host="example.com",
+            slots=[("downloads:governor:slot:example.com:0", "job-1")],
+            ratelimit=None,
+            fragment_concurrency=1,
+        )
+        beats = threading.Event()
+
+        with patch(
+            "apps.downloads.services.provider_governor._lease_seconds",
+            return_value=0.15,
+        ), patch("apps.downloads.services.provider_governor.cache") as mock_cache:
+            with lease.heartbeat(on_beat=beats.set):
+                # A long extraction or ffmpeg merge: no progress hooks fire.
+                self.assertTrue(beats.wait(2))
+
+        mock_cache.touch.assert_called_with(
+            "downloads:governor:slot:example.com:0", 0.15
+        )
+
+
+@override_settings(VIDEO_FRAGMENT_MIN_BYTES_PER_STREAM=16 * 1024**2)
+class FragmentTuningTests(TestCase):
+    """Tests for the adaptive fragment-concurrency controller."""
+
+    def test_concurrency_follows_size_throughput_and_load(self) -> None:
+        mib = 1024**2
+        options = {"stream_bps": None, "target_bps": 32 * mib, "load": 0.0}
+
+        self.assertEqual(
+            choose_concurrency(size_bytes=7 * mib, maximum=8, **options), 1
+        )
+        self.assertEqual(
+            choose_concurrency(size_bytes=4 * 1024 * mib, maximum=8, **options), 8
+        )
+        # Fast streams need fewer connections to reach the target.
+        options["stream_bps"] = 16 * mib
+        self.assertEqual(choose_concurrency(size_bytes=None, maximum=8, **options), 2)
+        options.update(stream_bps=None, load=1.0)
+        self.assertEqual(choose_concurrency(size_bytes=None, maximum=8, **options), 4)
+
+    def test_meter_and_host_average(self) -> None:
+        cache.clear()
+        now = [0.0]
+        meter = ThroughputMeter(clock=lambda: now[0])
+        # Bytes already on disk when the meter starts (resume) don't count.
+        meter.observe({"filename": "v.mp4", "downloaded_bytes": 1000})
+        now[0] = 1.0
+        meter.observe({"filename": "a.m4a", "downloaded_bytes": 0})
+        now[0] = 2.0
+        meter.observe({"filename": "v.mp4", "downloaded_bytes": 5000})
+        meter.observe({"filename": "a.m4a", "downloaded_bytes": 2000})
+        self.assertEqual(meter.bytes_per_second(), 3000)
+
+        record_throughput("example.com", 4000, 2)
+        record_throughput("example.com", 1000, 1)
+        self.assertAlmostEqual(stream_throughput("example.com"), 1700)
+
+
+class _FakeYoutubeDL:
+    """Minimal yt-dlp stand-in that records extraction and processing calls."""
+
+    calls: list = []
+    process_errors: list = []
+
+    def __init__(self, params):
+        self.params = params
+
+    def _parse_outtmpl(self):
+        pass
+
+    def save_cookies(self):
+        pass
+
+    def close(self):
+        self.calls.append(("close", None))
+
+    def extract_info(self, url, download=False, process=True):
+        self.calls.append(("extract", url))
+        formats = [{"format_id": "18", "vcodec": "avc1", "acodec": "mp4a"}]
+        return {"id": "v1", "formats": formats}
+
+    def process_ie_result(self, info, download=True):
+        selector = self.params["format"]
+        self.calls.append(("process", selector))
+        if self.process_errors:
+            raise self.process_errors.pop(0)
+        # Like yt-dlp, processing consumes the info dict in place.
+        formats = info.pop("formats", [])
+        if selector == "best":
+            matched = formats[-1:]
+        else:
+            matched = [fmt for fmt in formats if fmt["format_id"] == selector]
+        if not matched:
+            raise RuntimeError("Requested format is not available")
+        return {**info, "format_id": matched[0]["format_id"]}
+
+
+class SelectorResolutionTests(TestCase):
+    """Tests for resolving format selectors against one extraction."""
+
+    def setUp(self) -> None:
+        cache.clear()
+        metadata_cache.clear_local()
+        ytdl_pool.clear()
+        _FakeYoutubeDL.calls = []
+        _FakeYoutubeDL.process_errors = []
+        user = get_user_model().objects.create_user(username="selector-user")
+        video = VideoSource.objects.create(
+            canonical_url="https://example.com/watch?v=v1", provider="example"
+        )
+        video_format = VideoFormat.objects.create(
+            video=video, container="mp4", format_id="137"
+        )
+        job = DownloadJob.objects.create(user=user, video=video, format=video_format)
+        self.service = VideoDownload(job)
+        self.service.lease = Lease(
+            host="example.com", slots=[], ratelimit=None, fragment_concurrency=2
+        )
+
+    def _extract(self, selectors):
+        return self.service._extract(
+            _FakeYoutubeDL, "https://example.com/watch?v=v1", "/tmp/out", selectors, 2
+        )
+
+    def test_stale_format_id_is_skipped_without_reextracting(self) -> None:
+        result, error = self._extract(["137+bestaudio", "137", "18"])
+
+        self.assertIsNone(error)
+        self.assertEqual(result["format_id"], "18")
+        # Each attempt processes its own copy of the single extraction.
+        self.assertEqual(
+            [call for call in _FakeYoutubeDL.calls if call[0] != "close"],
+            [
+                ("extract", "https://example.com/watch?v=v1"),
+                ("process", "137+bestaudio"),
+                ("process", "137"),
+                ("process", "18"),
+            ],
+        )
+
+    def test_successful_selector_is_tried_first_next_time(self) -> None:
+        self._extract(["137", "18"])
+        _FakeYoutubeDL.calls = []
+
+        # Without the cached selector "best" would be picked first.
+        result, _error = self._extract(["137", "best", "18"])
+
+        self.assertEqual(result["format_id"], "18")
+        self.assertEqual(_FakeYoutubeDL.calls[1], ("process", "18"))
+
+    def _cache_info(self, expires_in: int) -> None:
+        expire = int(time.time()) + expires_in
+        stream_url = f"https://cdn.example.com/v1?expire={expire}"
+        metadata_cache.set(
+            "https://example.com/watch?v=v1",
+            {
+                "id": "v1",
+                "formats": [
+                    {
+                        "format_id": "18",
+                        "vcodec": "avc1",
+                        "acodec": "mp4a",
+                        "url": stream_url,
+                    }
+                ],
+            },
+        )
+
+    def test_fresh_fetch_info_is_downloaded_without_extraction(self) -> None:
+        self._cache_info(expires_in=3600)
+
+        result, _error = self._extract(["18"])
+
+        self.assertEqual(result["format_id"], "18")
+        self.assertEqual(_FakeYoutubeDL.calls, [("process", "18")])
+
+    def test_expiring_or_rejected_fetch_info_falls_back_to_extraction(self) -> None:
+        self._cache_info(expires_in=60)
+        self._extract(["18"])
+        self.assertEqual(_FakeYoutubeDL.calls[0][0], "extract")
+
+        cache.clear()
+        metadata_cache.clear_local()
+        _FakeYoutubeDL.calls = []
+        self._cache_info(expires_in=3600)
+        _FakeYoutubeDL.process_errors = [RuntimeError("HTTP Error 403: Forbidden")]
+
+        result, _error = self._extract(["18"])
+
+        self.assertEqual(result["format_id"], "18")
+        self.assertEqual(
+            [call[0] for call in _FakeYoutubeDL.calls if call[0] != "close"],
+            ["process", "extract", "process"],
+        )
+
+
+class YoutubeDLPoolTests(TestCase):
+    """Tests for the per-process YoutubeDL pool."""
+
+    def setUp(self) -> None:
+        ytdl_pool.clear()
+        self.addCleanup(ytdl_pool.clear)
+        _FakeYoutubeDL.calls = []
+
+    def test_instances_are_reused_per_option_set_and_reset_per_lease(self) -> None:
+        hook = lambda data: None  # noqa: E731
+        with ytdl_pool.lease(
+            _FakeYoutubeDL, {"quiet": True, "format": "18", "progress_hooks": [hook]}
+        ) as first:
+            self.assertEqual(first._progress_hooks, [hook])
+            first._num_downloads = 3
+        with ytdl_pool.lease(_FakeYoutubeDL, {"quiet": True}) as second:
+            self.assertIs(second, first)
+            self.assertNotIn("format", second.params)
+            self.assertIsNone(second.format_selector)
+            self.assertEqual(second._progress_hooks, [])
+            self.assertEqual(second._num_downloads, 0)
+        with ytdl_pool.lease(_FakeYoutubeDL, {"quiet": False}) as other:
+            self.assertIsNot(other, first)
+
+    def test_instance_is_discarded_after_a_failed_lease(self) -> None:
+        with self.assertRaises(RuntimeError):
+            with ytdl_pool.lease(_FakeYoutubeDL, {"quiet": True}) as broken:
+                raise RuntimeError("boom")
+
+        with ytdl_pool.lease(_FakeYoutubeDL, {"quiet": True}) as fresh:
+            self.assertIsNot(fresh, broken)
+        self.assertIn(("close", None), _FakeYoutubeDL.calls)
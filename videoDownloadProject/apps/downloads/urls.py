@@ -16,6 +16,16 @@ urlpatterns = [
         views.progress_status,
         name="progress_status",
     ),
+    path(
+        "fetch/start-download/progress-summary",
+        views.progress_summary,
+        name="progress_summary",
+    ),
+    path(
+        "fetch/start-download/progress-stream",
+        views.progress_stream,
+        name="progress_stream",
+    ),
     path(
         "fetch/spinner-dummy",
         views.start_download_spinner,
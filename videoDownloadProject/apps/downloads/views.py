@@ -1,20 +1,40 @@
+import asyncio
+import json
+import time
 import uuid
 
+from asgiref.sync import sync_to_async
 from celery.result import AsyncResult
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.http import HttpResponse
+from django.http import (
+    Http404,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import redirect, render
+from django.urls import reverse
 from django.views.generic import ListView
 
+from apps.common.ratelimit import ratelimit
 from apps.downloads.forms import FetchMetadataForm
 from apps.downloads.models import DownloadJob
 from apps.downloads.services.access import DownloadPolicy
+from apps.downloads.services.artifacts import touch_artifact
 from apps.downloads.services.exceptions import FormatNotAllowed, RateLimitExceeded
+from apps.downloads.services.file_serving import stored_file_response
 from apps.downloads.services.playlist import (
-    build_playlist_preview,
+    cached_playlist_preview,
     launch_playlist_downloads,
+    preview_cache_key,
+)
+from apps.downloads.services.progress import (
+    ACTIVE_STATUSES,
+    aggregate_progress,
+    load_snapshots,
+    progress_channel,
 )
 from apps.downloads.tasks.fetch_metadata_tasks import enqueue_fetch_data
 from apps.history.models import History
@@ -47,7 +67,7 @@ class DownloadView(ListView):
             # Sidebar "recent history" preview (max 4) for the logged-in user.
             context["history_list"] = (
                 History.objects.select_related("job", "job__video", "job__format")
-                .filter(job__user=user)
+                .filter(user=user)
                 .order_by("-created_at")[:4]
             )
         else:
@@ -66,11 +86,11 @@ class DownloadView(ListView):
             self.request.session.get("restore_fetched_session", False)
         )
         if task_id and should_restore_fetched:
-            result = AsyncResult(task_id)
-            if result.successful():
-                entries, formats = build_playlist_preview(result.result)
+            preview = _load_fetch_preview(task_id)
+            if preview is not None:
+                entries, formats = preview
                 allowed_format_ids, default_format_id = _resolve_allowed_formats(
-                    self.request.user, formats
+                    self.request.user, formats, task_id=task_id
                 )
                 # Inputs for fetched-form partial so user can continue without refetching.
                 context["fetched_data"] = entries
@@ -88,7 +108,7 @@ def history(request):
     if user.is_authenticated:
         context = (
             History.objects.select_related("job", "job__video", "job__format")
-            .filter(job__user=user)
+            .filter(user=user)
             .order_by("-created_at")[:4]
         )
         return render(
@@ -119,36 +139,6 @@ def _get_or_create_session_guest_user(request):
             return guest_user
 
 
-def _get_request_actor_key(request) -> str:
-    """Return a stable key for rate-limiting (auth user or anonymous session/ip)."""
-    if request.user.is_authenticated:
-        return f"user:{request.user.id}"
-
-    if not request.session.session_key:
-        request.session.save()
-    session_key = request.session.session_key or "no-session"
-    forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR", "")
-    ip = forwarded_for.split(",")[0].strip() if forwarded_for else request.META.get(
-        "REMOTE_ADDR", "unknown-ip"
-    )
-    return f"anon:{session_key}:{ip}"
-
-
-def _is_rate_limited(
-    request, scope: str, *, limit: int, window_seconds: int
-) -> bool:
-    """Return True if the request exceeds configured rate limit for the scope."""
-    key = f"downloads:ratelimit:{scope}:{_get_request_actor_key(request)}"
-    if cache.add(key, 1, timeout=window_seconds):
-        return False
-    try:
-        current = cache.incr(key)
-    except ValueError:
-        cache.set(key, 1, timeout=window_seconds)
-        return False
-    return current > limit
-
-
 def _get_download_policy(user) -> DownloadPolicy:
     """Return the effective download policy for an authenticated or anonymous user."""
     if user and getattr(user, "is_authenticated", False):
@@ -171,11 +161,40 @@ def _get_download_policy(user) -> DownloadPolicy:
     )
 
 
-def _resolve_allowed_formats(user, formats):
-    """Compute allowed format IDs and default format based on user policy."""
+def _load_fetch_preview(task_id: str):
+    """
+    Return the (entries, formats) preview for a successful fetch task.
+
+    Served from the per-task preview cache; only the first call after the
+    task succeeds reads the Celery result. Returns None while not ready.
+    """
+    preview = cached_playlist_preview(task_id)
+    if preview is not None:
+        return preview
+    result = AsyncResult(task_id)
+    if not result.successful():
+        return None
+    return cached_playlist_preview(task_id, result.result)
+
+
+def _resolve_allowed_formats(user, formats, *, task_id: str | None = None):
+    """
+    Compute allowed format IDs and default format based on user policy.
+
+    With `task_id`, the resolution is memoized per fetch task and policy
+    tier (max resolution + unlimited flag).
+    """
     policy = _get_download_policy(user)
     max_resolution = policy.max_resolution
     is_unlimited = policy.is_unlimited
+    cache_key = None
+    if task_id:
+        cache_key = (
+            f"{preview_cache_key(task_id)}:allowed:{max_resolution}:{int(is_unlimited)}"
+        )
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
     allowed_format_ids = []
     for fmt in formats:
         fmt_id = str(fmt.get("format_id")) if fmt.get("format_id") is not None else None
@@ -188,9 +207,50 @@ def _resolve_allowed_formats(user, formats):
         if height is None or (max_resolution is None) or (height <= max_resolution):
             allowed_format_ids.append(fmt_id)
     default_format_id = allowed_format_ids[0] if allowed_format_ids else None
+    if cache_key:
+        cache.set(
+            cache_key,
+            (allowed_format_ids, default_format_id),
+            timeout=int(getattr(settings, "VIDEO_PREVIEW_CACHE_TTL_SECONDS", 3600)),
+        )
     return allowed_format_ids, default_format_id
 
 
+def _fetch_rate_limited(request, decision):
+    return render(
+        request,
+        "downloads/partials/fetch/failed.html",
+        {
+            "oob_fetch_button": True,
+            "fetch_error": "Too many fetch requests. Please wait a moment and retry.",
+        },
+    )
+
+
+def _start_rate_limited(request, decision):
+    return render(
+        request,
+        "downloads/partials/download/prepare_section.html",
+        {
+            "format_id": request.POST.get("format", 0),
+            "format_title": request.POST.get("format_title"),
+            "download_started": False,
+            "download_error": "Too many download requests. Please wait and try again.",
+            "poll": False,
+        },
+    )
+
+
+# Defaults keep the older VIDEO_*_RATE_* settings working; RATELIMIT_SCOPES
+# overrides them per scope at request time.
+@ratelimit(
+    "fetch_metadata",
+    limit=int(getattr(settings, "VIDEO_FETCH_RATE_LIMIT", 15)),
+    window=float(getattr(settings, "VIDEO_FETCH_RATE_WINDOW_SECONDS", 60)),
+    methods=("POST",),
+    htmx_only=True,
+    on_limited=_fetch_rate_limited,
+)
 def fetch_metadata(request):
     """
     Kick off metadata extraction for a submitted video URL.
@@ -209,23 +269,6 @@ def fetch_metadata(request):
         return redirect("apps.downloads:index")
 
     if request.htmx:
-        if _is_rate_limited(
-            request,
-            "fetch_metadata",
-            limit=int(getattr(settings, "VIDEO_FETCH_RATE_LIMIT", 15)),
-            window_seconds=int(
-                getattr(settings, "VIDEO_FETCH_RATE_WINDOW_SECONDS", 60)
-            ),
-        ):
-            return render(
-                request,
-                "downloads/partials/fetch/failed.html",
-                {
-                    "oob_fetch_button": True,
-                    "fetch_error": "Too many fetch requests. Please wait a moment and retry.",
-                },
-            )
-
         video_url = form.cleaned_data["video_url"]
         info = enqueue_fetch_data(video_url)
         # Store the tasks result in the session
@@ -257,12 +300,17 @@ def fetch_status(request):
         if not task_id:
             return HttpResponse("")
 
-        result = AsyncResult(task_id)
+        preview = cached_playlist_preview(task_id)
+        result = None
+        if preview is None:
+            result = AsyncResult(task_id)
+            if result.successful():
+                preview = cached_playlist_preview(task_id, result.result)
 
-        if result.successful():
-            entries, formats = build_playlist_preview(result.result)
+        if preview is not None:
+            entries, formats = preview
             allowed_format_ids, default_format_id = _resolve_allowed_formats(
-                request.user, formats
+                request.user, formats, task_id=task_id
             )
             request.session["restore_fetched_session"] = True
 
@@ -295,10 +343,17 @@ def fetch_status(request):
                 "downloads/partials/fetch/failed.html",
                 {"oob_fetch_button": True},
             )
+        resolve_progress = None
+        if getattr(result, "state", None) == "PROGRESS":
+            resolve_progress = result.info
         return render(
             request,
             "downloads/partials/fetch/spinner.html",
-            {"task": result, "oob_fetch_button": True},
+            {
+                "task": result,
+                "oob_fetch_button": True,
+                "resolve_progress": resolve_progress,
+            },
         )
     return HttpResponse("")
 
@@ -321,11 +376,11 @@ def prepare_download(request):
     if not task_id:
         return HttpResponse("")
 
-    result = AsyncResult(task_id)
-    if not result.successful():
+    preview = _load_fetch_preview(task_id)
+    if preview is None:
         return HttpResponse("")
 
-    _entries, formats = build_playlist_preview(result.result)
+    _entries, formats = preview
     fmt = next((f for f in formats if str(f.get("format_id")) == str(fmt_id)), None)
     if not fmt:
         return HttpResponse("Format not found")
@@ -343,6 +398,14 @@ def prepare_download(request):
     )
 
 
+@ratelimit(
+    "start_download",
+    limit=int(getattr(settings, "VIDEO_START_RATE_LIMIT", 10)),
+    window=float(getattr(settings, "VIDEO_START_RATE_WINDOW_SECONDS", 60)),
+    methods=("POST",),
+    htmx_only=True,
+    on_limited=_start_rate_limited,
+)
 def start_download(request):
     """
     Launch download jobs for the selected format and return progress UI.
@@ -359,24 +422,6 @@ def start_download(request):
     if not fmt_id:
         return HttpResponse("No format selected")
 
-    if _is_rate_limited(
-        request,
-        "start_download",
-        limit=int(getattr(settings, "VIDEO_START_RATE_LIMIT", 10)),
-        window_seconds=int(getattr(settings, "VIDEO_START_RATE_WINDOW_SECONDS", 60)),
-    ):
-        return render(
-            request,
-            "downloads/partials/download/prepare_section.html",
-            {
-                "format_id": fmt_id,
-                "format_title": request.POST.get("format_title"),
-                "download_started": False,
-                "download_error": "Too many download requests. Please wait and try again.",
-                "poll": False,
-            },
-        )
-
     task_id = request.session.get("fetch_task_id")
     if not task_id:
         return HttpResponse("No task ID")
@@ -429,6 +474,7 @@ def start_download(request):
             "download_started": True,
             "job_id": job_id,
             "poll": True,
+            "progress_stream": _progress_stream_enabled(),
             "download_progress": job.progress_percent if job else 0,
             "download_status": job.status if job else "queued",
             "download_eta": duration,
@@ -438,66 +484,114 @@ def start_download(request):
     )
 
 
+# Progress streams open in this process, capped by
+# `VIDEO_PROGRESS_STREAM_MAX_CONNECTIONS`.
+_open_progress_streams = 0
+
+
+def _progress_stream_enabled() -> bool:
+    """
+    Return True when progress should stream over SSE instead of polling.
+
+    Pages fall back to polling when the live progress channel is not
+    shared (a stream would then read the database on every tick) and while
+    this process already holds the maximum number of open streams.
+    """
+    if not getattr(settings, "VIDEO_PROGRESS_SSE_ENABLED", False):
+        return False
+    if not progress_channel.shared:
+        return False
+    return _open_progress_streams < int(
+        getattr(settings, "VIDEO_PROGRESS_STREAM_MAX_CONNECTIONS", 100)
+    )
+
+
+def _progress_context(snapshot: dict, *, poll: bool) -> dict:
+    """Build the progress_status template context from a job snapshot."""
+    speed_kbps = None
+    if snapshot.get("speed_kbps"):
+        speed_kbps = utils.convert_bandwidth_binary(snapshot["speed_kbps"])
+    elapsed = None
+    if snapshot.get("bytes_downloaded") and snapshot.get("bytes_total"):
+        elapsed = (
+            f"{utils.format_bytes(snapshot['bytes_downloaded'])}/"
+            f"{utils.format_bytes(snapshot['bytes_total'])}"
+        )
+    return {
+        "poll": poll,
+        "progress_stream": _progress_stream_enabled(),
+        "job_id": snapshot["job_id"],
+        "format_title": snapshot.get("title") or "",
+        "download_progress": snapshot.get("progress_percent") or 0,
+        "download_status": snapshot.get("status"),
+        "download_eta": utils.format_duration(snapshot.get("eta_seconds")),
+        "download_speed": speed_kbps,
+        "download_elapsed": elapsed,
+        "download_url": (
+            reverse("apps.downloads:download_file", args=[snapshot["job_id"]])
+            if snapshot.get("status") == "completed" and snapshot.get("output_filename")
+            else None
+        ),
+    }
+
+
+def _summary_context(summary: dict) -> dict | None:
+    """Build the playlist summary line for multi-job progress cards."""
+    if summary["total"] < 2:
+        return None
+    counts = summary["counts"]
+    elapsed = None
+    if summary["bytes_downloaded"] and summary["bytes_total"]:
+        elapsed = (
+            f"{utils.format_bytes(summary['bytes_downloaded'])}/"
+            f"{utils.format_bytes(summary['bytes_total'])}"
+        )
+    return {
+        "total": summary["total"],
+        "completed": counts.get("completed", 0),
+        "failed": counts.get("failed", 0),
+        "active": sum(counts.get(status, 0) for status in ACTIVE_STATUSES),
+        "percent": summary["percent"],
+        "elapsed": elapsed,
+        "speed": (
+            utils.convert_bandwidth_binary(summary["speed_kbps"])
+            if summary["speed_kbps"]
+            else None
+        ),
+    }
+
+
 def progress_status(request):
     """
     Poll active download jobs and render progress fragment.
 
-    Uses job IDs stored in session to find the first active job.
-    Stops polling once all jobs are completed/failed/cancelled.
+    Uses job IDs stored in session to find the first active job, with a
+    summary line for playlists. While jobs are active everything comes
+    from one live-channel read (`aggregate_progress`); the database is only
+    queried for jobs without a snapshot and for the final state once every
+    job is completed/failed/cancelled, at which point polling stops.
     """
     try:
         job_ids = request.session.get("download_job_ids") or []
         if not job_ids:
             return HttpResponse("")
 
-        active_job = (
-            DownloadJob.objects.filter(id__in=job_ids)
-            .exclude(status="completed")
-            .exclude(status="failed")
-            .exclude(status="cancelled")
-            .select_related("format", "video")
-            .order_by("created_at")
-            .first()
-        )
+        summary = aggregate_progress(job_ids)
+        snapshot = summary["current"]
         poll = True
-        job = active_job
-        if not job:
-            last_job = (
-                DownloadJob.objects.filter(id__in=job_ids)
-                .select_related("format", "video")
-                .order_by("-created_at")
-                .first()
-            )
-            if not last_job:
+        if snapshot is None:
+            summary = aggregate_progress(job_ids, live=False)
+            if not summary["rows"]:
                 return HttpResponse("")
-            job = last_job
+            snapshot = summary["rows"][-1]
             poll = False
-        duration = utils.format_duration(job.eta_seconds)
-        speed_kbps = None
-        if job.speed_kbps:
-            speed_kbps = utils.convert_bandwidth_binary(job.speed_kbps)
-        elapsed = None
-        if job.bytes_downloaded and job.bytes_total:
-            elapsed = f"{utils.format_bytes(job.bytes_downloaded)}/{utils.format_bytes(job.bytes_total)}"
 
+        context = _progress_context(snapshot, poll=poll)
+        context["summary"] = _summary_context(summary)
         response = render(
             request,
             "downloads/partials/download/progress_status.html",
-            {
-                "poll": poll,
-                "job_id": str(job.id),
-                "format_title": job.video.title if job.video else "",
-                "download_progress": job.progress_percent,
-                "download_status": job.status,
-                "download_eta": duration,
-                "download_speed": speed_kbps,
-                "download_elapsed": elapsed,
-                "download_url": (
-                       reverse("apps.downloads:download_file", args=[str(job.id)])
-                       if job.status == "completed" and job.output_filename
-                       else None
-                   ),
-            },
+            context,
         )
         response["HX-TRIGGER"] = "refresh-history"
         return response
@@ -505,6 +599,107 @@ def progress_status(request):
         return HttpResponse("<p>Error: %s</p>" % e)
 
 
+def progress_summary(request):
+    """Return the aggregated progress of the session's download jobs as JSON."""
+    job_ids = request.session.get("download_job_ids") or []
+    summary = aggregate_progress(job_ids)
+    summary["current"] = summary["current"]["job_id"] if summary["current"] else None
+    return JsonResponse(summary)
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _progress_events(job_ids: list[str]):
+    """
+    Yield SSE messages for the first active job until all jobs finish.
+
+    Between reads the stream waits on `progress_channel.listen`, which
+    wakes up when a worker publishes (Redis pub/sub) and otherwise polls
+    every `VIDEO_PROGRESS_STREAM_INTERVAL_SECONDS`.
+    """
+    global _open_progress_streams
+
+    heartbeat = float(getattr(settings, "VIDEO_PROGRESS_STREAM_HEARTBEAT_SECONDS", 15))
+    deadline = time.monotonic() + float(
+        getattr(settings, "VIDEO_PROGRESS_STREAM_MAX_SECONDS", 300)
+    )
+    last_marker = None
+    last_sent_at = time.monotonic()
+
+    _open_progress_streams += 1
+    try:
+        yield "retry: 2000\n\n"
+        async with progress_channel.listen(job_ids) as wait:
+            while time.monotonic() < deadline:
+                snapshots = await progress_channel.aread_many(job_ids)
+                missing = [job_id for job_id in job_ids if job_id not in snapshots]
+                if missing:
+                    snapshots.update(await sync_to_async(load_snapshots)(missing))
+
+                current = next(
+                    (
+                        snapshots[job_id]
+                        for job_id in job_ids
+                        if job_id in snapshots
+                        and snapshots[job_id].get("status") in ACTIVE_STATUSES
+                    ),
+                    None,
+                )
+                if current is None:
+                    yield _sse("done", {"job_ids": job_ids})
+                    return
+
+                marker = (current["job_id"], current.get("published_at"))
+                if marker != last_marker:
+                    last_marker = marker
+                    last_sent_at = time.monotonic()
+                    yield _sse("progress", _progress_context(current, poll=True))
+                elif time.monotonic() - last_sent_at >= heartbeat:
+                    last_sent_at = time.monotonic()
+                    yield ": keep-alive\n\n"
+
+                now = time.monotonic()
+                await wait(
+                    max(0.0, min(last_sent_at + heartbeat, deadline) - now)
+                )
+    finally:
+        _open_progress_streams -= 1
+
+
+async def progress_stream(request):
+    """
+    Stream live progress for the session's download jobs as Server-Sent Events.
+
+    Emits a `progress` event whenever the current job's snapshot changes and
+    a final `done` event once no job is active. Snapshots come from the live
+    progress channel; the database is only read for jobs without one. Serve
+    it through the ASGI entry point (`core.asgi`); under WSGI the stream
+    would pin a worker thread.
+
+    When the channel is not shared, or past
+    `VIDEO_PROGRESS_STREAM_MAX_CONNECTIONS` open streams, the response is
+    a single `fallback` event, on which the page switches to polling.
+    """
+    job_ids = [
+        str(job_id) for job_id in (await request.session.aget("download_job_ids")) or []
+    ]
+    if not job_ids:
+        return HttpResponse(status=204)
+    if not _progress_stream_enabled():
+        return HttpResponse(
+            _sse("fallback", {"job_ids": job_ids}), content_type="text/event-stream"
+        )
+
+    response = StreamingHttpResponse(
+        _progress_events(job_ids), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 def download_file(request, job_id):
     """Stream a completed download to the requesting user."""
     job = (
@@ -523,24 +718,16 @@ def download_file(request, job_id):
         if not guest_id or str(job.user_id) != str(guest_id):
             raise Http404("Download not found")
 
-    base_dir = getattr(settings, "VIDEO_DOWNLOAD_ROOT", None)
-    if not base_dir:
-        raise Http404("Download not found")
-
-    base_dir = os.path.abspath(str(base_dir))
-    file_path = os.path.abspath(os.path.join(base_dir, job.output_filename))
-    if not file_path.startswith(base_dir + os.sep):
+    response = stored_file_response(
+        request, job.output_filename, filename=job.output_filename
+    )
+    if response is None:
         raise Http404("Download not found")
 
-    if not os.path.exists(file_path):
-        raise Http404("Download not found")
+    if job.artifact_id:
+        touch_artifact(job.artifact_id)
+    return response
 
-    return FileResponse(
-        open(file_path, "rb"),
-        as_attachment=True,
-        filename=job.output_filename,
-    )
-    
 
 def start_download_spinner(request):
     if request.method != "POST" or not request.htmx:
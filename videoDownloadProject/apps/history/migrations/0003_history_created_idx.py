@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-17
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("history", "0002_alter_history_options"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="history",
+            index=models.Index(fields=["-created_at"], name="history_created_idx"),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 6.0.2 on 2026-10-17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_user(apps, schema_editor):
+    History = apps.get_model("history", "History")
+    DownloadJob = apps.get_model("downloads", "DownloadJob")
+    History.objects.filter(user__isnull=True).update(
+        user_id=Subquery(
+            DownloadJob.objects.filter(pk=OuterRef("job_id")).values("user_id")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; building the
+    # index this way keeps the history table writable during the migration.
+    atomic = False
+
+    dependencies = [
+        ("history", "0003_history_created_idx"),
+        ("downloads", "0007_downloadjob_awaiting_artifact"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="history",
+            name="user",
+            field=models.ForeignKey(
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="download_history",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(backfill_user, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name="history",
+            index=models.Index(
+                fields=["user", "-created_at"], name="history_user_created_idx"
+            ),
+        ),
+    ]
@@ -1,5 +1,6 @@
 import uuid
 
+from django.conf import settings
 from django.db import models
 
 from apps.common.models import TimeStampedModel
@@ -11,10 +12,30 @@ class History(TimeStampedModel):
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     job = models.ForeignKey(DownloadJob, on_delete=models.CASCADE, related_name='history')
+    # Copy of `job.user` so per-user listings are one index range scan
+    # instead of a join through the jobs table; filled in by `save()`.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="download_history",
+        null=True,
+        editable=False,
+    )
     success = models.BooleanField(default=False)
     
     class Meta:
         verbose_name_plural = 'histories'
+        indexes = [
+            models.Index(fields=["-created_at"], name="history_created_idx"),
+            models.Index(fields=["user", "-created_at"], name="history_user_created_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Keep the denormalized `user` in step with the job's owner."""
+
+        if self.user_id is None and self.job_id is not None:
+            self.user_id = self.job.user_id
+        super().save(*args, **kwargs)
 
     def __str__(self):
         """Return a readable status label for admin displays."""
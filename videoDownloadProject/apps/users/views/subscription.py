@@ -11,6 +11,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from paypal.standard.ipn.models import PayPalIPN
 
+from apps.common.ratelimit import TOKEN_BUCKET, ratelimit
 from apps.users.forms import CustomPayPalPaymentsForm
 from apps.users.models import SubscriptionEvent, UserProfile
 from apps.users.signals import handle_valid_paypal_ipn
@@ -47,6 +48,7 @@ def pricing(request):
 
 @login_required(login_url=reverse_lazy("apps.downloads:index"))
 @require_http_methods(["GET"])
+@ratelimit("poll_subscription_status", limit=30, window=60, algorithm=TOKEN_BUCKET)
 def poll_subscription_status(request):
     """HTMX endpoint to refresh pricing page once subscription becomes Pro."""
     _reconcile_recent_paypal_ipn_for_user(request.user.id)
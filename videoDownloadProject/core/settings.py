@@ -15,6 +15,7 @@ from importlib.util import find_spec
 from pathlib import Path
 
 from dotenv import load_dotenv
+from kombu import Queue
 
 load_dotenv()
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -161,6 +162,163 @@ if DEBUG:
         ]
 
 VIDEO_DOWNLOAD_ROOT = Path.home() / "Downloads"
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+    },
+}
+# Finished downloads live on local disk (VIDEO_DOWNLOAD_ROOT) unless a bucket is
+# configured; then workers upload them to S3/MinIO and the web tier redirects to
+# presigned URLs, so web and worker nodes no longer need a shared volume. The
+# endpoint must be reachable by browsers for the redirects to work.
+VIDEO_STORAGE_S3_BUCKET = os.environ.get("VIDEO_STORAGE_S3_BUCKET", "")
+if VIDEO_STORAGE_S3_BUCKET:
+    VIDEO_STORAGE_S3_ENDPOINT_URL = os.environ.get("VIDEO_STORAGE_S3_ENDPOINT_URL", "")
+    STORAGES["video_downloads"] = {
+        "BACKEND": "storages.backends.s3.S3Storage",
+        "OPTIONS": {
+            "bucket_name": VIDEO_STORAGE_S3_BUCKET,
+            "endpoint_url": VIDEO_STORAGE_S3_ENDPOINT_URL or None,
+            "access_key": os.environ.get("VIDEO_STORAGE_S3_ACCESS_KEY_ID") or None,
+            "secret_key": os.environ.get("VIDEO_STORAGE_S3_SECRET_ACCESS_KEY") or None,
+            "region_name": os.environ.get("VIDEO_STORAGE_S3_REGION") or None,
+            # MinIO and most S3-compatible stores expect path-style addressing.
+            "addressing_style": "path" if VIDEO_STORAGE_S3_ENDPOINT_URL else None,
+            "location": os.environ.get("VIDEO_STORAGE_S3_PREFIX", "downloads"),
+            "querystring_expire": int(
+                os.environ.get("VIDEO_STORAGE_URL_EXPIRE_SECONDS", "3600")
+            ),
+            "file_overwrite": True,
+        },
+    }
+
+# Stored downloads are evicted (LRU) above this many bytes, or when unused
+# for longer than the TTL; files no job links to any more expire after the
+# shorter unreferenced TTL. 0 disables a rule.
+VIDEO_STORAGE_BUDGET_BYTES = int(
+    os.environ.get("VIDEO_STORAGE_BUDGET_BYTES", str(20 * 1024**3))
+)
+VIDEO_STORAGE_TTL_SECONDS = int(
+    os.environ.get("VIDEO_STORAGE_TTL_SECONDS", str(7 * 24 * 3600))
+)
+VIDEO_STORAGE_UNREFERENCED_TTL_SECONDS = int(
+    os.environ.get("VIDEO_STORAGE_UNREFERENCED_TTL_SECONDS", "3600")
+)
+# App-written files under VIDEO_DOWNLOAD_ROOT without an artifact row (older
+# downloads, .part leftovers) count toward the budget too; files modified more
+# recently than this may belong to a running download and are kept.
+VIDEO_STORAGE_UNTRACKED_GRACE_SECONDS = int(
+    os.environ.get("VIDEO_STORAGE_UNTRACKED_GRACE_SECONDS", str(6 * 3600))
+)
+
+# Provider governor: per-host start rate (token bucket), in-flight caps and
+# bandwidth ceilings shared by every download worker through the cache. It needs
+# REDIS_CACHE_URL; on the per-process fallback cache it is off (check W001).
+VIDEO_PROVIDER_LIMITS = {
+    "default": {"starts_per_minute": 30, "max_inflight": 8},
+    "youtube.com": {
+        "starts_per_minute": int(
+            os.environ.get("VIDEO_YOUTUBE_STARTS_PER_MINUTE", "12")
+        ),
+        "max_inflight": int(os.environ.get("VIDEO_YOUTUBE_MAX_INFLIGHT", "4")),
+    },
+}
+VIDEO_GOVERNOR_MAX_INFLIGHT = int(os.environ.get("VIDEO_GOVERNOR_MAX_INFLIGHT", "16"))
+# Aggregate download bandwidth in bytes/second across all workers; 0 = unlimited.
+VIDEO_BANDWIDTH_CEILING_BYTES = int(
+    os.environ.get("VIDEO_BANDWIDTH_CEILING_BYTES", "0")
+)
+VIDEO_GOVERNOR_COOLDOWN_SECONDS = int(
+    os.environ.get("VIDEO_GOVERNOR_COOLDOWN_SECONDS", "300")
+)
+# yt-dlp fragment concurrency is picked per job, up to the provider's
+# "fragment_concurrency", from size, measured per-stream throughput and load.
+VIDEO_FRAGMENT_TARGET_BPS = int(
+    os.environ.get("VIDEO_FRAGMENT_TARGET_BPS", str(32 * 1024**2))
+)
+VIDEO_FRAGMENT_MIN_BYTES_PER_STREAM = int(
+    os.environ.get("VIDEO_FRAGMENT_MIN_BYTES_PER_STREAM", str(16 * 1024**2))
+)
+
+# Shared cache (yt-dlp metadata, etc). Point REDIS_CACHE_URL at Redis so web and
+# worker processes share entries; fall back to per-process memory otherwise.
+REDIS_CACHE_URL = os.environ.get("REDIS_CACHE_URL", "")
+if REDIS_CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 1000},
+        }
+    }
+
+VIDEO_METADATA_CACHE_TTL_SECONDS = int(
+    os.environ.get("VIDEO_METADATA_CACHE_TTL_SECONDS", "600")
+)
+
+# Celery queues: short metadata fetches and long downloads get their own queues
+# so a download backlog never delays the "Fetch" button. Run one worker pool per
+# queue (see docker-compose.yml); a worker started without -Q consumes them all.
+CELERY_TASK_DEFAULT_QUEUE = "celery"
+# Downloads are acknowledged late (after the transfer), so their delivery must
+# outlive RabbitMQ's default 30-minute consumer_timeout or the broker closes the
+# channel and redelivers a running download. The hard time limit ends a stuck
+# download well before the per-queue timeout (RabbitMQ >= 3.12) is reached.
+VIDEO_DOWNLOAD_TIME_LIMIT_SECONDS = int(
+    os.environ.get("VIDEO_DOWNLOAD_TIME_LIMIT_SECONDS", str(3 * 3600))
+)
+VIDEO_DOWNLOAD_CONSUMER_TIMEOUT_MS = (VIDEO_DOWNLOAD_TIME_LIMIT_SECONDS + 1800) * 1000
+CELERY_TASK_QUEUES = (
+    Queue("celery"),
+    Queue("metadata", queue_arguments={"x-max-priority": 10}),
+    Queue(
+        "downloads",
+        queue_arguments={
+            "x-max-priority": 10,
+            "x-consumer-timeout": VIDEO_DOWNLOAD_CONSUMER_TIMEOUT_MS,
+        },
+    ),
+)
+CELERY_TASK_ANNOTATIONS = {
+    "apps.downloads.tasks.download_tasks.run_download_job": {
+        "time_limit": VIDEO_DOWNLOAD_TIME_LIMIT_SECONDS,
+    },
+}
+CELERY_TASK_ROUTES = {
+    "apps.downloads.tasks.fetch_metadata_tasks.run_fetch_metadata": {
+        "queue": "metadata"
+    },
+    "apps.downloads.tasks.download_tasks.run_download_job": {"queue": "downloads"},
+}
+# Reserve one message per process so long downloads don't pin queued work to a
+# busy worker; the metadata worker raises this from the command line.
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(
+    os.environ.get("CELERY_WORKER_PREFETCH_MULTIPLIER", "1")
+)
+CELERY_TASK_DEFAULT_PRIORITY = 3
+VIDEO_DOWNLOAD_PRIORITY_DEFAULT = int(
+    os.environ.get("VIDEO_DOWNLOAD_PRIORITY_DEFAULT", "3")
+)
+VIDEO_DOWNLOAD_PRIORITY_PRO = int(os.environ.get("VIDEO_DOWNLOAD_PRIORITY_PRO", "8"))
+
+# Quota counters drift if a worker dies mid-job; resync them periodically.
+CELERY_BEAT_SCHEDULE = {
+    "reconcile-download-usage": {
+        "task": "apps.downloads.tasks.usage_tasks.reconcile_download_usage",
+        "schedule": int(os.environ.get("VIDEO_QUOTA_RECONCILE_SECONDS", "600")),
+    },
+    "prune-download-storage": {
+        "task": "apps.downloads.tasks.storage_tasks.prune_download_storage",
+        "schedule": int(os.environ.get("VIDEO_STORAGE_PRUNE_SECONDS", "3600")),
+    },
+}
 
 # Subscription provider integration
 SUBSCRIPTION_WEBHOOK_SECRET = os.environ.get("SUBSCRIPTION_WEBHOOK_SECRET", "")
@@ -27,3 +27,52 @@ if (themeToggle) {
     setTheme(isDark ? 'light' : 'dark');
   });
 }
+
+// Live download progress over Server-Sent Events (VIDEO_PROGRESS_SSE_ENABLED).
+const setText = (card, selector, value) => {
+  const el = card.querySelector(selector);
+  if (el) {
+    el.textContent = value;
+  }
+};
+
+const openProgressStream = (card) => {
+  if (card.dataset.progressStreamOpen || !window.EventSource) {
+    return;
+  }
+  card.dataset.progressStreamOpen = 'true';
+  const source = new EventSource(card.dataset.progressStream);
+
+  source.addEventListener('progress', (event) => {
+    const data = JSON.parse(event.data);
+    const percent = data.download_progress || 0;
+    const bar = card.querySelector('[data-progress]');
+    if (bar) {
+      bar.style.width = `${percent}%`;
+    }
+    setText(card, '[data-progress-text]', `${percent}%`);
+    setText(card, '[data-title]', data.format_title || '');
+    setText(card, '[data-status]', data.download_status || 'Queued');
+    setText(card, '[data-speed]', data.download_speed || '—');
+    setText(card, '[data-eta]', data.download_eta || '0');
+    setText(card, '[data-elapsed]', data.download_elapsed || '—');
+  });
+
+  const reload = () => {
+    source.close();
+    if (window.htmx) {
+      window.htmx.trigger(card, 'progress-done');
+    }
+  };
+  source.addEventListener('done', reload);
+  // The server is at its stream limit; the reloaded card polls instead.
+  source.addEventListener('fallback', reload);
+};
+
+document.addEventListener('htmx:load', (event) => {
+  const scope = event.detail.elt;
+  if (scope.matches && scope.matches('[data-progress-stream]')) {
+    openProgressStream(scope);
+  }
+  scope.querySelectorAll?.('[data-progress-stream]').forEach(openProgressStream);
+});